@@ -1,8 +1,16 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.utils import timezone
+from django.utils.html import format_html
 from django.utils.translation import gettext_lazy as _
 from .models import User, Group, Course, Module, Lesson, Quiz, Question, Answer
-from .models import Enrollment, QuizResult, StudentProgress, AuditLog
+from .models import Enrollment, QuizResult, QuizResponse, StudentProgress, CourseProgress, AuditLog, BackgroundJob
+from .admin_filters import AutocompleteFilterMixin, autocomplete_filter
+from .deletion import run_deletion_job
+from .grading import run_regrade_job
+from .item_analysis import LOW_DISCRIMINATION, empirical_difficulty, run_item_stats_job
+from .jobs import start_job
+from .pagination import EstimatedCountPaginator
 
 
 @admin.register(User)
@@ -26,11 +34,20 @@ class UserAdmin(BaseUserAdmin):
     search_fields = ('email', 'full_name')
     ordering = ('email',)
     readonly_fields = ('created_at',)
+    actions = ['delete_in_background']
+
+    @admin.action(description='Удалить в фоне пачками (для пользователей с большим объёмом данных)')
+    def delete_in_background(self, request, queryset):
+        pks = list(queryset.values_list('pk', flat=True))
+        queryset.update(is_active=False)
+        job = start_job('delete_user', run_deletion_job, User._meta.label, pks, user=request.user)
+        self.message_user(request, f'Удаление запущено в фоновой задаче #{job.pk}')
 
 
 @admin.register(Group)
 class GroupAdmin(admin.ModelAdmin):
     list_display = ('group_name', 'curator', 'created_at')
+    list_select_related = ('curator',)
     list_filter = ('created_at',)
     search_fields = ('group_name', 'curator__full_name')
     autocomplete_fields = ['curator']
@@ -45,15 +62,25 @@ class ModuleInline(admin.TabularInline):
 @admin.register(Course)
 class CourseAdmin(admin.ModelAdmin):
     list_display = ('title', 'teacher', 'status', 'start_date', 'end_date', 'get_enrolled_count')
+    list_select_related = ('teacher',)
     list_filter = ('status', 'start_date', 'end_date')
+    readonly_fields = ('active_count', 'completed_count', 'dropped_count')
     search_fields = ('title', 'teacher__full_name', 'description')
     autocomplete_fields = ['teacher']
     inlines = [ModuleInline]
+    actions = ['delete_in_background']
 
     def get_enrolled_count(self, obj):
-        return obj.get_enrolled_count()
+        return obj.active_count
 
     get_enrolled_count.short_description = 'Записано студентов'
+    get_enrolled_count.admin_order_field = 'active_count'
+
+    @admin.action(description='Удалить в фоне пачками (вместе с модулями, записями и результатами)')
+    def delete_in_background(self, request, queryset):
+        job = start_job('delete_course', run_deletion_job, Course._meta.label,
+                        list(queryset.values_list('pk', flat=True)), user=request.user)
+        self.message_user(request, f'Удаление запущено в фоновой задаче #{job.pk}')
 
 
 class LessonInline(admin.TabularInline):
@@ -68,19 +95,24 @@ class QuizInline(admin.TabularInline):
 
 
 @admin.register(Module)
-class ModuleAdmin(admin.ModelAdmin):
+class ModuleAdmin(AutocompleteFilterMixin, admin.ModelAdmin):
     list_display = ('title', 'course', 'order_num', 'is_unlocked')
-    list_filter = ('course', 'is_unlocked')
+    list_filter = (autocomplete_filter('course', 'курсу'), 'is_unlocked')
     search_fields = ('title', 'course__title')
     autocomplete_fields = ['course']
     inlines = [LessonInline, QuizInline]
     ordering = ['course', 'order_num']
 
+    def get_queryset(self, request):
+        # Module.__str__ выводит название курса (в том числе в автодополнении)
+        return super().get_queryset(request).select_related('course')
+
 
 @admin.register(Lesson)
-class LessonAdmin(admin.ModelAdmin):
+class LessonAdmin(AutocompleteFilterMixin, admin.ModelAdmin):
     list_display = ('title', 'module', 'content_type', 'order_num', 'duration_minutes')
-    list_filter = ('content_type', 'module__course')
+    list_select_related = ('module__course',)
+    list_filter = ('content_type', autocomplete_filter('module__course', 'курсу'))
     search_fields = ('title', 'module__title')
     autocomplete_fields = ['module']
     ordering = ['module', 'order_num']
@@ -93,33 +125,110 @@ class QuestionInline(admin.TabularInline):
 
 
 @admin.register(Quiz)
-class QuizAdmin(admin.ModelAdmin):
+class QuizAdmin(AutocompleteFilterMixin, admin.ModelAdmin):
     list_display = ('title', 'module', 'max_score', 'passing_score', 'is_published')
-    list_filter = ('is_published', 'module__course')
+    list_select_related = ('module__course',)
+    list_filter = ('is_published', autocomplete_filter('module__course', 'курсу'))
     search_fields = ('title', 'module__title')
     autocomplete_fields = ['module']
     inlines = [QuestionInline]
+    actions = ['regrade_results', 'refresh_item_stats']
+
+    @admin.action(description='Перепроверить результаты по текущим правильным ответам')
+    def regrade_results(self, request, queryset):
+        job = start_job('regrade_quizzes', run_regrade_job, list(queryset.values_list('pk', flat=True)),
+                        user=request.user)
+        self.message_user(request, f'Перепроверка запущена в фоновой задаче #{job.pk}')
+
+    @admin.action(description='Пересчитать анализ вопросов по ответам студентов')
+    def refresh_item_stats(self, request, queryset):
+        job = start_job('item_stats', run_item_stats_job, list(queryset.values_list('pk', flat=True)), full=True,
+                        user=request.user)
+        self.message_user(request, f'Анализ вопросов пересчитывается в фоновой задаче #{job.pk}')
+
+
+def _question_stats(question):
+    try:
+        return question.stats
+    except Question.stats.RelatedObjectDoesNotExist:
+        return None
+
+
+def _rate(value):
+    return '—' if value is None else f'{value:.0%}'
 
 
 class AnswerInline(admin.TabularInline):
     model = Answer
     extra = 1
     ordering = ['order_num']
+    readonly_fields = ('get_choice_rate',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('question__stats')
+
+    def get_choice_rate(self, obj):
+        stats = _question_stats(obj.question) if obj.pk else None
+        return _rate(stats.option_rates.get(str(obj.pk)) if stats else None)
+
+    get_choice_rate.short_description = 'Выбирают'
 
 
 @admin.register(Question)
-class QuestionAdmin(admin.ModelAdmin):
-    list_display = ('question_text', 'quiz', 'question_type', 'points', 'difficulty', 'order_num')
-    list_filter = ('question_type', 'difficulty', 'quiz__module__course')
+class QuestionAdmin(AutocompleteFilterMixin, admin.ModelAdmin):
+    list_display = ('question_text', 'quiz', 'question_type', 'points', 'difficulty', 'order_num',
+                    'get_p_value', 'get_discrimination')
+    list_select_related = ('quiz', 'stats')
+    list_filter = ('question_type', 'difficulty', autocomplete_filter('quiz__module__course', 'курсу'))
     search_fields = ('question_text', 'quiz__title')
     autocomplete_fields = ['quiz']
+    readonly_fields = ('get_item_analysis',)
     inlines = [AnswerInline]
     ordering = ['quiz', 'order_num']
 
+    def get_p_value(self, obj):
+        stats = _question_stats(obj)
+        return _rate(stats.p_value if stats else None)
+
+    get_p_value.short_description = 'Правильных ответов'
+    get_p_value.admin_order_field = 'stats__p_value'
+
+    def get_discrimination(self, obj):
+        stats = _question_stats(obj)
+        if stats is None or stats.discrimination is None:
+            return '—'
+        if stats.discrimination < LOW_DISCRIMINATION:
+            return format_html('<span style="color: #ba2121">{}</span>', f'{stats.discrimination:.2f}')
+        return f'{stats.discrimination:.2f}'
+
+    get_discrimination.short_description = 'Дискриминативность'
+    get_discrimination.admin_order_field = 'stats__discrimination'
+
+    def get_item_analysis(self, obj):
+        stats = _question_stats(obj) if obj.pk else None
+        if stats is None or stats.p_value is None:
+            return 'Нет данных: анализ строится командой refresh_item_stats по сохранённым ответам студентов'
+        difficulty = empirical_difficulty(stats.p_value)
+        lines = [
+            f'Попыток: {stats.attempts}, правильных ответов: {_rate(stats.p_value)}, '
+            f'пропусков: {_rate(stats.omit_rate)}',
+            f'Сложность по ответам: {dict(Question.DIFFICULTY_CHOICES)[difficulty]}'
+            + ('' if difficulty == obj.difficulty else f' (задана: {obj.get_difficulty_display()})'),
+            'Дискриминативность: ' + ('—' if stats.discrimination is None else f'{stats.discrimination:.2f}')
+            + (' - вопрос плохо отделяет сильных студентов от слабых'
+               if stats.discrimination is not None and stats.discrimination < LOW_DISCRIMINATION else ''),
+            f'Рассчитано: {timezone.localtime(stats.computed_at):%d.%m.%Y %H:%M}'
+            + (', устарел после правки ответов' if stats.is_stale else ''),
+        ]
+        return format_html('<br>'.join(['{}'] * len(lines)), *lines)
+
+    get_item_analysis.short_description = 'Анализ по ответам'
+
 
 @admin.register(Answer)
 class AnswerAdmin(admin.ModelAdmin):
     list_display = ('answer_text', 'question', 'is_correct', 'order_num')
+    list_select_related = ('question',)
     list_filter = ('is_correct',)
     search_fields = ('answer_text', 'question__question_text')
     autocomplete_fields = ['question']
@@ -127,36 +236,85 @@ class AnswerAdmin(admin.ModelAdmin):
 
 
 @admin.register(Enrollment)
-class EnrollmentAdmin(admin.ModelAdmin):
+class EnrollmentAdmin(AutocompleteFilterMixin, admin.ModelAdmin):
     list_display = ('student', 'course', 'group', 'status', 'enrolled_at', 'completed_at')
-    list_filter = ('status', 'course', 'group', 'enrolled_at')
+    list_select_related = ('student', 'course', 'group')
+    list_filter = ('status', autocomplete_filter('course', 'курсу'), autocomplete_filter('group', 'группе'),
+                   'enrolled_at')
     search_fields = ('student__full_name', 'student__email', 'course__title')
     autocomplete_fields = ['student', 'course', 'group']
     ordering = ['-enrolled_at']
 
 
+class QuizResponseInline(admin.TabularInline):
+    model = QuizResponse
+    fields = ('question', 'answer', 'text_answer')
+    readonly_fields = fields
+    can_delete = False
+    extra = 0
+    max_num = 0
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('question', 'answer')
+
+
 @admin.register(QuizResult)
-class QuizResultAdmin(admin.ModelAdmin):
+class QuizResultAdmin(AutocompleteFilterMixin, admin.ModelAdmin):
     list_display = ('student', 'quiz', 'score', 'max_score', 'percentage', 'is_passed', 'submitted_at')
-    list_filter = ('is_passed', 'quiz__module__course', 'submitted_at')
+    list_select_related = ('student', 'quiz')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_filter = ('is_passed', autocomplete_filter('quiz__module__course', 'курсу'), 'submitted_at')
     search_fields = ('student__full_name', 'quiz__title')
     autocomplete_fields = ['student', 'quiz']
     ordering = ['-submitted_at']
+    inlines = [QuizResponseInline]
 
 
 @admin.register(StudentProgress)
-class StudentProgressAdmin(admin.ModelAdmin):
+class StudentProgressAdmin(AutocompleteFilterMixin, admin.ModelAdmin):
     list_display = ('student', 'module', 'lesson', 'status', 'completed_at')
-    list_filter = ('status', 'module__course', 'completed_at')
+    list_select_related = ('student', 'module__course', 'lesson')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_filter = ('status', autocomplete_filter('module__course', 'курсу'), 'completed_at')
     search_fields = ('student__full_name', 'module__title')
     autocomplete_fields = ['student', 'module', 'lesson']
     ordering = ['-completed_at']
 
 
+@admin.register(CourseProgress)
+class CourseProgressAdmin(AutocompleteFilterMixin, admin.ModelAdmin):
+    list_display = ('student', 'course', 'completed_lessons', 'total_lessons', 'percent', 'updated_at')
+    list_select_related = ('student', 'course')
+    list_filter = (autocomplete_filter('course', 'курсу'),)
+    search_fields = ('student__full_name', 'student__email', 'course__title')
+    readonly_fields = ('student', 'course', 'completed_lessons', 'total_lessons', 'percent', 'updated_at')
+    ordering = ['course', '-percent']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        # Строки рассчитываются из StudentProgress (app.progress)
+        return False
+
+
 @admin.register(AuditLog)
 class AuditLogAdmin(admin.ModelAdmin):
     list_display = ('created_at', 'user', 'action', 'table_name', 'record_id', 'ip_address')
+    list_select_related = ('user',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     list_filter = ('action', 'table_name', 'created_at')
     search_fields = ('user__full_name', 'user__email', 'action', 'old_value', 'new_value')
     readonly_fields = ('created_at',)
-    ordering = ['-created_at']
\ No newline at end of file
+    ordering = ['-created_at']
+
+
+@admin.register(BackgroundJob)
+class BackgroundJobAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'kind', 'status', 'processed', 'created_by', 'finished_at')
+    list_select_related = ('created_by',)
+    list_filter = ('kind', 'status')
+    readonly_fields = ('kind', 'status', 'total', 'processed', 'result', 'error', 'created_by', 'finished_at')
+    ordering = ['-created_at']
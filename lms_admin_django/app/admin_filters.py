@@ -0,0 +1,74 @@
+from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.core.exceptions import ValidationError
+
+
+class AutocompleteFilter(admin.SimpleListFilter):
+    """
+    Фильтр списка по связанной модели с выбором через автодополнение (select2),
+    вместо стандартного фильтра, который выводит в боковую панель все объекты.
+    Задаётся путём до внешнего ключа: autocomplete_filter('quiz__module__course').
+    """
+
+    template = 'admin/app/autocomplete_filter.html'
+    field_path = None
+
+    def __init__(self, request, params, model, model_admin):
+        super().__init__(request, params, model, model_admin)
+
+        # Последнее звено пути - внешний ключ, по которому работает представление автодополнения
+        *path, field_name = self.field_path.split('__')
+        source_model = model
+        for name in path:
+            source_model = source_model._meta.get_field(name).remote_field.model
+        self.field = source_model._meta.get_field(field_name)
+        self.related_model = self.field.remote_field.model
+        self.widget_id = f'id_filter_{self.parameter_name}'
+
+        form_field = self.field.formfield(
+            widget=AutocompleteSelect(self.field, model_admin.admin_site),
+            queryset=self.related_model._default_manager.all(),
+            required=False,
+        )
+        self.rendered_widget = form_field.widget.render(
+            self.parameter_name, self.value(), attrs={'id': self.widget_id, 'style': 'width: 100%'}
+        )
+
+    def has_output(self):
+        return True
+
+    def lookups(self, request, model_admin):
+        return ()
+
+    def choices(self, changelist):
+        return ()
+
+    def queryset(self, request, queryset):
+        value = self.value()
+        if not value:
+            return queryset
+        try:
+            value = self.related_model._meta.pk.to_python(value)
+        except ValidationError as error:
+            raise IncorrectLookupParameters(error)
+        return queryset.filter(**{f'{self.field_path}__pk': value})
+
+
+def autocomplete_filter(field_path, title):
+    """Класс фильтра AutocompleteFilter для пути до внешнего ключа"""
+
+    return type(f'AutocompleteFilter_{field_path}', (AutocompleteFilter,), {
+        'field_path': field_path,
+        # Имя параметра на уровне класса - по нему ModelAdmin.lookup_allowed разрешает фильтр
+        'parameter_name': field_path,
+        'title': title,
+    })
+
+
+class AutocompleteFilterMixin:
+    """Подключает select2 на странице списка ModelAdmin с фильтрами AutocompleteFilter"""
+
+    @property
+    def media(self):
+        return super().media + AutocompleteSelect(None, self.admin_site).media
@@ -0,0 +1,285 @@
+import atexit
+import contextvars
+import ipaddress
+import json
+import logging
+import queue
+import threading
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, close_old_connections, transaction
+from django.utils import timezone
+from .models import (User, Group, Course, Module, Lesson, Quiz, Question, Answer, Enrollment, QuizResult,
+                     StudentProgress, AuditLog)
+
+logger = logging.getLogger(__name__)
+
+# Модели, изменения которых попадают в журнал аудита
+AUDITED_MODELS = (User, Group, Course, Module, Lesson, Quiz, Question, Answer, Enrollment, QuizResult,
+                  StudentProgress)
+
+# Поля, значения которых не пишутся в журнал
+MASKED_FIELDS = {'password'}
+MASK = '***'
+
+# Денормализованные счётчики меняются сигналами и не являются действием пользователя
+IGNORED_FIELDS = {'active_count', 'completed_count', 'dropped_count', 'last_login'}
+
+DEFAULTS = {
+    'ASYNC': True,           # писать фоновым потоком (False - сразу после коммита)
+    'BATCH_SIZE': 500,       # записей в одном bulk_create
+    'FLUSH_INTERVAL': 1.0,   # секунд между сбросами неполной пачки
+    'QUEUE_SIZE': 10000,     # предел очереди в памяти
+    'ENQUEUE_TIMEOUT': 2.0,  # сколько ждать места в очереди, прежде чем писать синхронно
+    'PARTITIONS_AHEAD': 3,   # секций на месяцы вперёд (manage_audit_partitions)
+    'RETENTION_MONTHS': 12,  # срок хранения секций в месяцах
+    'TRUSTED_PROXIES': (),   # адреса и сети прокси, которым доверяется X-Forwarded-For
+}
+
+
+def get_audit_settings():
+    return {**DEFAULTS, **getattr(settings, 'AUDIT_LOG', {})}
+
+
+# --- Контекст запроса (заполняется AuditContextMiddleware) ---
+
+_current_request = contextvars.ContextVar('audit_request', default=None)
+
+
+def set_current_request(request):
+    return _current_request.set(request)
+
+
+def reset_current_request(token):
+    _current_request.reset(token)
+
+
+def _parse_ip(value):
+    try:
+        return ipaddress.ip_address(value.strip())
+    except ValueError:
+        return None
+
+
+def get_client_ip(request):
+    """
+    IP клиента для журнала. X-Forwarded-For читается, только если запрос пришёл от доверенного прокси
+    (AUDIT_LOG['TRUSTED_PROXIES']), и берётся ближайший к нам недоверенный адрес цепочки: левые
+    адреса клиент может подставить сам. Иначе - REMOTE_ADDR.
+    """
+
+    remote = request.META.get('REMOTE_ADDR') or None
+    forwarded = request.META.get('HTTP_X_FORWARDED_FOR')
+    proxies = [ipaddress.ip_network(proxy, strict=False) for proxy in get_audit_settings()['TRUSTED_PROXIES']]
+
+    def trusted(address):
+        return any(address in network for network in proxies)
+
+    address = _parse_ip(remote or '')
+    if not forwarded or address is None or not trusted(address):
+        return remote
+    for value in reversed(forwarded.split(',')):
+        address = _parse_ip(value)
+        if address is None:
+            break
+        if not trusted(address):
+            return str(address)
+    return remote
+
+
+def _request_context():
+    request = _current_request.get()
+    if request is None:
+        return None, None
+    user = getattr(request, 'user', None)
+    user_id = user.pk if user is not None and user.is_authenticated else None
+    return user_id, get_client_ip(request)
+
+
+# --- Сериализация изменений ---
+
+def _field_values(instance):
+    return {
+        field.attname: getattr(instance, field.attname)
+        for field in instance._meta.concrete_fields
+        if field.attname not in IGNORED_FIELDS
+    }
+
+
+def _dump(values):
+    if values is None:
+        return None
+    values = {name: MASK if name in MASKED_FIELDS else value for name, value in values.items()}
+    return json.dumps(values, cls=DjangoJSONEncoder, ensure_ascii=False)
+
+
+def build_entry(action, instance, old_state=None):
+    """Запись аудита (dict полей AuditLog) для CREATE/UPDATE/DELETE; None, если ничего не изменилось"""
+
+    new_values = _field_values(instance)
+    if action == 'CREATE':
+        old, new = None, new_values
+    elif action == 'DELETE':
+        old, new = new_values, None
+    else:
+        if old_state is None:
+            return None
+        changed = [name for name, value in new_values.items() if name in old_state and old_state[name] != value]
+        if not changed:
+            return None
+        old = {name: old_state[name] for name in changed}
+        new = {name: new_values[name] for name in changed}
+
+    user_id, ip_address = _request_context()
+    return {
+        'user_id': user_id,
+        'action': action,
+        'table_name': instance._meta.db_table,
+        'record_id': instance.pk,
+        'old_value': _dump(old),
+        'new_value': _dump(new),
+        'ip_address': ip_address,
+        'created_at': timezone.now(),
+    }
+
+
+def build_bulk_entry(action, table_name, payload):
+    """Одна запись аудита для массовой операции, выполненной в обход сигналов"""
+
+    user_id, ip_address = _request_context()
+    return {
+        'user_id': user_id,
+        'action': action,
+        'table_name': table_name,
+        'record_id': None,
+        'old_value': None,
+        'new_value': _dump(payload),
+        'ip_address': ip_address,
+        'created_at': timezone.now(),
+    }
+
+
+def record(entry):
+    """Поставить запись в очередь после успешного коммита текущей транзакции"""
+
+    if entry is not None:
+        transaction.on_commit(lambda: get_writer().enqueue(entry))
+
+
+# --- Фоновая запись пачками ---
+
+def write_entries(entries):
+    """Записать пачку одним bulk_create; при ошибке FK - по одной, без ссылки на пользователя"""
+
+    if not entries:
+        return
+    try:
+        with transaction.atomic():
+            AuditLog.objects.bulk_create([AuditLog(**entry) for entry in entries])
+    except IntegrityError:
+        # Например, пользователь-инициатор удалён до сброса пачки
+        for entry in entries:
+            try:
+                with transaction.atomic():
+                    AuditLog.objects.create(**entry)
+            except IntegrityError:
+                AuditLog.objects.create(**{**entry, 'user_id': None})
+
+
+class AuditWriter:
+    """Очередь записей аудита с фоновым потоком, сбрасывающим её пачками"""
+
+    _STOP = object()
+
+    def __init__(self, batch_size, flush_interval, queue_size, enqueue_timeout, asynchronous=True):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self.asynchronous = asynchronous
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.dropped_to_sync = 0
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+                self._thread.start()
+
+    def enqueue(self, entry):
+        if not self.asynchronous:
+            write_entries([entry])
+            return
+        self._ensure_started()
+        try:
+            # Обратное давление: при заполненной очереди запрос ждёт освобождения места
+            self.queue.put(entry, timeout=self.enqueue_timeout)
+        except queue.Full:
+            self.dropped_to_sync += 1
+            logger.warning('Очередь аудита переполнена, запись выполняется синхронно')
+            write_entries([entry])
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = []
+            try:
+                item = self.queue.get(timeout=self.flush_interval)
+                if item is self._STOP:
+                    stopping = True
+                else:
+                    batch.append(item)
+                while len(batch) < self.batch_size and not stopping:
+                    item = self.queue.get_nowait()
+                    if item is self._STOP:
+                        stopping = True
+                    else:
+                        batch.append(item)
+            except queue.Empty:
+                pass
+
+            if batch:
+                try:
+                    write_entries(batch)
+                except Exception:
+                    logger.exception('Не удалось записать %d записей аудита', len(batch))
+                finally:
+                    close_old_connections()
+            for _ in range(len(batch) + stopping):
+                self.queue.task_done()
+            # Неполная пачка без остановки - продолжаем собирать после таймаута
+
+    def flush(self):
+        """Дождаться записи всех поставленных в очередь записей"""
+        if self._thread is not None and self._thread.is_alive():
+            self.queue.join()
+
+    def stop(self):
+        """Сбросить очередь и остановить поток (вызывается при завершении процесса)"""
+        if self._thread is not None and self._thread.is_alive():
+            self.queue.put(self._STOP)
+            self._thread.join()
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                config = get_audit_settings()
+                _writer = AuditWriter(
+                    batch_size=config['BATCH_SIZE'],
+                    flush_interval=config['FLUSH_INTERVAL'],
+                    queue_size=config['QUEUE_SIZE'],
+                    enqueue_timeout=config['ENQUEUE_TIMEOUT'],
+                    asynchronous=config['ASYNC'],
+                )
+                atexit.register(_writer.stop)
+    return _writer
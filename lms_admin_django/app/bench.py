@@ -0,0 +1,151 @@
+import json
+import statistics
+import time
+from django.contrib import admin
+from django.db import connection, connections
+from django.db.models import Max
+from django.db.models.query import RawQuerySet
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, reverse
+from .exports import REPORTS
+from .models import User, Course, BackgroundJob
+
+
+class Rollback(Exception):
+    """Исключение для отката транзакции после замера на временных данных"""
+
+
+def timed(func, repeat=5):
+    """Выполнить func repeat раз; вернуть (результат последнего вызова, список времён в мс)"""
+
+    timings, result = [], None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return result, timings
+
+
+def percentile(values, percent):
+    """Перцентиль по отсортированной выборке (ближайший ранг)"""
+
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(percent / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(timings):
+    return {
+        'p50': statistics.median(timings),
+        'p95': percentile(timings, 95),
+        'max': max(timings),
+    }
+
+
+def plan_rows(queryset):
+    """Наибольшее число строк в узлах плана QuerySet или RawQuerySet (только PostgreSQL, EXPLAIN ANALYZE)"""
+
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+
+    def walk(node):
+        yield node.get('Actual Rows', 0) * node.get('Actual Loops', 1)
+        for child in node.get('Plans', []):
+            yield from walk(child)
+
+    if isinstance(queryset, RawQuerySet):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (ANALYZE, FORMAT JSON) {queryset.raw_query}', queryset.params)
+            plan = cursor.fetchone()[0]
+        plan = json.loads(plan) if isinstance(plan, str) else plan
+    else:
+        plan = json.loads(queryset.explain(format='json', analyze=True))
+    return max(walk(plan[0]['Plan']))
+
+
+# --- Замеры страниц ---
+
+def sample_url_kwargs():
+    """Значения параметров URL для замера: самые «тяжёлые» объекты, а не первые попавшиеся"""
+
+    values = {
+        'user_id': User.objects.filter(role='student').order_by('-pk').values_list('pk', flat=True).first(),
+        'course_id': Course.objects.order_by('-active_count', 'pk').values_list('pk', flat=True).first(),
+        'job_id': BackgroundJob.objects.filter(kind='import_users', status='done')
+        .aggregate(job_id=Max('pk'))['job_id'],
+        'report': next(iter(REPORTS)),
+    }
+    return {name: value for name, value in values.items() if value is not None}
+
+
+def page_targets(urlconf, namespace, admin_site=admin.site):
+    """
+    Список (имя, путь или None) для замера: все маршруты urlconf с параметрами из sample_url_kwargs
+    и списки объектов всех моделей в админке. None - для маршрута нет подходящих данных.
+    """
+
+    kwargs = sample_url_kwargs()
+    targets = []
+    for pattern in urlconf.urlpatterns:
+        if not isinstance(pattern, URLPattern) or not pattern.name:
+            continue
+        params = list(pattern.pattern.converters)
+        name = f'{namespace}:{pattern.name}'
+        if all(param in kwargs for param in params):
+            targets.append((name, reverse(name, kwargs={param: kwargs[param] for param in params})))
+        else:
+            targets.append((name, None))
+    for model in sorted(admin_site._registry, key=lambda model: model._meta.label_lower):
+        opts = model._meta
+        changelist = reverse(f'admin:{opts.app_label}_{opts.model_name}_changelist')
+        targets.append((f'admin:{opts.app_label}.{opts.model_name}', changelist))
+    return targets
+
+
+def measure_page(client, path, repeat=5, warmup=1, before=None):
+    """
+    Замер GET-запроса: {status, queries, p50, p95, max}. Потоковые ответы читаются полностью.
+    Первые warmup запросов не учитываются (прогрев кеша и соединения); before() вызывается
+    перед каждым замеренным запросом вне замера (например, очистка кеша).
+    """
+
+    def fetch():
+        response = client.get(path)
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response
+
+    for _ in range(warmup):
+        fetch()
+    timings, queries, status = [], 0, None
+    for _ in range(repeat):
+        if before:
+            before()
+        with CaptureQueriesContext(connection) as context:
+            started = time.perf_counter()
+            status = fetch().status_code
+            timings.append((time.perf_counter() - started) * 1000)
+        queries = max(queries, len(context))
+    return {'status': status, 'queries': queries, **summarize(timings)}
+
+
+def compare_with_baseline(results, baseline, tolerance=0.2, min_ms=5):
+    """
+    Сравнить замеры с базовыми. Регрессия: другой код ответа, больше запросов к БД или p95 выросло
+    больше чем на tolerance (доля) и больше чем на min_ms - мелкие колебания таймера не считаются.
+    Возвращает список (страница, показатель, было, стало).
+    """
+
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        if current['status'] != previous['status']:
+            regressions.append((name, 'status', previous['status'], current['status']))
+        if current['queries'] > previous['queries']:
+            regressions.append((name, 'queries', previous['queries'], current['queries']))
+        if current['p95'] > previous['p95'] * (1 + tolerance) and current['p95'] - previous['p95'] > min_ms:
+            regressions.append((name, 'p95', previous['p95'], current['p95']))
+    return regressions
@@ -0,0 +1,148 @@
+import functools
+import hashlib
+import json
+import threading
+import time
+from django.core.cache import cache
+from django.db import transaction
+from .routers import use_replica
+
+FRAGMENT_TIMEOUT = 300
+
+
+class CacheCounters:
+    """Попадания и промахи кеша по именам фрагментов, в памяти процесса (как метрики запросов)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {}
+
+    def count(self, name, hit):
+        with self._lock:
+            counts = self._counts.setdefault(name, [0, 0])
+            counts[0 if hit else 1] += 1
+
+    def snapshot(self):
+        """{имя: (попадания, промахи)}"""
+
+        with self._lock:
+            return {name: tuple(counts) for name, counts in self._counts.items()}
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
+
+
+counters = CacheCounters()
+
+
+# --- Поколения моделей ---
+
+def get_version(key):
+    """
+    Значение счётчика версии из кеша. Отсутствующий ключ заводится уникальным значением (время в нс),
+    а не 1: ключ версии может быть вытеснен раньше данных, и с 1 записи под уже использованными
+    номерами, ещё живые по своему TTL, снова читались бы как текущие.
+    """
+
+    version = cache.get(key)
+    if version is None:
+        seed = time.time_ns()
+        cache.add(key, seed, None)
+        version = cache.get(key, seed)
+    return version
+
+
+def _generation_key(label):
+    return f'fragment:generation:{label}'
+
+
+def get_generations(models):
+    """
+    Текущие поколения моделей {label: номер}. Поколение растёт при каждом изменении модели,
+    поэтому ключи фрагментов, построенные на старых поколениях, перестают читаться.
+    """
+
+    labels = sorted(model._meta.label_lower for model in models)
+    generations = cache.get_many([_generation_key(label) for label in labels])
+    return {
+        label: generations.get(_generation_key(label)) or get_version(_generation_key(label))
+        for label in labels
+    }
+
+
+def _bump(labels):
+    for label in labels:
+        try:
+            cache.incr(_generation_key(label))
+        except ValueError:
+            pass
+
+
+def invalidate_model_fragments(*models):
+    """Сбросить фрагменты, зависящие от моделей, после коммита текущей транзакции"""
+
+    labels = {model._meta.label_lower for model in models}
+    transaction.on_commit(lambda: _bump(labels))
+
+
+# --- Фрагменты ---
+
+def fragment_key(name, role, params, generations):
+    raw = json.dumps([role, sorted(params.items()), sorted(generations.items())], separators=(',', ':'))
+    return f'fragment:{name}:{hashlib.md5(raw.encode()).hexdigest()}'
+
+
+def get_fragment(name, build, request, depends_on, vary_on=(), timeout=FRAGMENT_TIMEOUT):
+    """
+    Данные фрагмента представления из кеша или build() с сохранением в кеш.
+    Ключ - имя, роль пользователя, значения GET-параметров vary_on и поколения моделей depends_on.
+    Значение должно сериализоваться pickle (списки, словари, объекты моделей без ленивых queryset).
+    build() читает с основной БД, даже если представление помечено @replica_reads.
+    """
+
+    role = getattr(request.user, 'role', None)
+    params = {param: request.GET.get(param, '') for param in vary_on}
+    key = fragment_key(name, role, params, get_generations(depends_on))
+    value = cache.get(key)
+    counters.count(name, value is not None)
+    if value is None:
+        # Строим на основной БД: реплика может ещё не видеть запись, сменившую поколение, и устаревшие
+        # данные легли бы под новый ключ на весь timeout
+        with use_replica(False):
+            value = build()
+        cache.set(key, value, timeout)
+    return value
+
+
+def cache_fragment(name, depends_on, vary_on=(), timeout=FRAGMENT_TIMEOUT):
+    """Декоратор функции func(request), возвращающей данные фрагмента: кеширует их через get_fragment"""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(request):
+            return get_fragment(name, lambda: func(request), request, depends_on, vary_on, timeout)
+        return wrapper
+    return decorator
+
+
+# --- Экспорт счётчиков ---
+
+def prometheus_text(snapshot=None):
+    snapshot = counters.snapshot() if snapshot is None else snapshot
+    lines = []
+    for index, (metric, description) in enumerate((('lms_cache_hits_total', 'Попадания в кеш'),
+                                                   ('lms_cache_misses_total', 'Промахи кеша'))):
+        lines += [f'# HELP {metric} {description}', f'# TYPE {metric} counter']
+        lines += [f'{metric}{{fragment="{name}"}} {counts[index]}' for name, counts in sorted(snapshot.items())]
+    return '\n'.join(lines) + '\n'
+
+
+def summary_rows(snapshot=None):
+    snapshot = counters.snapshot() if snapshot is None else snapshot
+    rows = []
+    for name, (hits, misses) in sorted(snapshot.items()):
+        total = hits + misses
+        rows.append({'name': name, 'hits': hits, 'misses': misses,
+                     'hit_ratio': hits * 100 / total if total else None})
+    return rows
@@ -0,0 +1,56 @@
+from collections import defaultdict
+from django.db import transaction
+from django.db.models import Count, F
+from .models import Course, Enrollment
+
+
+# Статус записи -> поле-счётчик курса
+STATUS_COUNTERS = {
+    'active': 'active_count',
+    'completed': 'completed_count',
+    'dropped': 'dropped_count',
+}
+
+
+def apply_enrollment_delta(course_id, status, delta):
+    """Атомарно изменить счётчик курса для статуса записи (UPDATE ... SET x = x + delta)"""
+
+    field = STATUS_COUNTERS.get(status)
+    if field is None or not delta or course_id is None:
+        return
+    Course.objects.filter(pk=course_id).update(**{field: F(field) + delta})
+
+
+def count_enrollments_by_course():
+    """Фактические количества записей: {course_id: {поле-счётчик: число}} одним GROUP BY"""
+
+    counts = defaultdict(dict)
+    rows = Enrollment.objects.order_by().values('course_id', 'status').annotate(total=Count('pk'))
+    for row in rows:
+        field = STATUS_COUNTERS.get(row['status'])
+        if field:
+            counts[row['course_id']][field] = row['total']
+    return counts
+
+
+def find_counter_mismatches():
+    """Курсы, у которых счётчики расходятся с фактическими данными"""
+
+    actual = count_enrollments_by_course()
+    mismatches = []
+    courses = Course.objects.order_by('pk').values('pk', 'title', *STATUS_COUNTERS.values())
+    for course in courses.iterator(chunk_size=2000):
+        expected = {field: actual.get(course['pk'], {}).get(field, 0) for field in STATUS_COUNTERS.values()}
+        stored = {field: course[field] for field in STATUS_COUNTERS.values()}
+        if expected != stored:
+            mismatches.append((course, stored, expected))
+    return mismatches
+
+
+def repair_counters(mismatches, batch_size=500):
+    """Записать фактические значения счётчиков для расходящихся курсов"""
+
+    courses = [Course(pk=course['pk'], **expected) for course, _, expected in mismatches]
+    with transaction.atomic():
+        Course.objects.bulk_update(courses, list(STATUS_COUNTERS.values()), batch_size=batch_size)
+    return len(courses)
@@ -0,0 +1,126 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Avg, Count
+from .caching import counters, get_version
+from .models import Course, Module, Lesson, Quiz, QuizResult, CourseProgress
+
+# Версия формата дерева: при изменении структуры словарей старые записи кеша перестают читаться
+TREE_FORMAT = 1
+TREE_TIMEOUT = 24 * 60 * 60
+STATS_TIMEOUT = 60
+TOP_PROGRESS_LIMIT = 10
+
+
+def _version_key(course_id):
+    return f'course:{course_id}:version'
+
+
+def _tree_key(course_id, version):
+    return f'course:{course_id}:tree:f{TREE_FORMAT}:v{version}'
+
+
+def _stats_key(course_id):
+    return f'course:{course_id}:stats'
+
+
+def get_structure_version(course_id):
+    return get_version(_version_key(course_id))
+
+
+def _bump_versions(course_ids):
+    for course_id in course_ids:
+        try:
+            cache.incr(_version_key(course_id))
+        except ValueError:
+            # Версии нет (не заводилась или вытеснена) - следующее чтение заведёт новую, уникальную
+            pass
+
+
+def invalidate_course_structure(course_ids):
+    """
+    Сменить версию дерева курсов после коммита транзакции. Старое дерево не удаляется, а перестаёт
+    читаться: построенное параллельным запросом по старым данным ляжет под старую версию.
+    """
+
+    course_ids = {course_id for course_id in course_ids if course_id is not None}
+    if course_ids:
+        transaction.on_commit(lambda: _bump_versions(course_ids))
+
+
+def build_course_tree(course_id):
+    """Дерево курса: данные курса, модули -> уроки и тесты с числом вопросов (четыре запроса)"""
+
+    course = Course.objects.select_related('teacher').filter(pk=course_id).first()
+    if course is None:
+        return None
+
+    modules = {
+        module['id']: {**module, 'lessons': [], 'quizzes': []}
+        for module in Module.objects.filter(course_id=course_id).order_by('order_num', 'pk')
+        .values('id', 'title', 'description', 'order_num', 'is_unlocked')
+    }
+    lessons = Lesson.objects.filter(module__course_id=course_id).order_by('order_num', 'pk') \
+        .values('id', 'module_id', 'title', 'content_type', 'order_num', 'duration_minutes')
+    for lesson in lessons:
+        modules[lesson['module_id']]['lessons'].append(lesson)
+    quizzes = Quiz.objects.filter(module__course_id=course_id).order_by('created_at', 'pk') \
+        .values('id', 'module_id', 'title', 'max_score', 'is_published') \
+        .annotate(question_count=Count('questions'))
+    for quiz in quizzes:
+        modules[quiz['module_id']]['quizzes'].append(quiz)
+
+    return {
+        'course': {
+            'pk': course.pk,
+            'title': course.title,
+            'description': course.description,
+            'status': course.status,
+            'start_date': course.start_date,
+            'end_date': course.end_date,
+            'teacher': {'full_name': course.teacher.full_name if course.teacher else None},
+        },
+        'modules': list(modules.values()),
+    }
+
+
+def get_course_tree(course_id):
+    """Дерево курса из кеша; при промахе строится и сохраняется под текущей версией. None - курса нет"""
+
+    key = _tree_key(course_id, get_structure_version(course_id))
+    tree = cache.get(key)
+    counters.count('course_tree', tree is not None)
+    if tree is None:
+        tree = build_course_tree(course_id)
+        if tree is not None:
+            cache.set(key, tree, TREE_TIMEOUT)
+    return tree
+
+
+def build_course_stats(course_id):
+    course = Course.objects.filter(pk=course_id).values('active_count', 'completed_count').first() or {}
+    avg_score = QuizResult.objects.filter(quiz__module__course_id=course_id) \
+        .aggregate(avg=Avg('percentage'))['avg'] or 0
+    progress = CourseProgress.objects.filter(course_id=course_id)
+    avg_progress = progress.aggregate(avg=Avg('percent'))['avg'] or 0
+    top_progress = list(
+        progress.order_by('-percent', 'student__full_name')
+        .values('student__full_name', 'completed_lessons', 'total_lessons', 'percent')[:TOP_PROGRESS_LIMIT]
+    )
+    return {
+        'enrolled_count': course.get('active_count', 0),
+        'completed_count': course.get('completed_count', 0),
+        'avg_score': round(avg_score, 2),
+        'avg_progress': round(avg_progress, 1),
+        'top_progress': top_progress,
+    }
+
+
+def get_course_stats(course_id):
+    """Статистика курса (записи, средний балл, прогресс) с коротким сроком жизни, без инвалидации"""
+
+    stats = cache.get(_stats_key(course_id))
+    counters.count('course_stats', stats is not None)
+    if stats is None:
+        stats = build_course_stats(course_id)
+        cache.set(_stats_key(course_id), stats, STATS_TIMEOUT)
+    return stats
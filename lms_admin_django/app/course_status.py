@@ -0,0 +1,122 @@
+import datetime
+import traceback
+from contextlib import contextmanager
+from django.db import connection, transaction
+from django.utils import timezone
+from .audit import build_entry, write_entries
+from .caching import invalidate_model_fragments
+from .course_cache import invalidate_course_structure
+from .jobs import update_progress
+from .models import Course, BackgroundJob
+from .stats import apply_dashboard_delta
+
+JOB_KIND = 'course_status'
+BATCH_SIZE = 500
+
+# Статусы, из которых курс ещё может перейти; по ним построены частичные индексы Course.Meta.indexes
+OPEN_STATUSES = ('draft', 'published')
+
+# Ключ рекомендательной блокировки PostgreSQL: два планировщика не обрабатывают курсы одновременно
+ADVISORY_LOCK_ID = 0x4C4D5301
+
+
+def last_run_date():
+    """Дата, на которую выполнен последний успешный проход (as_of), или None"""
+
+    result = BackgroundJob.objects.filter(kind=JOB_KIND, status='done').order_by('-pk') \
+        .values_list('result', flat=True).first()
+    return datetime.date.fromisoformat(result['as_of']) if result else None
+
+
+def due_transitions(as_of, since=None):
+    """
+    Курсы к переходу на дату as_of, как в процедуре update_course_status: завершившиеся -> archived,
+    затем начавшиеся черновики -> published. С since - только те, чья граница пройдена после since
+    (прошлый проход уже обработал более ранние). Оба запроса идут по частичным индексам.
+    """
+
+    archive = Course.objects.filter(status__in=OPEN_STATUSES, end_date__lt=as_of)
+    publish = Course.objects.filter(status='draft', start_date__lte=as_of)
+    if since is not None:
+        archive = archive.filter(end_date__gte=since)
+        publish = publish.filter(start_date__gt=since)
+    return [('archived', archive, 'end_date'), ('published', publish, 'start_date')]
+
+
+def _apply_batch(new_status, rows):
+    pks = [pk for pk, _ in rows]
+    Course.objects.filter(pk__in=pks).update(status=new_status)
+    # UPDATE обходит сигналы: снимок панели, дерево курса и фрагменты поправляем сами,
+    # а переходы пишем в журнал аудита в той же транзакции
+    published = sum(old == 'published' for _, old in rows)
+    apply_dashboard_delta(active_courses=len(rows) - published if new_status == 'published' else -published)
+    invalidate_course_structure(pks)
+    invalidate_model_fragments(Course)
+    write_entries([build_entry('UPDATE', Course(pk=pk, status=new_status), {'status': old}) for pk, old in rows])
+
+
+def apply_transitions(as_of, since=None, batch_size=BATCH_SIZE, progress=None):
+    """Выполнить переходы пачками по batch_size курсов, каждая пачка - отдельная транзакция"""
+
+    counts = {}
+    for new_status, queryset, date_field in due_transitions(as_of, since):
+        counts[new_status] = 0
+        rows_query = queryset.order_by(date_field, 'pk').values_list('pk', 'status')
+        while True:
+            with transaction.atomic():
+                rows = list(rows_query.select_for_update()[:batch_size])
+                if not rows:
+                    break
+                _apply_batch(new_status, rows)
+            counts[new_status] += len(rows)
+            if progress:
+                progress(sum(counts.values()))
+    return counts
+
+
+@contextmanager
+def scheduler_lock():
+    """Рекомендательная блокировка на время прохода (PostgreSQL); True - блокировка получена"""
+
+    if connection.vendor != 'postgresql':
+        yield True
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_try_advisory_lock(%s)', [ADVISORY_LOCK_ID])
+        acquired = cursor.fetchone()[0]
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_advisory_unlock(%s)', [ADVISORY_LOCK_ID])
+
+
+def run_course_status(as_of=None, full=False, batch_size=BATCH_SIZE):
+    """
+    Проход планировщика статусов курсов с записью в BackgroundJob. По умолчанию - инкрементальный
+    от даты прошлого прохода; full - все просроченные курсы (догоняет даты, исправленные задним числом).
+    Возвращает результат прохода или None, если параллельно выполняется другой проход.
+    """
+
+    as_of = as_of or timezone.localdate()
+    since = None if full else last_run_date()
+    if since is not None and since > as_of:
+        since = None
+    with scheduler_lock() as acquired:
+        if not acquired:
+            return None
+        job = BackgroundJob.objects.create(kind=JOB_KIND, status='running')
+        try:
+            counts = apply_transitions(as_of, since, batch_size, progress=lambda done: update_progress(job.pk, done))
+        except Exception:
+            BackgroundJob.objects.filter(pk=job.pk).update(
+                status='failed', error=traceback.format_exc(), finished_at=timezone.now()
+            )
+            raise
+        result = {'as_of': as_of.isoformat(), 'since': since.isoformat() if since else None, **counts}
+        BackgroundJob.objects.filter(pk=job.pk).update(
+            status='done', total=sum(counts.values()), processed=sum(counts.values()), result=result,
+            finished_at=timezone.now(),
+        )
+        return result
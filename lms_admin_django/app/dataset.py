@@ -0,0 +1,237 @@
+import csv
+import io
+import itertools
+import random
+from datetime import timedelta
+from decimal import Decimal
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.utils import timezone
+from .caching import invalidate_model_fragments
+from .counters import find_counter_mismatches, repair_counters
+from .models import (
+    User, Group, Course, Module, Lesson, Quiz, Question, Answer, Enrollment, QuizResult, StudentProgress,
+    CourseProgress, DashboardStats,
+)
+from .progress import rebuild_all_progress
+from .stats import rebuild_dashboard_stats
+
+# Масштаб 1.0 - целевой объём: 1M пользователей, 10k курсов, ~50M строк прогресса, ~20M результатов тестов
+BASE_SCALE = {'students': 1_000_000, 'courses': 10_000}
+
+DEFAULTS = {
+    'modules_per_course': 5,
+    'lessons_per_module': 5,
+    'quizzes_per_module': 2,
+    'questions_per_quiz': 5,
+    'enrollments_per_student': 3,
+    'results_per_enrollment': 7,
+    'students_per_group': 30,
+    'batch_size': 10_000,
+}
+
+
+def _batches(rows, size):
+    iterator = iter(rows)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _copy_batch(model, columns, batch):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(tuple(r'\N' if value is None else value for value in values) for values in batch)
+    buffer.seek(0)
+    with connection.cursor() as cursor:
+        cursor.cursor.copy_expert(
+            f'COPY {connection.ops.quote_name(model._meta.db_table)} '
+            f'({", ".join(connection.ops.quote_name(column) for column in columns)}) '
+            f"FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+            buffer,
+        )
+
+
+def load_rows(model, fields, rows, batch_size=DEFAULTS['batch_size']):
+    """
+    Загрузить кортежи значений полей fields пачками: на PostgreSQL через COPY FROM STDIN,
+    на других СУБД через bulk_create. Остальные поля получают значения по умолчанию из модели;
+    сигналы и auto_now_add не срабатывают - такие даты передаются явно.
+    """
+
+    missing = [field for field in model._meta.concrete_fields
+               if not field.primary_key and field.attname not in fields]
+    fields = list(fields) + [field.attname for field in missing]
+    defaults = tuple(field.get_default() for field in missing)
+    columns = [model._meta.get_field(field).column for field in fields]
+    loaded = 0
+    for batch in _batches((tuple(values) + defaults for values in rows), batch_size):
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                _copy_batch(model, columns, batch)
+            else:
+                model.objects.bulk_create([model(**dict(zip(fields, values))) for values in batch])
+        loaded += len(batch)
+    return loaded
+
+
+def _ids(queryset):
+    return list(queryset.order_by('pk').values_list('pk', flat=True).iterator(chunk_size=DEFAULTS['batch_size']))
+
+
+def generate_large_dataset(prefix='gen', scale=0.001, students=None, courses=None, seed=42, progress=None,
+                           **options):
+    """
+    Сгенерировать согласованный набор данных заданного масштаба и загрузить его без ORM-объектов
+    на каждую строку. Строки прогресса и результатов генерируются потоком по записям на курсы,
+    поэтому память не растёт с их числом. Денормализованные таблицы пересчитываются в конце.
+    progress(имя таблицы, загружено строк) вызывается после каждой таблицы.
+    """
+
+    options = {**DEFAULTS, **options}
+    batch_size = options['batch_size']
+    students = students if students is not None else max(1, int(BASE_SCALE['students'] * scale))
+    courses = courses if courses is not None else max(1, int(BASE_SCALE['courses'] * scale))
+    rng = random.Random(seed)
+    now = timezone.now()
+    password = make_password(None)
+    report = progress or (lambda table, rows: None)
+    sizes = {}
+
+    def load(model, fields, rows):
+        sizes[model._meta.db_table] = load_rows(model, fields, rows, batch_size)
+        report(model._meta.db_table, sizes[model._meta.db_table])
+
+    # Пользователи: на 50 студентов один преподаватель, на 1000 - один администратор
+    teachers = max(1, students // 50)
+    admins = max(1, students // 1000)
+    user_fields = ['email', 'full_name', 'role', 'password', 'is_active', 'is_staff', 'is_superuser',
+                   'created_at', 'date_joined']
+
+    def users(role, count):
+        for i in range(count):
+            created = now - timedelta(days=rng.randint(0, 3 * 365))
+            yield (f'{prefix}-{role}-{i}@example.com', f'{role.capitalize()} {prefix} {i:07d}', role, password,
+                   rng.random() > 0.02, role == 'admin', role == 'admin', created, created)
+
+    load(User, user_fields, itertools.chain(
+        users('admin', admins), users('teacher', teachers), users('student', students)
+    ))
+    teacher_ids = _ids(User.objects.filter(email__startswith=f'{prefix}-teacher-'))
+    student_ids = _ids(User.objects.filter(email__startswith=f'{prefix}-student-'))
+
+    group_count = max(1, students // options['students_per_group'])
+    load(Group, ['group_name', 'curator_id', 'created_at'], (
+        (f'{prefix}-{i}', rng.choice(teacher_ids), now) for i in range(group_count)
+    ))
+    group_ids = _ids(Group.objects.filter(group_name__startswith=f'{prefix}-'))
+
+    course_statuses = ['published'] * 8 + ['draft', 'archived']
+
+    def course_rows():
+        for i in range(courses):
+            start = (now - timedelta(days=rng.randint(-60, 720))).date()
+            yield (f'Курс {prefix} {i:06d}', rng.choice(teacher_ids), rng.choice(course_statuses), start,
+                   start + timedelta(days=rng.choice((30, 60, 90, 180))), now)
+
+    load(Course, ['title', 'teacher_id', 'status', 'start_date', 'end_date', 'created_at'], course_rows())
+    generated = Course.objects.filter(title__startswith=f'Курс {prefix} ')
+    course_ids = _ids(generated)
+
+    load(Module, ['course_id', 'title', 'order_num', 'is_unlocked'], (
+        (course_id, f'Модуль {n}', n, True)
+        for course_id in course_ids for n in range(1, options['modules_per_course'] + 1)
+    ))
+    modules = {}
+    for module_id, course_id in Module.objects.filter(course__in=generated).order_by('course_id', 'order_num') \
+            .values_list('pk', 'course_id').iterator(chunk_size=batch_size):
+        modules.setdefault(course_id, []).append(module_id)
+
+    content_types = ['text', 'video', 'video', 'pdf', 'link']
+    load(Lesson, ['module_id', 'title', 'content_type', 'order_num', 'duration_minutes'], (
+        (module_id, f'Урок {n}', rng.choice(content_types), n, rng.randint(5, 60))
+        for course_id in course_ids for module_id in modules[course_id]
+        for n in range(1, options['lessons_per_module'] + 1)
+    ))
+    lessons = {}
+    for lesson_id, module_id, course_id in Lesson.objects.filter(module__course__in=generated) \
+            .order_by('module__course_id', 'module__order_num', 'order_num') \
+            .values_list('pk', 'module_id', 'module__course_id').iterator(chunk_size=batch_size):
+        lessons.setdefault(course_id, []).append((module_id, lesson_id))
+
+    load(Quiz, ['module_id', 'title', 'max_score', 'passing_score', 'is_published', 'created_at'], (
+        (module_id, f'Тест {n}', 100, 60, True, now)
+        for course_id in course_ids for module_id in modules[course_id]
+        for n in range(1, options['quizzes_per_module'] + 1)
+    ))
+    quizzes = {}
+    for quiz_id, course_id in Quiz.objects.filter(module__course__in=generated).order_by('pk') \
+            .values_list('pk', 'module__course_id').iterator(chunk_size=batch_size):
+        quizzes.setdefault(course_id, []).append(quiz_id)
+    quiz_ids = [quiz_id for course_id in course_ids for quiz_id in quizzes.get(course_id, ())]
+
+    difficulties = ['easy', 'medium', 'medium', 'hard']
+    load(Question, ['quiz_id', 'question_text', 'question_type', 'points', 'difficulty', 'order_num'], (
+        (quiz_id, f'Вопрос {n}', 'single', 1, rng.choice(difficulties), n)
+        for quiz_id in quiz_ids for n in range(1, options['questions_per_quiz'] + 1)
+    ))
+    load(Answer, ['question_id', 'answer_text', 'is_correct', 'order_num'], (
+        (question_id, f'Вариант {n}', n == 1, n)
+        for question_id in _ids(Question.objects.filter(quiz__module__course__in=generated)) for n in range(1, 5)
+    ))
+
+    # Записи студента на курсы выводятся из его собственного генератора случайных чисел:
+    # три прохода (записи, прогресс, результаты) видят одни и те же записи без хранения миллионов строк
+    enrollment_statuses = ['active'] * 6 + ['completed'] * 3 + ['dropped']
+    per_student = min(options['enrollments_per_student'], len(course_ids))
+
+    def enrollments():
+        for student_id in student_ids:
+            plan = random.Random(seed * 1_000_003 + student_id)
+            group_id = plan.choice(group_ids)
+            for course_id in plan.sample(course_ids, per_student):
+                yield student_id, course_id, group_id, plan.choice(enrollment_statuses)
+
+    def enrollment_rows():
+        for student_id, course_id, group_id, status in enrollments():
+            enrolled = now - timedelta(days=rng.randint(1, 365))
+            yield (student_id, course_id, group_id, status, enrolled,
+                   enrolled + timedelta(days=30) if status == 'completed' else None)
+
+    def progress_rows():
+        for student_id, course_id, _, status in enrollments():
+            course_lessons = lessons.get(course_id, ())
+            done = len(course_lessons) if status == 'completed' else rng.randint(0, len(course_lessons))
+            for index, (module_id, lesson_id) in enumerate(course_lessons[:done + 1]):
+                if index < done:
+                    yield student_id, module_id, lesson_id, 'completed', now - timedelta(days=rng.randint(0, 300))
+                else:
+                    yield student_id, module_id, lesson_id, 'in_progress', None
+
+    def result_rows():
+        for student_id, course_id, _, _ in enrollments():
+            course_quizzes = quizzes.get(course_id, ())
+            for quiz_id in rng.sample(course_quizzes, min(options['results_per_enrollment'], len(course_quizzes))):
+                score = min(100, max(0, int(rng.gauss(70, 15))))
+                submitted = now - timedelta(days=rng.randint(0, 300), minutes=rng.randint(0, 1440))
+                yield (quiz_id, student_id, score, 100, Decimal(score), submitted - timedelta(minutes=30),
+                       submitted, score >= 60)
+
+    load(Enrollment, ['student_id', 'course_id', 'group_id', 'status', 'enrolled_at', 'completed_at'],
+         enrollment_rows())
+    load(StudentProgress, ['student_id', 'module_id', 'lesson_id', 'status', 'completed_at'], progress_rows())
+    load(QuizResult, ['quiz_id', 'student_id', 'score', 'max_score', 'percentage', 'started_at', 'submitted_at',
+                      'is_passed'], result_rows())
+
+    # Загрузка обходит сигналы - пересчитываем денормализованные данные и сбрасываем фрагменты кеша
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+    repair_counters(find_counter_mismatches())
+    sizes[CourseProgress._meta.db_table] = rebuild_all_progress()
+    report(CourseProgress._meta.db_table, sizes[CourseProgress._meta.db_table])
+    rebuild_dashboard_stats()
+    invalidate_model_fragments(User, Group, Course, Module, Lesson, Quiz, Question, Answer, Enrollment,
+                               QuizResult, StudentProgress, CourseProgress, DashboardStats)
+    return sizes
@@ -0,0 +1,128 @@
+import threading
+from collections import deque
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.postgresql import base
+from psycopg2 import extensions
+from psycopg2.extras import register_default_jsonb
+
+DEFAULT_POOL = {
+    'MIN_SIZE': 1,  # открываются при создании пула
+    'MAX_SIZE': 10,  # выданных и свободных соединений вместе
+    'TIMEOUT': 10.0,  # ожидание свободного соединения, с
+}
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class PoolTimeout(base.Database.OperationalError):
+    """Все соединения пула заняты дольше POOL['TIMEOUT'] секунд"""
+
+
+class ConnectionPool:
+    """
+    Пул соединений psycopg2 в памяти процесса. Свободные соединения хранятся до max_size штук
+    (ThreadedConnectionPool закрывает всё сверх minconn), новые открываются по требованию;
+    семафор ограничивает число выданных соединений и заставляет ждать не дольше timeout.
+    """
+
+    def __init__(self, conn_params, min_size, max_size, timeout):
+        self.conn_params = conn_params
+        self.idle = deque()
+        self.lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(max_size)
+        self.timeout = timeout
+        for _ in range(min_size):
+            self.idle.append(self._connect())
+
+    def _connect(self):
+        return base.Database.connect(**self.conn_params)
+
+    def getconn(self):
+        if not self.slots.acquire(timeout=self.timeout):
+            raise PoolTimeout(f'Нет свободных соединений в пуле за {self.timeout} с')
+        try:
+            with self.lock:
+                # Последнее возвращённое соединение - с наибольшей вероятностью живое
+                connection = self.idle.pop() if self.idle else None
+            return connection or self._connect()
+        except Exception:
+            self.slots.release()
+            raise
+
+    def putconn(self, connection, close=False):
+        try:
+            if not close and not connection.closed:
+                status = connection.info.transaction_status
+                if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                    close = True
+                elif status != extensions.TRANSACTION_STATUS_IDLE:
+                    # Незавершённая транзакция откатывается
+                    connection.rollback()
+            if close or connection.closed:
+                # Разорванное или сбойное соединение закрывается, следующий запрос откроет новое
+                if not connection.closed:
+                    connection.close()
+            else:
+                with self.lock:
+                    self.idle.append(connection)
+        finally:
+            self.slots.release()
+
+    def closeall(self):
+        with self.lock:
+            while self.idle:
+                self.idle.pop().close()
+
+
+def get_pool(alias, settings_dict, conn_params):
+    key = (alias, tuple(sorted((name, str(value)) for name, value in conn_params.items())))
+    with _pools_lock:
+        if key not in _pools:
+            config = {**DEFAULT_POOL, **settings_dict.get('POOL', {})}
+            if config['MIN_SIZE'] > config['MAX_SIZE']:
+                raise ImproperlyConfigured('POOL: MIN_SIZE больше MAX_SIZE')
+            _pools[key] = ConnectionPool(conn_params, config['MIN_SIZE'], config['MAX_SIZE'], config['TIMEOUT'])
+        return _pools[key]
+
+
+def _is_usable(connection):
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        # Без autocommit SELECT открыл транзакцию - закрываем её до настройки соединения Django
+        connection.rollback()
+        return True
+    except base.Database.Error:
+        return False
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    PostgreSQL с пулом соединений процесса (для ASGI, где постоянные соединения Django
+    привязаны к потоку и не переиспользуются). Закрытие соединения Django после запроса
+    возвращает его в пул. Настройки пула - ключ POOL в описании базы (см. DEFAULT_POOL).
+    """
+
+    def get_new_connection(self, conn_params):
+        pool = get_pool(self.alias, self.settings_dict, conn_params)
+        connection = pool.getconn()
+        # Соединение могло оборваться, пока лежало в пуле: проверяем и при необходимости берём другое
+        if connection.closed or (self.settings_dict['CONN_HEALTH_CHECKS'] and not _is_usable(connection)):
+            pool.putconn(connection, close=True)
+            connection = pool.getconn()
+        self._pool = pool
+
+        options = self.settings_dict['OPTIONS']
+        if 'isolation_level' in options:
+            self.isolation_level = base.IsolationLevel(options['isolation_level'])
+            connection.isolation_level = self.isolation_level
+        else:
+            self.isolation_level = base.IsolationLevel.READ_COMMITTED
+        register_default_jsonb(conn_or_curs=connection, loads=lambda x: x)
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self._pool.putconn(self.connection, close=self.errors_occurred)
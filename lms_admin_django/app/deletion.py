@@ -0,0 +1,232 @@
+from collections import Counter
+from django.apps import apps
+from django.db import connection, models, transaction
+from django.db.models import Count, Q, Sum
+from .audit import build_bulk_entry, record
+from .caching import invalidate_model_fragments
+from .counters import apply_enrollment_delta
+from .course_cache import invalidate_course_structure
+from .gradebook import invalidate_gradebook
+from .grading import invalidate_answer_key
+from .jobs import update_progress
+from .pagination import estimate_count
+from .models import User, Course, Quiz, Enrollment, QuizResult
+from .stats import apply_dashboard_delta
+
+BATCH_SIZE = 1000
+MAX_DEPTH = 10
+
+ROLE_COUNTERS = {'student': 'total_students', 'teacher': 'total_teachers'}
+
+
+class DeletionNode:
+    """
+    Узел плана удаления: строки модели, которые нужно удалить (DELETE) или отвязать (SET_NULL в поле field).
+    Строки задаются подзапросом от строк родителя и перечитываются на каждой пачке.
+    """
+
+    __slots__ = ('model', 'queryset', 'action', 'field', 'children')
+
+    def __init__(self, model, queryset, action='delete', field=None, children=()):
+        self.model = model
+        self.queryset = queryset
+        self.action = action
+        self.field = field
+        self.children = list(children)
+
+    def height(self):
+        return 1 + max((child.height() for child in self.children), default=0)
+
+    def walk(self):
+        """Узлы снизу вверх: дети раньше родителя - в каждый момент внешние ключи остаются целыми"""
+
+        for child in self.children:
+            yield from child.walk()
+        yield self
+
+
+def _relations(model):
+    # Те же обратные связи, что обходит Collector Django, включая промежуточные таблицы ManyToMany
+    return [
+        field for field in model._meta.get_fields(include_hidden=True)
+        if field.auto_created and not field.concrete and (field.one_to_one or field.one_to_many)
+    ]
+
+
+def _build_children(model, queryset, depth):
+    if depth > MAX_DEPTH:
+        raise ValueError(f'Слишком глубокая цепочка каскадного удаления от {model._meta.label}')
+    children = []
+    for relation in _relations(model):
+        field = relation.field
+        on_delete = field.remote_field.on_delete
+        related = relation.related_model._base_manager.filter(**{f'{field.name}__in': queryset})
+        if on_delete is models.CASCADE:
+            children.append(DeletionNode(relation.related_model, related,
+                                         children=_build_children(relation.related_model, related, depth + 1)))
+        elif on_delete is models.SET_NULL:
+            children.append(DeletionNode(relation.related_model, related, 'set_null', field))
+        elif on_delete in (models.PROTECT, models.RESTRICT):
+            if related.exists():
+                raise models.ProtectedError(
+                    f'Удаление запрещено: на {model._meta.verbose_name} ссылаются строки '
+                    f'{relation.related_model._meta.label} ({field.name})', set()
+                )
+        elif on_delete is not models.DO_NOTHING:
+            raise ValueError(f'Правило {on_delete.__name__} для {field} не поддерживается')
+    # Мелкие поддеревья - первыми: строки, удаляемые напрямую (прогресс модуля), уходят раньше,
+    # чем их пришлось бы отвязывать через SET_NULL от удаляемых уроков
+    return sorted(children, key=DeletionNode.height)
+
+
+def build_plan(model, pks):
+    """План каскадного удаления строк model с первичными ключами pks (без загрузки строк в память)"""
+
+    queryset = model._base_manager.filter(pk__in=list(pks))
+    return DeletionNode(model, queryset, children=_build_children(model, queryset, 1))
+
+
+def estimate(plan, approximate=False):
+    """
+    Масштаб удаления до запуска: [(таблица, действие, число строк)] в порядке выполнения.
+    Таблица, достижимая несколькими путями, считается по каждому пути. approximate - оценки
+    планировщика PostgreSQL (estimate_count) вместо точных COUNT по вложенным подзапросам,
+    которые у крупного преподавателя идут минутами; без оценки (другие СУБД) - точный COUNT.
+    """
+
+    totals = Counter()
+    for node in plan.walk():
+        count = estimate_count(node.queryset) if approximate else None
+        totals[(node.model._meta.db_table, node.action)] += node.queryset.count() if count is None else count
+    return [(table, action, count) for (table, action), count in totals.items() if count]
+
+
+# --- Денормализованные данные ---
+# Сырые DELETE обходят сигналы: счётчики и кеши поправляются в той же транзакции, что и пачка
+
+def _enrollments_deleted(pks):
+    rows = Enrollment.objects.filter(pk__in=pks).order_by().values('course_id', 'status').annotate(total=Count('pk'))
+    active = 0
+    for row in rows:
+        apply_enrollment_delta(row['course_id'], row['status'], -row['total'])
+        invalidate_gradebook(row['course_id'])
+        if row['status'] == 'active':
+            active += row['total']
+    apply_dashboard_delta(total_enrollments=-active)
+
+
+def _quiz_results_deleted(pks):
+    totals = QuizResult.objects.filter(pk__in=pks).aggregate(count=Count('pk'), total=Sum('percentage'))
+    apply_dashboard_delta(quiz_results_count=-totals['count'], quiz_percentage_sum=-(totals['total'] or 0))
+
+
+def _courses_deleted(pks):
+    totals = Course.objects.filter(pk__in=pks).aggregate(
+        count=Count('pk'), published=Count('pk', filter=Q(status='published'))
+    )
+    apply_dashboard_delta(total_courses=-totals['count'], active_courses=-totals['published'])
+    invalidate_course_structure(pks)
+
+
+def _quizzes_deleted(pks):
+    for quiz_id in pks:
+        invalidate_answer_key(quiz_id)
+
+
+def _users_deleted(pks):
+    deltas = Counter(total_users=-len(pks))
+    for role, total in User.objects.filter(pk__in=pks).order_by().values_list('role').annotate(Count('pk')):
+        if role in ROLE_COUNTERS:
+            deltas[ROLE_COUNTERS[role]] -= total
+    apply_dashboard_delta(**deltas)
+
+
+BEFORE_DELETE = {
+    Enrollment: _enrollments_deleted,
+    QuizResult: _quiz_results_deleted,
+    Course: _courses_deleted,
+    Quiz: _quizzes_deleted,
+    User: _users_deleted,
+}
+
+
+# --- Выполнение ---
+
+def _process_batch(node, pks):
+    table = connection.ops.quote_name(node.model._meta.db_table)
+    pk_column = connection.ops.quote_name(node.model._meta.pk.column)
+    placeholders = ', '.join(['%s'] * len(pks))
+    with connection.cursor() as cursor:
+        if node.action == 'set_null':
+            cursor.execute(f'UPDATE {table} SET {connection.ops.quote_name(node.field.column)} = NULL '
+                           f'WHERE {pk_column} IN ({placeholders})', pks)
+        else:
+            hook = BEFORE_DELETE.get(node.model)
+            if hook:
+                hook(pks)
+            cursor.execute(f'DELETE FROM {table} WHERE {pk_column} IN ({placeholders})', pks)
+
+
+def _drain(node, batch_size, progress):
+    # Курсор по pk: каждая пачка продолжает индекс с места предыдущей, а не перечитывает остаток
+    # с начала. Строки, добавленные позади курсора, дочищает финальный проход delete_cascade
+    processed, last_pk = 0, None
+    pks_query = node.queryset.order_by('pk').values_list('pk', flat=True)
+    while True:
+        with transaction.atomic():
+            batch = pks_query if last_pk is None else pks_query.filter(pk__gt=last_pk)
+            pks = list(batch[:batch_size])
+            if not pks:
+                return processed
+            _process_batch(node, pks)
+        processed += len(pks)
+        last_pk = pks[-1]
+        if progress:
+            progress(len(pks))
+
+
+def delete_cascade(model, pks, batch_size=BATCH_SIZE, progress=None):
+    """
+    Удалить строки model и всё, что на них каскадно ссылается, снизу вверх пачками по batch_size
+    строк, каждая пачка - отдельная транзакция. При прерывании остаются целые строки с верными
+    счётчиками, а повторный вызов дочищает остаток. Корневые строки удаляются последней транзакцией
+    под блокировкой FOR UPDATE - строки, добавленные за время удаления, удаляются вместе с ними.
+    Возвращает {таблица: обработано строк}.
+    """
+
+    pks = list(pks)
+    plan = build_plan(model, pks)
+    done = Counter()
+    for node in plan.walk():
+        if node is not plan:
+            done[node.model._meta.db_table] += _drain(node, batch_size, progress)
+
+    with transaction.atomic():
+        list(model._base_manager.filter(pk__in=pks).select_for_update().values_list('pk', flat=True))
+        for node in plan.walk():
+            done[node.model._meta.db_table] += _drain(node, batch_size, progress)
+
+    invalidate_model_fragments(*{node.model for node in plan.walk()})
+    record(build_bulk_entry('DELETE', model._meta.db_table, {
+        'ids': pks, 'deleted': {table: count for table, count in done.items() if count},
+    }))
+    return dict(done)
+
+
+def run_deletion_job(job_id, model_label, pks, batch_size=BATCH_SIZE):
+    """Каскадное удаление в фоновой задаче: всего - оценка масштаба, обработано - по пачкам"""
+
+    model = apps.get_model(model_label)
+    total = sum(count for _, _, count in estimate(build_plan(model, pks), approximate=True))
+    update_progress(job_id, 0, total)
+    processed = 0
+
+    def progress(count):
+        nonlocal processed
+        processed += count
+        update_progress(job_id, processed)
+
+    deleted = delete_cascade(model, pks, batch_size, progress)
+    # Оценка приблизительна, считает таблицы по каждому пути и строки, удалённые раньше, чем их пришлось отвязывать
+    update_progress(job_id, processed, processed)
+    return deleted
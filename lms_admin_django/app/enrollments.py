@@ -0,0 +1,138 @@
+from django.db import connection, transaction
+from .audit import build_bulk_entry, record
+from .caching import invalidate_model_fragments
+from .counters import apply_enrollment_delta
+from .gradebook import invalidate_gradebook
+from .models import User, Course, Enrollment
+from .progress import refresh_course_progress
+from .stats import apply_dashboard_delta
+
+
+# Итог записи для каждого студента
+ENROLLED = 'enrolled'
+ALREADY_ENROLLED = 'already_enrolled'
+NOT_STUDENT = 'not_student'
+COURSE_FULL = 'course_full'
+
+OUTCOME_LABELS = {
+    ENROLLED: 'Записан',
+    ALREADY_ENROLLED: 'Уже записан',
+    NOT_STUDENT: 'Не студент',
+    COURSE_FULL: 'Нет мест',
+}
+
+
+class EnrollmentResult:
+    """Итог массовой записи: {student_id: итог} в порядке исходного списка"""
+
+    def __init__(self, course, outcomes):
+        self.course = course
+        self.outcomes = outcomes
+
+    def students_with(self, outcome):
+        return [student_id for student_id, value in self.outcomes.items() if value == outcome]
+
+    @property
+    def enrolled(self):
+        return len(self.students_with(ENROLLED))
+
+    def counts(self):
+        counts = dict.fromkeys(OUTCOME_LABELS, 0)
+        for outcome in self.outcomes.values():
+            counts[outcome] += 1
+        return counts
+
+
+def group_student_ids(group):
+    """Студенты группы - те, у кого есть запись на какой-либо курс в составе этой группы"""
+
+    return list(Enrollment.objects.filter(group=group).order_by('student_id')
+                .values_list('student_id', flat=True).distinct())
+
+
+def _insert_enrollments(course_id, group_id, student_ids, limit):
+    """
+    Один INSERT ... SELECT: записывает студентов из списка, которые ещё не записаны на курс,
+    не больше limit (None - без ограничения). ON CONFLICT на (student, course) страхует
+    от одновременной записи того же студента другим запросом. Возвращает id записанных.
+    """
+
+    if connection.vendor == 'postgresql':
+        id_filter, id_params = 'u.user_id = ANY(%s)', [list(student_ids)]
+    else:
+        id_filter, id_params = f'u.user_id IN ({", ".join(["%s"] * len(student_ids))})', list(student_ids)
+
+    sql = f"""
+        INSERT INTO {Enrollment._meta.db_table} (student_id, course_id, group_id, status, enrolled_at)
+        SELECT u.user_id, %s, CAST(%s AS integer), 'active', CURRENT_TIMESTAMP
+        FROM {User._meta.db_table} u
+        WHERE {id_filter} AND u.role = 'student'
+          AND NOT EXISTS (SELECT 1 FROM {Enrollment._meta.db_table} e
+                          WHERE e.student_id = u.user_id AND e.course_id = %s)
+        ORDER BY u.user_id
+        LIMIT %s
+        ON CONFLICT (student_id, course_id) DO NOTHING
+        RETURNING student_id
+    """
+    # LIMIT -1 в SQLite и LIMIT NULL в PostgreSQL означают "без ограничения"
+    no_limit = None if connection.vendor == 'postgresql' else -1
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [course_id, group_id, *id_params, course_id, no_limit if limit is None else limit])
+        return {row[0] for row in cursor.fetchall()}
+
+
+def bulk_enroll(course, student_ids, group=None):
+    """
+    Записать студентов на курс одним запросом. Строка курса блокируется (SELECT ... FOR UPDATE),
+    поэтому одновременные записи на один курс выполняются по очереди и не превышают max_students.
+    Не-студенты и уже записанные пропускаются, при нехватке мест записываются первые по id.
+    """
+
+    student_ids = list(dict.fromkeys(student_ids))
+    if not student_ids:
+        return EnrollmentResult(course, {})
+
+    with transaction.atomic():
+        course = Course.objects.select_for_update().get(pk=course.pk)
+        limit = None
+        if course.max_students is not None:
+            limit = max(course.max_students - course.active_count, 0)
+
+        enrolled = _insert_enrollments(course.pk, group.pk if group else None, student_ids, limit) \
+            if limit != 0 else set()
+
+        students = set(User.objects.filter(pk__in=student_ids, role='student').values_list('pk', flat=True))
+        already = set(Enrollment.objects.filter(course=course, student_id__in=student_ids)
+                      .exclude(student_id__in=enrolled).values_list('student_id', flat=True))
+
+        # INSERT обходит сигналы: счётчики курса, прогресс, статистику и аудит обновляем сами
+        if enrolled:
+            apply_enrollment_delta(course.pk, 'active', len(enrolled))
+            invalidate_gradebook(course.pk)
+            refresh_course_progress(course.pk, enrolled)
+            apply_dashboard_delta(total_enrollments=len(enrolled))
+            invalidate_model_fragments(Enrollment)
+            record(build_bulk_entry('ENROLL', Enrollment._meta.db_table, {
+                'course_id': course.pk,
+                'group_id': group.pk if group else None,
+                'student_ids': sorted(enrolled),
+            }))
+
+    outcomes = {}
+    for student_id in student_ids:
+        if student_id in enrolled:
+            outcomes[student_id] = ENROLLED
+        elif student_id in already:
+            outcomes[student_id] = ALREADY_ENROLLED
+        elif student_id not in students:
+            outcomes[student_id] = NOT_STUDENT
+        else:
+            outcomes[student_id] = COURSE_FULL
+    course.active_count += len(enrolled)
+    return EnrollmentResult(course, outcomes)
+
+
+def enroll_group(course, group):
+    """Записать на курс всех студентов группы"""
+
+    return bulk_enroll(course, group_student_ids(group), group=group)
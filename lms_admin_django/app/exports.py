@@ -0,0 +1,123 @@
+import csv
+import tempfile
+from django.db import connections
+from django.http import FileResponse, Http404, StreamingHttpResponse
+from django.utils import timezone
+from .reports import course_report, student_report
+
+
+# Строк на одну выборку серверного курсора
+CHUNK_SIZE = 2000
+
+
+class _Echo:
+    """Псевдофайл для csv.writer: возвращает строку вместо записи"""
+
+    def write(self, value):
+        return value
+
+
+def csv_response(header, rows, filename):
+    """Потоковый CSV: строки формируются по мере чтения курсора, первый байт уходит сразу"""
+
+    writer = csv.writer(_Echo(), delimiter=';')
+
+    def generate():
+        # BOM и ';' - чтобы Excel с русской локалью сразу открывал файл корректно
+        yield '\ufeff' + writer.writerow(header)
+        for row in rows:
+            yield writer.writerow(row)
+
+    response = StreamingHttpResponse(generate(), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
+    return response
+
+
+def xlsx_response(header, rows, filename):
+    """XLSX в режиме write-only: строки пишутся во временный файл на диске, а не в память"""
+
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(header)
+    for row in rows:
+        sheet.append(row)
+
+    output = tempfile.TemporaryFile()
+    workbook.save(output)
+    output.seek(0)
+    return FileResponse(
+        output, as_attachment=True, filename=f'{filename}.xlsx',
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    )
+
+
+def export_response(export_format, header, rows, filename):
+    if export_format == 'csv':
+        return csv_response(header, rows, filename)
+    if export_format == 'xlsx':
+        return xlsx_response(header, rows, filename)
+    raise Http404('Неизвестный формат выгрузки')
+
+
+# --- Наборы данных для выгрузки ---
+
+def course_report_rows():
+    courses = course_report().order_by('-created_at').values_list(
+        'title', 'teacher__full_name', 'status', 'total_enrolled', 'completed', 'avg_score', 'avg_progress'
+    )
+    return courses.iterator(chunk_size=CHUNK_SIZE)
+
+
+COURSE_REPORT_HEADER = ['Курс', 'Преподаватель', 'Статус', 'Активно', 'Завершено', 'Средний балл',
+                        'Средний прогресс']
+
+
+STUDENT_REPORT_COLUMNS = ('full_name', 'email', 'courses_count', 'completed_courses', 'avg_score', 'avg_progress')
+
+
+def student_report_rows():
+    # RawQuerySet.iterator() читает результат обычным курсором целиком - выполняем его SQL
+    # серверным курсором (как QuerySet.iterator) и выбираем пачками по CHUNK_SIZE
+    report = student_report()
+    connection = connections[report.db]
+    if connection.settings_dict.get('DISABLE_SERVER_SIDE_CURSORS'):
+        cursor = connection.cursor()
+    else:
+        cursor = connection.chunked_cursor()
+    with cursor:
+        cursor.execute(report.raw_query, report.params)
+        indexes = None
+        while True:
+            rows = cursor.fetchmany(CHUNK_SIZE)
+            if not rows:
+                return
+            # У именованного курсора psycopg2 описание столбцов есть только после первой выборки
+            if indexes is None:
+                names = [column[0] for column in cursor.description]
+                indexes = [names.index(name) for name in STUDENT_REPORT_COLUMNS]
+            for row in rows:
+                yield tuple(row[index] for index in indexes)
+
+
+STUDENT_REPORT_HEADER = ['Студент', 'Email', 'Активных курсов', 'Завершено', 'Средний балл', 'Средний прогресс']
+
+
+def audit_log_rows(logs):
+    rows = logs.order_by('-created_at', '-id').values_list(
+        'created_at', 'user__full_name', 'action', 'table_name', 'record_id', 'ip_address', 'old_value', 'new_value'
+    )
+    for created_at, *rest in rows.iterator(chunk_size=CHUNK_SIZE):
+        yield [timezone.localtime(created_at).strftime('%d.%m.%Y %H:%M:%S'), *rest]
+
+
+AUDIT_LOG_HEADER = ['Дата и время', 'Пользователь', 'Действие', 'Таблица', 'ID записи', 'IP адрес',
+                    'Старое значение', 'Новое значение']
+
+IMPORT_ERRORS_HEADER = ['Строка', 'Email', 'Ошибка']
+
+REPORTS = {
+    'courses': (COURSE_REPORT_HEADER, course_report_rows),
+    'students': (STUDENT_REPORT_HEADER, student_report_rows),
+}
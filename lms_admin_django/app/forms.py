@@ -65,4 +65,51 @@ class GroupForm(forms.ModelForm):
             'group_name': forms.TextInput(attrs={'class': 'form-control'}),
             'curator': forms.Select(attrs={'class': 'form-select'}),
             'description': forms.Textarea(attrs={'class': 'form-control', 'rows': 3}),
-        }
\ No newline at end of file
+        }
+
+
+class UserImportForm(forms.Form):
+    """Форма загрузки файла для массового импорта пользователей"""
+
+    FORMATS = ('csv', 'xlsx')
+
+    file = forms.FileField(
+        label='Файл CSV или XLSX',
+        widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': '.csv,.xlsx'}),
+    )
+
+    def clean_file(self):
+        file = self.cleaned_data['file']
+        extension = file.name.rsplit('.', 1)[-1].lower()
+        if extension not in self.FORMATS:
+            raise forms.ValidationError('Поддерживаются только файлы CSV и XLSX')
+        self.file_format = extension
+        return file
+
+
+class BulkEnrollForm(forms.Form):
+    """Массовая запись на курс: группа и/или список email студентов"""
+
+    group = forms.ModelChoiceField(
+        queryset=Group.objects.all(), required=False, label='Группа',
+        widget=forms.Select(attrs={'class': 'form-select'}),
+    )
+    emails = forms.CharField(
+        required=False, label='Email студентов (по одному в строке)',
+        widget=forms.Textarea(attrs={'class': 'form-control', 'rows': 6}),
+    )
+
+    def clean_emails(self):
+        emails = [line.strip() for line in self.cleaned_data['emails'].splitlines() if line.strip()]
+        found = dict(User.objects.filter(email__in=emails).values_list('email', 'pk'))
+        unknown = [email for email in emails if email not in found]
+        if unknown:
+            raise forms.ValidationError(f'Пользователи не найдены: {", ".join(unknown[:10])}')
+        self.student_ids = [found[email] for email in emails]
+        return emails
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if not cleaned_data.get('group') and not cleaned_data.get('emails') and not self.errors:
+            raise forms.ValidationError('Укажите группу или email студентов')
+        return cleaned_data
@@ -0,0 +1,138 @@
+import math
+from array import array
+from django.core.cache import cache
+from django.db.models import Count, Max
+from .caching import counters, get_version
+from .course_cache import get_structure_version
+from .models import Course, Quiz, Enrollment, QuizResult
+from .routers import use_replica
+
+GRADEBOOK_FORMAT = 1
+GRADEBOOK_TIMEOUT = 60 * 60
+
+MISSING = math.nan
+
+
+def _mean(values):
+    present = [value for value in values if not math.isnan(value)]
+    return math.fsum(present) / len(present) if present else None
+
+
+class Gradebook:
+    """
+    Журнал оценок курса: студенты (строки) x тесты (столбцы). Проценты лежат в плотном массиве
+    array('d') построчно, нет результата - NaN; зачёт - в bytearray той же формы. Средние по строкам
+    и столбцам считаются срезами массива (для столбца - срез с шагом в число тестов).
+    """
+
+    __slots__ = ('course_id', 'students', 'quizzes', 'scores', 'passed', 'row_means', 'column_means')
+
+    def __init__(self, course_id, students, quizzes, scores, passed):
+        self.course_id = course_id
+        self.students = students
+        self.quizzes = quizzes
+        self.scores = scores
+        self.passed = passed
+        width = len(quizzes)
+        self.row_means = [_mean(scores[row * width:(row + 1) * width]) for row in range(len(students))]
+        self.column_means = [_mean(scores[column::width]) for column in range(width)] if students else \
+            [None] * width
+
+    def rows(self):
+        """(студент, [(процент или None, зачёт)], средний процент) по строкам"""
+
+        width = len(self.quizzes)
+        for index, student in enumerate(self.students):
+            start = index * width
+            cells = [
+                (None if math.isnan(score) else score, bool(passed))
+                for score, passed in zip(self.scores[start:start + width], self.passed[start:start + width])
+            ]
+            yield student, cells, self.row_means[index]
+
+
+def build_gradebook(course_id):
+    """
+    Журнал оценок тремя запросами: студенты курса, тесты курса и все результаты курса одним запросом
+    кортежей (student_id, quiz_id, percentage, is_passed), разложенные по ячейкам массива.
+    """
+
+    students = list(
+        Enrollment.objects.filter(course_id=course_id).order_by('student__full_name', 'student_id')
+        .values_list('student_id', 'student__full_name', 'student__email')
+    )
+    quizzes = list(
+        Quiz.objects.filter(module__course_id=course_id).order_by('module__order_num', 'created_at', 'pk')
+        .values_list('pk', 'title', 'module__title')
+    )
+    row_of = {student_id: index for index, (student_id, *_) in enumerate(students)}
+    column_of = {quiz_id: index for index, (quiz_id, *_) in enumerate(quizzes)}
+    width = len(quizzes)
+
+    scores = array('d', [MISSING]) * (len(students) * width)
+    passed = bytearray(len(students) * width)
+    results = QuizResult.objects.filter(quiz__module__course_id=course_id).order_by() \
+        .values_list('student_id', 'quiz_id', 'percentage', 'is_passed')
+    for student_id, quiz_id, percentage, is_passed in results.iterator(chunk_size=5000):
+        row = row_of.get(student_id)
+        if row is None:
+            # Результат студента, запись которого удалена, - не строка журнала
+            continue
+        cell = row * width + column_of[quiz_id]
+        scores[cell] = float(percentage)
+        passed[cell] = is_passed
+    return Gradebook(course_id, students, quizzes, scores, passed)
+
+
+# --- Кеш ---
+
+def _generation_key(course_id):
+    return f'gradebook:{course_id}:generation'
+
+
+def invalidate_gradebook(course_id):
+    """
+    Сбросить журнал курса: изменились результаты без новой отметки времени (перепроверка, правка)
+    или строки журнала (записи на курс, ФИО и email студентов)
+    """
+
+    try:
+        cache.incr(_generation_key(course_id))
+    except ValueError:
+        # Поколения нет - следующее чтение заведёт новое, уникальное, и старые журналы не прочитаются
+        pass
+
+
+def gradebook_cache_key(course_id):
+    """
+    Ключ кеша: время последнего результата курса и число результатов (новые и удалённые результаты),
+    версия структуры курса (тесты) и поколение журнала. Поколение сдвигают правки результатов и состав
+    строк: сигналы записей и переименования студентов, массовая запись и каскадное удаление.
+    None - курса нет.
+    """
+
+    state = Course.objects.filter(pk=course_id).order_by('pk').values('pk') \
+        .annotate(latest=Max('modules__quizzes__results__submitted_at'), results=Count('modules__quizzes__results')) \
+        .first()
+    if state is None:
+        return None
+    latest = state['latest'].timestamp() if state['latest'] else 0
+    return (f'gradebook:{course_id}:f{GRADEBOOK_FORMAT}:t{latest}:n{state["results"]}'
+            f':v{get_structure_version(course_id)}:g{get_version(_generation_key(course_id))}')
+
+
+def get_gradebook(course_id):
+    """Журнал оценок курса из кеша или построенный заново; None - курса нет"""
+
+    key = gradebook_cache_key(course_id)
+    if key is None:
+        return None
+    gradebook = cache.get(key)
+    counters.count('gradebook', gradebook is not None)
+    if gradebook is None:
+        # Как и фрагменты представлений - на основной БД: отстающая реплика не видит записи,
+        # сдвинувшей поколение, и старые строки легли бы под новый ключ
+        with use_replica(False):
+            gradebook = build_gradebook(course_id)
+        cache.set(key, gradebook, GRADEBOOK_TIMEOUT)
+    return gradebook
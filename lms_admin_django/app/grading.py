@@ -0,0 +1,230 @@
+import re
+from decimal import Decimal
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from .audit import build_bulk_entry, record
+from .caching import counters
+from .gradebook import invalidate_gradebook
+from .jobs import update_progress
+from .models import Quiz, Question, Answer, QuizResult, QuizResponse
+from .progress import calc_percent
+from .stats import apply_dashboard_delta
+
+KEY_CACHE_PREFIX = 'grading:answer_key'
+KEY_CACHE_TIMEOUT = 60 * 60
+
+GRADED_FIELDS = ['score', 'max_score', 'percentage', 'is_passed']
+
+_SPACES = re.compile(r'\s+')
+
+
+def normalize_text(value):
+    """Текстовый ответ для сравнения: без регистра, лишних пробелов и различия е/ё"""
+
+    return _SPACES.sub(' ', (value or '').strip()).casefold().replace('ё', 'е')
+
+
+class AnswerKey:
+    """
+    Ключ ответов теста: {question_id: (тип, баллы, правильные ответы)}, где правильные ответы -
+    frozenset id вариантов или нормализованных текстов. Строится тремя запросами и кешируется.
+    """
+
+    __slots__ = ('quiz_id', 'questions', 'max_score', 'quiz_max_score', 'passing_score')
+
+    def __init__(self, quiz_id, questions, quiz_max_score, passing_score):
+        self.quiz_id = quiz_id
+        self.questions = questions
+        self.max_score = sum(points for _, points, _ in questions.values())
+        self.quiz_max_score = quiz_max_score
+        self.passing_score = passing_score
+
+    def grade(self, responses):
+        """
+        Балл за ответы {question_id: set id выбранных вариантов или текст}.
+        Один ответ - выбран ровно один правильный вариант; несколько ответов - выбранное
+        множество совпадает с правильным (без частичных баллов); текст - совпадение после нормализации.
+        """
+
+        score = 0
+        for question_id, given in responses.items():
+            question = self.questions.get(question_id)
+            if question is not None and self.is_correct(question, given):
+                score += question[1]
+        return score
+
+    @staticmethod
+    def is_correct(question, given):
+        """Верен ли ответ given на вопрос (тип, баллы, правильные ответы) из ключа"""
+
+        kind, _, correct = question
+        if kind == 'text':
+            return normalize_text(given) in correct
+        if kind == 'single':
+            return len(given) == 1 and not given - correct
+        return given == correct
+
+    def evaluate(self, score):
+        """(максимальный балл, процент, пройден) для набранного балла"""
+
+        percentage = calc_percent(score, self.max_score)
+        # Проходной балл задан в шкале Quiz.max_score - сравниваем доли без округления
+        is_passed = bool(self.max_score) and score * self.quiz_max_score >= self.passing_score * self.max_score
+        return self.max_score, percentage, is_passed
+
+
+def _cache_key(quiz_id):
+    return f'{KEY_CACHE_PREFIX}:{quiz_id}'
+
+
+def build_answer_key(quiz_id):
+    quiz = Quiz.objects.values('max_score', 'passing_score').get(pk=quiz_id)
+    kinds = {
+        question_id: (kind, points)
+        for question_id, kind, points in Question.objects.filter(quiz_id=quiz_id).order_by()
+        .values_list('pk', 'question_type', 'points')
+    }
+    correct = {question_id: set() for question_id in kinds}
+    answers = Answer.objects.filter(question__quiz_id=quiz_id, is_correct=True).order_by() \
+        .values_list('question_id', 'pk', 'answer_text')
+    for question_id, answer_id, text in answers:
+        correct[question_id].add(normalize_text(text) if kinds[question_id][0] == 'text' else answer_id)
+    questions = {
+        question_id: (kind, points, frozenset(correct[question_id]))
+        for question_id, (kind, points) in kinds.items()
+    }
+    return AnswerKey(quiz_id, questions, quiz['max_score'], quiz['passing_score'])
+
+
+def get_answer_key(quiz_id):
+    key = cache.get(_cache_key(quiz_id))
+    counters.count('answer_key', key is not None)
+    if key is None:
+        key = build_answer_key(quiz_id)
+        cache.set(_cache_key(quiz_id), key, KEY_CACHE_TIMEOUT)
+    return key
+
+
+def invalidate_answer_key(quiz_id):
+    cache.delete(_cache_key(quiz_id))
+
+
+def collect_responses(rows):
+    """Строки (question_id, answer_id, text_answer) -> {question_id: set id вариантов или текст}"""
+
+    responses = {}
+    for question_id, answer_id, text_answer in rows:
+        if answer_id is None:
+            responses[question_id] = text_answer
+        else:
+            responses.setdefault(question_id, set()).add(answer_id)
+    return responses
+
+
+# --- Приём ответов ---
+
+def submit_quiz(quiz, student, answers, started_at, submitted_at=None):
+    """
+    Сохранить и проверить попытку: answers - {question_id: id варианта, список id или текст}.
+    Повторная попытка заменяет прежний результат студента (один результат на тест).
+    """
+
+    key = get_answer_key(quiz.pk)
+    responses, rows = {}, []
+    for question_id, given in answers.items():
+        if question_id not in key.questions:
+            continue
+        if isinstance(given, str):
+            responses[question_id] = given
+            rows.append(QuizResponse(question_id=question_id, text_answer=given))
+            continue
+        selected = {given} if isinstance(given, int) else set(given)
+        responses[question_id] = selected
+        rows += [QuizResponse(question_id=question_id, answer_id=answer_id) for answer_id in sorted(selected)]
+
+    score = key.grade(responses)
+    max_score, percentage, is_passed = key.evaluate(score)
+    with transaction.atomic():
+        result, _ = QuizResult.objects.update_or_create(quiz=quiz, student=student, defaults={
+            'score': score, 'max_score': max_score, 'percentage': percentage, 'is_passed': is_passed,
+            'started_at': started_at, 'submitted_at': submitted_at or timezone.now(),
+        })
+        result.responses.all().delete()
+        for row in rows:
+            row.result = result
+        QuizResponse.objects.bulk_create(rows)
+    return result
+
+
+# --- Перепроверка ---
+
+def regrade_quiz(quiz_id, batch_size=1000, progress=None):
+    """
+    Перепроверить сохранённые ответы теста по актуальному ключу пачками по batch_size результатов,
+    изменившиеся результаты записываются через bulk_update. Результаты без сохранённых ответов
+    (перенесённые из старой системы) не трогаются. Возвращает (проверено, изменено).
+    """
+
+    invalidate_answer_key(quiz_id)
+    key = get_answer_key(quiz_id)
+    results = QuizResult.objects.filter(quiz_id=quiz_id).filter(
+        Exists(QuizResponse.objects.filter(result=OuterRef('pk')))
+    ).order_by('pk').only('pk', *GRADED_FIELDS)
+
+    checked = changed = 0
+    percentage_delta = Decimal(0)
+    last_pk = 0
+    while True:
+        batch = list(results.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            break
+        last_pk = batch[-1].pk
+
+        rows = {}
+        responses = QuizResponse.objects.filter(result_id__in=[result.pk for result in batch]).order_by() \
+            .values_list('result_id', 'question_id', 'answer_id', 'text_answer')
+        for result_id, *row in responses:
+            rows.setdefault(result_id, []).append(row)
+
+        updated = []
+        for result in batch:
+            score = key.grade(collect_responses(rows.get(result.pk, ())))
+            graded = (score, *key.evaluate(score))
+            if graded != (result.score, result.max_score, result.percentage, result.is_passed):
+                percentage_delta += graded[2] - result.percentage
+                result.score, result.max_score, result.percentage, result.is_passed = graded
+                updated.append(result)
+        if updated:
+            with transaction.atomic():
+                QuizResult.objects.bulk_update(updated, GRADED_FIELDS)
+
+        checked += len(batch)
+        changed += len(updated)
+        if progress:
+            progress(checked)
+
+    # bulk_update обходит сигналы: поправляем сумму процентов в снимке и пишем одну запись аудита
+    if changed:
+        apply_dashboard_delta(quiz_percentage_sum=percentage_delta)
+        invalidate_gradebook(Quiz.objects.values_list('module__course_id', flat=True).get(pk=quiz_id))
+        record(build_bulk_entry('REGRADE', QuizResult._meta.db_table, {
+            'quiz_id': quiz_id, 'checked': checked, 'changed': changed,
+        }))
+    return checked, changed
+
+
+def run_regrade_job(job_id, quiz_ids, batch_size=1000):
+    """Перепроверка тестов в фоновой задаче"""
+
+    total = QuizResult.objects.filter(quiz_id__in=quiz_ids).count()
+    update_progress(job_id, 0, total)
+    done, summary = 0, {}
+    for quiz_id in quiz_ids:
+        checked, changed = regrade_quiz(
+            quiz_id, batch_size, progress=lambda checked: update_progress(job_id, done + checked)
+        )
+        done += checked
+        summary[str(quiz_id)] = {'checked': checked, 'changed': changed}
+    return summary
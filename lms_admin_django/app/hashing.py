@@ -0,0 +1,40 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from django.contrib.auth.hashers import make_password
+
+
+# Модуль не импортирует модели: дочерние процессы пула загружают его до django.setup()
+
+def _init_worker(settings_module):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    import django
+    django.setup()
+
+
+def _hash_password(password):
+    return make_password(password)
+
+
+def hash_passwords(passwords, pool=None, workers=1):
+    """Хеши паролей в исходном порядке; пустой пароль - неиспользуемый пароль"""
+
+    to_hash = [password for password in passwords if password]
+    if pool is not None:
+        hashed = pool.map(_hash_password, to_hash, chunksize=max(1, len(to_hash) // (workers * 4)))
+    else:
+        hashed = map(_hash_password, to_hash)
+    hashed = iter(hashed)
+    unusable = make_password(None)
+    return [next(hashed) if password else unusable for password in passwords]
+
+
+def create_hash_pool(workers):
+    """Пул процессов для хеширования (spawn: дочерние процессы не наследуют соединения с БД)"""
+
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_init_worker,
+        initargs=(os.environ.get('DJANGO_SETTINGS_MODULE', 'lms_admin.settings'),),
+    )
@@ -0,0 +1,214 @@
+import csv
+import io
+import os
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+from .audit import build_bulk_entry, record
+from .exports import IMPORT_ERRORS_HEADER
+from .hashing import create_hash_pool, hash_passwords
+from .jobs import update_progress
+from .models import User
+from .stats import apply_dashboard_delta
+
+
+IMPORT_COLUMNS = ('email', 'full_name', 'phone', 'role', 'password', 'is_active')
+ROLES = {value for value, _ in User.ROLE_CHOICES}
+MIN_PASSWORD_LENGTH = 6
+FALSE_VALUES = {'0', 'false', 'no', 'нет', ''}
+
+
+# --- Чтение файла (потоково, построчно) ---
+
+def read_csv(file):
+    """Строки CSV (двоичный файл, UTF-8) как словари; разделитель ',' или ';' определяется по заголовку"""
+
+    text = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+    header = text.readline()
+    delimiter = ';' if header.count(';') > header.count(',') else ','
+    columns = [name.strip().lower() for name in next(csv.reader([header], delimiter=delimiter))]
+    for values in csv.reader(text, delimiter=delimiter):
+        yield dict(zip(columns, values))
+
+
+def read_xlsx(file):
+    """Строки первого листа XLSX как словари (openpyxl в режиме read-only)"""
+
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    rows = workbook.worksheets[0].iter_rows(values_only=True)
+    columns = [str(name or '').strip().lower() for name in next(rows, ())]
+    for values in rows:
+        yield dict(zip(columns, ('' if value is None else str(value) for value in values)))
+    workbook.close()
+
+
+def read_rows(file, file_format):
+    if file_format == 'xlsx':
+        return read_xlsx(file)
+    return read_csv(file)
+
+
+# --- Проверка строк ---
+
+def validate_row(row, seen_emails):
+    """Очищенные данные пользователя или список ошибок строки"""
+
+    errors = []
+    email = User.objects.normalize_email((row.get('email') or '').strip())
+    full_name = (row.get('full_name') or '').strip()
+    phone = (row.get('phone') or '').strip() or None
+    role = (row.get('role') or '').strip().lower() or 'student'
+    password = row.get('password') or ''
+
+    try:
+        validate_email(email)
+    except ValidationError:
+        errors.append('некорректный email')
+    if len(email) > 100:
+        errors.append('email длиннее 100 символов')
+    if email in seen_emails:
+        errors.append('email повторяется в файле')
+    if not full_name:
+        errors.append('не указано ФИО')
+    elif len(full_name) > 150:
+        errors.append('ФИО длиннее 150 символов')
+    if phone and len(phone) > 20:
+        errors.append('телефон длиннее 20 символов')
+    if role not in ROLES:
+        errors.append(f'неизвестная роль "{role}"')
+    if password and len(password) < MIN_PASSWORD_LENGTH:
+        errors.append(f'пароль короче {MIN_PASSWORD_LENGTH} символов')
+
+    if errors:
+        return None, errors
+    seen_emails.add(email)
+    return {
+        'email': email,
+        'full_name': full_name,
+        'phone': phone,
+        'role': role,
+        'is_active': (row.get('is_active') or '1').strip().lower() not in FALSE_VALUES,
+        # Без пароля создаётся учётная запись с неиспользуемым паролем (вход после сброса)
+        'password': password or None,
+    }, []
+
+
+# --- Импорт ---
+
+class ImportReport:
+    """Итог импорта: количество созданных и отклонённые строки"""
+
+    def __init__(self):
+        self.created = 0
+        self.created_by_role = {}
+        self.rejected = []  # (номер строки, email, причина)
+
+    def reject(self, line, email, reason):
+        self.rejected.append((line, email, reason))
+
+    def as_dict(self):
+        return {'created': self.created, 'rejected': [list(item) for item in self.rejected]}
+
+    def write_errors_csv(self, file):
+        writer = csv.writer(file, delimiter=';')
+        writer.writerow(IMPORT_ERRORS_HEADER)
+        writer.writerows(self.rejected)
+
+
+def _insert_chunk(chunk, hashes, report):
+    """Вставить пачку через bulk_create; email, уже существующие в БД, отклоняются"""
+
+    existing = set(User.objects.filter(email__in=[data['email'] for _, data in chunk])
+                   .values_list('email', flat=True))
+    users = []
+    for (line, data), password_hash in zip(chunk, hashes):
+        if data['email'] in existing:
+            report.reject(line, data['email'], 'пользователь с таким email уже существует')
+            continue
+        users.append(User(**{**data, 'password': password_hash}))
+
+    try:
+        with transaction.atomic():
+            User.objects.bulk_create(users)
+    except IntegrityError:
+        # Параллельная вставка того же email - вставляем по одному, фиксируя конфликты.
+        # Тоже через bulk_create: save() вызвал бы сигналы и пользователь попал бы в снимок статистики дважды
+        created = []
+        for user in users:
+            try:
+                with transaction.atomic():
+                    User.objects.bulk_create([user])
+                created.append(user)
+            except IntegrityError:
+                line = next(line for line, data in chunk if data['email'] == user.email)
+                report.reject(line, user.email, 'пользователь с таким email уже существует')
+        users = created
+
+    report.created += len(users)
+    for user in users:
+        report.created_by_role[user.role] = report.created_by_role.get(user.role, 0) + 1
+
+
+def import_users(rows, chunk_size=1000, workers=None, progress=None):
+    """
+    Импорт пользователей из итератора строк-словарей: проверка в один проход,
+    хеширование паролей пачками в пуле процессов, вставка пачками через bulk_create.
+    """
+
+    report = ImportReport()
+    seen_emails = set()
+    workers = workers or os.cpu_count() or 1
+    pool = create_hash_pool(workers) if workers > 1 else None
+    chunk, processed = [], 0
+
+    def flush():
+        hashes = hash_passwords([data['password'] for _, data in chunk], pool, workers)
+        _insert_chunk(chunk, hashes, report)
+        chunk.clear()
+
+    try:
+        # Номер строки с учётом заголовка
+        for line, row in enumerate(rows, start=2):
+            processed += 1
+            data, errors = validate_row(row, seen_emails)
+            if errors:
+                report.reject(line, row.get('email', ''), '; '.join(errors))
+                continue
+            chunk.append((line, data))
+            if len(chunk) >= chunk_size:
+                flush()
+                if progress:
+                    progress(processed)
+        if chunk:
+            flush()
+        if progress:
+            progress(processed)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    # bulk_create обходит сигналы: обновляем снимок статистики и пишем одну запись аудита
+    apply_dashboard_delta(
+        total_users=report.created,
+        total_students=report.created_by_role.get('student', 0),
+        total_teachers=report.created_by_role.get('teacher', 0),
+    )
+    record(build_bulk_entry('IMPORT', User._meta.db_table, {
+        'created': report.created,
+        'rejected': len(report.rejected),
+    }))
+    return report
+
+
+def run_import_job(job_id, path, file_format, chunk_size=1000, workers=None):
+    """Импорт из загруженного файла в фоновой задаче; файл удаляется по завершении"""
+
+    try:
+        with open(path, 'rb') as file:
+            report = import_users(read_rows(file, file_format), chunk_size=chunk_size, workers=workers,
+                                  progress=lambda processed: update_progress(job_id, processed))
+    finally:
+        os.remove(path)
+    return report.as_dict()
@@ -0,0 +1,188 @@
+import math
+import operator
+from array import array
+from collections import Counter
+from itertools import compress, groupby
+from django.db import transaction
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+from .grading import collect_responses, get_answer_key
+from .jobs import update_progress
+from .models import Question, Answer, QuizResult, QuizResponse, QuestionStats
+
+# Пороги эмпирической сложности по доле правильных ответов
+EASY_P_VALUE = 0.7
+HARD_P_VALUE = 0.3
+# Ниже порога вопрос плохо отделяет сильных студентов от слабых
+LOW_DISCRIMINATION = 0.2
+
+EPSILON = 1e-9
+
+
+def empirical_difficulty(p_value):
+    """Сложность вопроса (значение Question.difficulty) по доле правильных ответов"""
+
+    if p_value >= EASY_P_VALUE:
+        return 'easy'
+    if p_value <= HARD_P_VALUE:
+        return 'hard'
+    return 'medium'
+
+
+def load_item_matrix(quiz_id, key):
+    """
+    Ответы на тест по столбцам одним проходом по QuizResponse: баллы попыток - array('d'),
+    верность ответа на каждый вопрос - bytearray по попыткам, число выборов вариантов и пропусков.
+    Результаты без сохранённых ответов (перенесённые из старой системы) не учитываются.
+    """
+
+    question_ids = list(key.questions)
+    totals = array('d')
+    correct = {question_id: bytearray() for question_id in question_ids}
+    chosen, omitted = Counter(), Counter()
+    rows = QuizResponse.objects.filter(result__quiz_id=quiz_id).order_by('result_id') \
+        .values_list('result_id', 'question_id', 'answer_id', 'text_answer')
+    for _, attempt in groupby(rows.iterator(chunk_size=5000), key=operator.itemgetter(0)):
+        responses = collect_responses(row[1:] for row in attempt)
+        score = 0
+        for question_id in question_ids:
+            given = responses.get(question_id)
+            question = key.questions[question_id]
+            passed = given is not None and key.is_correct(question, given)
+            correct[question_id].append(passed)
+            if given is None:
+                omitted[question_id] += 1
+            elif isinstance(given, set):
+                chosen.update(given)
+            if passed:
+                score += question[1]
+        totals.append(score)
+    return totals, correct, chosen, omitted
+
+
+def compute_item_stats(key, options, totals, correct, chosen, omitted):
+    """
+    Показатели вопросов {question_id: поля QuestionStats} по матрице ответов. Считаются свёртками
+    столбцов целиком (sum по bytearray, compress и map по array), без цикла по попыткам.
+    Дискриминативность - корреляция верности ответа с баллом за остальные вопросы y = T - points * x
+    (скорректированная точечно-бисериальная); её суммы выражаются через sum T, sum T^2, sum x и sum xT.
+    options - {question_id: [id вариантов]} для вопросов с выбором.
+    """
+
+    n = len(totals)
+    if not n:
+        return {question_id: {'p_value': None, 'discrimination': None, 'omit_rate': 0, 'option_rates': {}}
+                for question_id in correct}
+
+    sum_t = math.fsum(totals)
+    sum_t2 = math.fsum(map(operator.mul, totals, totals))
+    stats = {}
+    for question_id, column in correct.items():
+        points = key.questions[question_id][1]
+        k = sum(column)
+        sum_xt = math.fsum(compress(totals, column))
+        p_value = k / n
+        mean_y = (sum_t - points * k) / n
+        var_y = (sum_t2 - 2 * points * sum_xt + points * points * k) / n - mean_y * mean_y
+        var_x = p_value * (1 - p_value)
+        covariance = (sum_xt - points * k) / n - p_value * mean_y
+        # Все ответили одинаково или остальные вопросы не различают попытки - корреляции нет
+        discrimination = covariance / math.sqrt(var_x * var_y) if var_x > EPSILON and var_y > EPSILON else None
+        stats[question_id] = {
+            'p_value': round(p_value, 4),
+            'discrimination': None if discrimination is None else round(discrimination, 4),
+            'omit_rate': round(omitted[question_id] / n, 4),
+            'option_rates': {str(answer_id): round(chosen[answer_id] / n, 4)
+                             for answer_id in options.get(question_id, ())},
+        }
+    return stats
+
+
+def refresh_quiz(quiz_id):
+    """Пересчитать анализ вопросов теста и заменить его строки QuestionStats одной транзакцией"""
+
+    key = get_answer_key(quiz_id)
+    # Состояние читается до ответов: попытка, пришедшая во время расчёта, оставит анализ устаревшим
+    # и будет учтена следующим проходом
+    state = QuizResult.objects.filter(quiz_id=quiz_id).aggregate(count=Count('pk'), last=Max('submitted_at'))
+    options = {}
+    answers = Answer.objects.filter(question__quiz_id=quiz_id).exclude(question__question_type='text') \
+        .order_by('question_id', 'order_num').values_list('question_id', 'pk')
+    for question_id, answer_id in answers:
+        options.setdefault(question_id, []).append(answer_id)
+
+    totals, *matrix = load_item_matrix(quiz_id, key)
+    stats = compute_item_stats(key, options, totals, *matrix)
+    now = timezone.now()
+    rows = [
+        QuestionStats(question_id=question_id, attempts=len(totals), results_count=state['count'],
+                      last_submitted_at=state['last'], computed_at=now, **values)
+        for question_id, values in stats.items()
+    ]
+    with transaction.atomic():
+        QuestionStats.objects.filter(question__quiz_id=quiz_id).delete()
+        QuestionStats.objects.bulk_create(rows)
+    return len(rows)
+
+
+def stale_quizzes(quiz_ids=None):
+    """
+    Тесты, анализ которых устарел, тремя агрегирующими запросами: изменились число результатов
+    или время последнего результата (новые, пересданные, удалённые попытки), изменилось число
+    вопросов или анализ помечен устаревшим после правки ключа ответов
+    """
+
+    results = QuizResult.objects.order_by().values_list('quiz_id').annotate(Count('pk'), Max('submitted_at'))
+    questions = Question.objects.order_by().values_list('quiz_id').annotate(Count('pk'))
+    computed = QuestionStats.objects.order_by().values_list('question__quiz_id').annotate(
+        questions=Count('pk'), results=Max('results_count'), last=Max('last_submitted_at'),
+        stale=Count('pk', filter=Q(is_stale=True)),
+    )
+    if quiz_ids is not None:
+        results = results.filter(quiz_id__in=quiz_ids)
+        questions = questions.filter(quiz_id__in=quiz_ids)
+        computed = computed.filter(question__quiz_id__in=quiz_ids)
+
+    current = {quiz_id: (count, last) for quiz_id, count, last in results}
+    expected = dict(questions)
+    stale = set()
+    for quiz_id, count, results_count, last, stale_count in computed:
+        if stale_count or count != expected.get(quiz_id) or (results_count, last) != current.get(quiz_id, (0, None)):
+            stale.add(quiz_id)
+        current.pop(quiz_id, None)
+    # Тесты с результатами, для которых анализа ещё нет
+    stale.update(quiz_id for quiz_id in current if expected.get(quiz_id))
+    return sorted(stale)
+
+
+def mark_stale(quiz_id):
+    """Пометить анализ теста устаревшим (изменились вопросы или правильные ответы)"""
+
+    QuestionStats.objects.filter(question__quiz_id=quiz_id, is_stale=False).update(is_stale=True)
+
+
+def refresh_item_stats(quiz_ids=None, full=False, progress=None):
+    """
+    Обновить анализ вопросов: по умолчанию - только устаревших тестов (stale_quizzes), full - всех
+    тестов с вопросами. Возвращает {'quizzes': пересчитано тестов, 'questions': строк анализа}.
+    """
+
+    if full:
+        questions = Question.objects.order_by()
+        if quiz_ids is not None:
+            questions = questions.filter(quiz_id__in=quiz_ids)
+        quizzes = sorted(set(questions.values_list('quiz_id', flat=True)))
+    else:
+        quizzes = stale_quizzes(quiz_ids)
+    rows = 0
+    for done, quiz_id in enumerate(quizzes, 1):
+        rows += refresh_quiz(quiz_id)
+        if progress:
+            progress(done, len(quizzes))
+    return {'quizzes': len(quizzes), 'questions': rows}
+
+
+def run_item_stats_job(job_id, quiz_ids=None, full=False):
+    """Обновление анализа вопросов в фоновой задаче"""
+
+    return refresh_item_stats(quiz_ids, full, progress=lambda done, total: update_progress(job_id, done, total))
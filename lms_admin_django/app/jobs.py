@@ -0,0 +1,44 @@
+import logging
+import threading
+import traceback
+from django.db import close_old_connections
+from django.utils import timezone
+from .models import BackgroundJob
+
+logger = logging.getLogger(__name__)
+
+
+def update_progress(job_id, processed, total=None):
+    """Записать прогресс задачи (вызывается из выполняемой функции)"""
+
+    fields = {'processed': processed}
+    if total is not None:
+        fields['total'] = total
+    BackgroundJob.objects.filter(pk=job_id).update(**fields)
+
+
+def _run(job_id, func, args, kwargs):
+    BackgroundJob.objects.filter(pk=job_id).update(status='running')
+    try:
+        result = func(job_id, *args, **kwargs)
+    except Exception:
+        logger.exception('Фоновая задача #%s завершилась ошибкой', job_id)
+        BackgroundJob.objects.filter(pk=job_id).update(
+            status='failed', error=traceback.format_exc(), finished_at=timezone.now()
+        )
+    else:
+        BackgroundJob.objects.filter(pk=job_id).update(status='done', result=result, finished_at=timezone.now())
+    finally:
+        close_old_connections()
+
+
+def start_job(kind, func, *args, user=None, **kwargs):
+    """
+    Создать задачу и выполнить func(job_id, *args, **kwargs) в отдельном потоке, вне запроса.
+    Возвращённое func значение (JSON-сериализуемое) сохраняется в job.result.
+    """
+
+    job = BackgroundJob.objects.create(kind=kind, created_by=user if user and user.is_authenticated else None)
+    thread = threading.Thread(target=_run, args=(job.pk, func, args, kwargs), name=f'job-{job.pk}', daemon=True)
+    thread.start()
+    return job
@@ -0,0 +1,110 @@
+import random
+from datetime import timedelta
+from decimal import Decimal
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from app.bench import Rollback, summarize, timed
+from app.grading import build_answer_key, collect_responses, regrade_quiz
+from app.models import User, Course, Module, Quiz, Question, Answer, QuizResult, QuizResponse
+
+
+def generate_quiz(submissions, questions=20, options=4, seed=42):
+    """Тест из вопросов трёх типов и submissions попыток со случайными ответами (bulk_create)"""
+
+    rng = random.Random(seed)
+    now = timezone.now()
+    teacher = User.objects.create(email='bench-grading-teacher@example.com', full_name='Преподаватель',
+                                  role='teacher', password=make_password(None))
+    course = Course.objects.create(title='Курс проверки', teacher=teacher)
+    module = Module.objects.create(course=course, title='Модуль', order_num=1)
+    quiz = Quiz.objects.create(module=module, title='Тест', max_score=questions, passing_score=questions * 6 // 10)
+
+    kinds = ['single', 'multiple', 'text']
+    question_objs = Question.objects.bulk_create([
+        Question(quiz=quiz, question_text=f'Вопрос {n}', question_type=kinds[n % 3], order_num=n)
+        for n in range(questions)
+    ])
+    Answer.objects.bulk_create([
+        Answer(question=question, answer_text=f'Ответ {n}', order_num=n,
+               is_correct=n == 0 or (question.question_type == 'multiple' and n == 1))
+        for question in question_objs for n in range(options)
+    ])
+    answer_ids = {}
+    for question_id, answer_id in Answer.objects.filter(question__quiz=quiz).values_list('question_id', 'pk'):
+        answer_ids.setdefault(question_id, []).append(answer_id)
+
+    password = make_password(None)
+    User.objects.bulk_create([
+        User(email=f'bench-grading-{i}@example.com', full_name=f'Студент {i}', role='student', password=password)
+        for i in range(submissions)
+    ], batch_size=5000)
+    student_ids = User.objects.filter(email__startswith='bench-grading-', role='student').values_list('pk', flat=True)
+    QuizResult.objects.bulk_create([
+        QuizResult(quiz=quiz, student_id=student_id, score=0, max_score=questions, percentage=Decimal(0),
+                   started_at=now - timedelta(minutes=20), submitted_at=now)
+        for student_id in student_ids
+    ], batch_size=5000)
+
+    responses = []
+    for result_id in QuizResult.objects.filter(quiz=quiz).values_list('pk', flat=True):
+        for question in question_objs:
+            options_ids = answer_ids[question.pk]
+            if question.question_type == 'text':
+                text = rng.choice(['  ответ 0 ', 'Ответ 1', 'ОТВЕТ  0'])
+                responses.append(QuizResponse(result_id=result_id, question=question, text_answer=text))
+                continue
+            count = 1 if question.question_type == 'single' else rng.randint(1, 2)
+            responses += [QuizResponse(result_id=result_id, question=question, answer_id=answer_id)
+                          for answer_id in rng.sample(options_ids, count)]
+        if len(responses) >= 10000:
+            QuizResponse.objects.bulk_create(responses)
+            responses = []
+    QuizResponse.objects.bulk_create(responses)
+    return quiz
+
+
+class Command(BaseCommand):
+    help = 'Замерить скорость проверки тестов: ключ ответов, проверка в памяти и перепроверка с bulk_update'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--submissions', type=int, default=5000)
+        parser.add_argument('--questions', type=int, default=20)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        submissions = options['submissions']
+        try:
+            with transaction.atomic():
+                quiz = generate_quiz(submissions, options['questions'])
+                self.stdout.write(f'Сгенерировано попыток: {submissions}, вопросов: {options["questions"]}')
+
+                key, timings = timed(lambda: build_answer_key(quiz.pk), repeat=options['repeat'])
+                self._report('Построение ключа ответов', timings)
+
+                rows = {}
+                for result_id, *row in QuizResponse.objects.filter(result__quiz=quiz) \
+                        .values_list('result_id', 'question_id', 'answer_id', 'text_answer'):
+                    rows.setdefault(result_id, []).append(row)
+                _, timings = timed(lambda: [key.evaluate(key.grade(collect_responses(r))) for r in rows.values()],
+                                   repeat=options['repeat'])
+                self._report('Проверка в памяти', timings, submissions)
+
+                # Первый проход меняет все результаты, последующие - ни одного (только чтение и сравнение)
+                counts, timings = timed(lambda: regrade_quiz(quiz.pk, options['batch_size']),
+                                        repeat=options['repeat'])
+                self._report('Перепроверка с bulk_update', timings[:1], submissions)
+                self._report('Перепроверка без изменений', timings[1:] or timings, submissions)
+                self.stdout.write(f'  последний проход: проверено {counts[0]}, изменено {counts[1]}')
+                raise Rollback
+        except Rollback:
+            self.stdout.write('Временные данные удалены (откат транзакции)')
+
+    def _report(self, title, timings, submissions=None):
+        stats = summarize(timings)
+        line = f'  {title:28} p50 {stats["p50"]:8.1f} мс  макс. {stats["max"]:8.1f} мс'
+        if submissions:
+            line += f'  ({stats["p50"] * 1000 / submissions:.1f} мс на 1000 попыток)'
+        self.stdout.write(line)
@@ -0,0 +1,49 @@
+import os
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from app.bench import Rollback
+from app.imports import import_users
+from app.models import User
+
+
+def generate_rows(count, prefix):
+    for number in range(count):
+        yield {
+            'email': f'{prefix}-{number:07d}@example.com',
+            'full_name': f'Импорт {number:07d}',
+            'role': 'student',
+            'password': f'secret-{number}',
+        }
+
+
+class Command(BaseCommand):
+    help = 'Сравнить скорость импорта пользователей: по одному через create_user и пачками с пулом процессов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5000)
+        parser.add_argument('--legacy-rows', type=int, default=200,
+                            help='Строк для замера создания по одному (медленно)')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._report('create_user по одному', options['legacy_rows'], lambda: [
+                    User.objects.create_user(**row) for row in generate_rows(options['legacy_rows'], 'bench-legacy')
+                ])
+                for workers in sorted({1, options['workers']}):
+                    self._report(f'import_users, процессов: {workers}', options['rows'], lambda: import_users(
+                        generate_rows(options['rows'], f'bench-import-{workers}'),
+                        chunk_size=options['chunk_size'], workers=workers,
+                    ))
+                raise Rollback
+        except Rollback:
+            self.stdout.write('Временные данные удалены (откат транзакции)')
+
+    def _report(self, title, rows, run):
+        started = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f'{title:32} {rows:7} строк за {elapsed:7.2f} с  -  {rows / elapsed:9.0f} строк/с')
@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Avg, Q
+from app.bench import Rollback, plan_rows, summarize, timed
+from app.dataset import generate_large_dataset
+from app.models import User, Course
+from app.reports import course_report, student_report
+
+
+def legacy_course_stats():
+    return Course.objects.annotate(
+        total_enrolled=Count('enrollments', filter=Q(enrollments__status='active')),
+        completed=Count('enrollments', filter=Q(enrollments__status='completed')),
+        avg_score=Avg('modules__quizzes__results__percentage')
+    ).order_by('-created_at')[:20]
+
+
+def legacy_user_stats():
+    return User.objects.filter(role='student').annotate(
+        courses_count=Count('enrollments', filter=Q(enrollments__status='active')),
+        completed_courses=Count('enrollments', filter=Q(enrollments__status='completed')),
+        avg_score=Avg('quiz_results__percentage')
+    ).order_by('-courses_count', 'full_name')[:20]
+
+
+class Command(BaseCommand):
+    help = 'Сравнить отчёты с JOIN-агрегацией и с предагрегированными подзапросами на сгенерированных данных'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=2000)
+        parser.add_argument('--courses', type=int, default=50)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                sizes = generate_large_dataset(prefix='bench', students=options['students'],
+                                               courses=options['courses'])
+                self.stdout.write(f'Сгенерировано: {sizes}')
+                self._compare('Курсы', legacy_course_stats, lambda: course_report().order_by('-created_at')[:20],
+                              ('total_enrolled', 'completed'), options['repeat'])
+                self._compare('Студенты', legacy_user_stats,
+                              lambda: student_report(limit=20),
+                              ('courses_count', 'completed_courses'), options['repeat'])
+                raise Rollback
+        except Rollback:
+            self.stdout.write('Временные данные удалены (откат транзакции)')
+
+    def _compare(self, title, legacy, current, count_fields, repeat):
+        self.stdout.write(self.style.MIGRATE_HEADING(title))
+        for name, build in (('JOIN (старый)', legacy), ('предагрегаты', current)):
+            rows, timings = timed(lambda: list(build()), repeat=repeat)
+            stats = summarize(timings)
+            self.stdout.write(
+                f'  {name:14} p50 {stats["p50"]:8.1f} мс  p95 {stats["p95"]:8.1f} мс  '
+                f'макс. строк в плане: {plan_rows(build()) or "-"}'
+            )
+            first = rows[0] if rows else None
+            if first is not None:
+                self.stdout.write(f'    {first}: ' + ', '.join(f'{f}={getattr(first, f)}' for f in count_fields))
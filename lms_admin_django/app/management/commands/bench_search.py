@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from app.bench import Rollback, summarize, timed
+from app.dataset import generate_large_dataset
+from app.models import User
+from app.search import search_users
+
+
+class Command(BaseCommand):
+    help = 'Замерить ранжированный поиск пользователей на сгенерированных данных'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1_000_000)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--per-page', type=int, default=50)
+        parser.add_argument('queries', nargs='*', default=['0012345', 'Student bench 0000999', 'bench-student-4242'])
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                generate_large_dataset(prefix='bench', students=options['users'], courses=0)
+                if connection.vendor == 'postgresql':
+                    with connection.cursor() as cursor:
+                        cursor.execute('ANALYZE users')
+                self.stdout.write(f'Пользователей: {User.objects.count()}')
+
+                for query in options['queries']:
+                    def search():
+                        return list(
+                            search_users(User.objects.all(), query).order_by('-search_rank', 'full_name')
+                            [:options['per_page']]
+                        )
+
+                    rows, timings = timed(search, repeat=options['repeat'])
+                    stats = summarize(timings)
+                    self.stdout.write(
+                        f'"{query}": найдено {len(rows)}, p50 {stats["p50"]:.2f} мс, p95 {stats["p95"]:.2f} мс'
+                    )
+                raise Rollback
+        except Rollback:
+            self.stdout.write('Временные данные удалены (откат транзакции)')
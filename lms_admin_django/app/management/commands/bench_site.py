@@ -0,0 +1,88 @@
+import json
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.utils import timezone
+from app import urls
+from app.bench import compare_with_baseline, measure_page, page_targets
+from app.models import User, Course, Enrollment, QuizResult, StudentProgress
+
+DEFAULT_BASELINE = settings.BASE_DIR / 'bench_baseline.json'
+
+
+class Command(BaseCommand):
+    help = ('Замер всех страниц приложения и списков админки: число запросов к БД, p50/p95 времени ответа '
+            'и сравнение с сохранённым базовым замером')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=10)
+        parser.add_argument('--email', help='Пользователь для запросов (по умолчанию - первый администратор)')
+        parser.add_argument('--only', action='append', help='Замерить только страницы с этой подстрокой в имени')
+        parser.add_argument('--cold', action='store_true', help='Очищать кеш перед каждым запросом')
+        parser.add_argument('--baseline', default=str(DEFAULT_BASELINE), help='Файл базового замера (JSON)')
+        parser.add_argument('--save', action='store_true', help='Сохранить результаты как новый базовый замер')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='Допустимый рост p95 относительно базового замера (доля, по умолчанию 0.2)')
+        parser.add_argument('--fail-on-regression', action='store_true',
+                            help='Завершиться с ошибкой при регрессии (для CI)')
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(email=options['email']) if options['email'] else \
+            User.objects.filter(role='admin', is_staff=True).order_by('pk')
+        user = users.first()
+        if user is None:
+            raise CommandError('Нет пользователя для запросов: укажите --email администратора')
+        client = Client(HTTP_HOST=settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else 'localhost')
+        client.force_login(user)
+
+        sizes = {model._meta.db_table: model.objects.count()
+                 for model in (User, Course, Enrollment, StudentProgress, QuizResult)}
+        self.stdout.write(f'База: {connection.vendor}, данные: {sizes}')
+
+        results = {}
+        for name, path in page_targets(urls, urls.app_name):
+            if options['only'] and not any(part in name for part in options['only']):
+                continue
+            if path is None:
+                self.stdout.write(f'  {name:32} пропущено: нет данных для параметров URL')
+                continue
+            results[name] = measure_page(client, path, repeat=options['repeat'],
+                                         before=cache.clear if options['cold'] else None)
+            stats = results[name]
+            self.stdout.write(
+                f'  {name:32} {stats["status"]}  запросов {stats["queries"]:4}  '
+                f'p50 {stats["p50"]:8.1f} мс  p95 {stats["p95"]:8.1f} мс'
+            )
+
+        baseline_path = options['baseline']
+        try:
+            with open(baseline_path, encoding='utf-8') as file:
+                baseline = json.load(file)
+        except FileNotFoundError:
+            baseline = None
+
+        if baseline is not None:
+            if baseline['meta']['sizes'] != sizes or baseline['meta']['vendor'] != connection.vendor:
+                self.stdout.write(self.style.WARNING(
+                    f'Базовый замер снят на других данных ({baseline["meta"]}) - сравнение ориентировочное'
+                ))
+            regressions = compare_with_baseline(results, baseline['results'], options['tolerance'])
+            for name, metric, before, after in regressions:
+                self.stdout.write(self.style.ERROR(f'  регрессия {name}: {metric} {before:.6g} -> {after:.6g}'))
+            if not regressions:
+                self.stdout.write(self.style.SUCCESS(f'Регрессий относительно {baseline_path} нет'))
+            elif options['fail_on_regression'] and not options['save']:
+                raise CommandError(f'Регрессий: {len(regressions)}')
+        elif not options['save']:
+            self.stdout.write(f'Базового замера {baseline_path} нет - сохраните его с --save')
+
+        if options['save']:
+            with open(baseline_path, 'w', encoding='utf-8') as file:
+                json.dump({
+                    'meta': {'vendor': connection.vendor, 'sizes': sizes, 'repeat': options['repeat'],
+                             'created_at': timezone.now().isoformat()},
+                    'results': results,
+                }, file, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'Базовый замер сохранён в {baseline_path}'))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from app.counters import find_counter_mismatches, repair_counters
+
+
+class Command(BaseCommand):
+    help = 'Сверить счётчики записей курсов с таблицей записей и (с --fix) исправить расхождения'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help='Исправить найденные расхождения')
+
+    def handle(self, *args, **options):
+        mismatches = find_counter_mismatches()
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS('Счётчики записей совпадают с данными'))
+            return
+
+        for course, stored, expected in mismatches:
+            self.stdout.write(f'Курс #{course["pk"]} "{course["title"]}": сохранено {stored}, фактически {expected}')
+
+        if options['fix']:
+            fixed = repair_counters(mismatches)
+            self.stdout.write(self.style.SUCCESS(f'Исправлено курсов: {fixed}'))
+        else:
+            self.stdout.write(self.style.WARNING(
+                f'Расхождений: {len(mismatches)}. Запустите с --fix для исправления'
+            ))
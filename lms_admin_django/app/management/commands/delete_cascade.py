@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+from app.deletion import BATCH_SIZE, build_plan, delete_cascade, estimate
+from app.models import User, Course
+
+MODELS = {'user': User, 'course': Course}
+
+
+class Command(BaseCommand):
+    help = ('Каскадно удалить пользователей или курсы пачками снизу вверх. Показывает масштаб удаления; '
+            'повторный запуск дочищает прерванное удаление')
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', choices=sorted(MODELS))
+        parser.add_argument('ids', nargs='+', type=int)
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help='Только показать масштаб удаления')
+
+    def handle(self, *args, **options):
+        model = MODELS[options['model']]
+        pks = list(model.objects.filter(pk__in=options['ids']).values_list('pk', flat=True))
+        missing = set(options['ids']) - set(pks)
+        if missing:
+            raise CommandError(f'Не найдены: {", ".join(map(str, sorted(missing)))}')
+
+        blast_radius = estimate(build_plan(model, pks))
+        for table, action, count in blast_radius:
+            label = 'очистка ссылки' if action == 'set_null' else 'удаление'
+            self.stdout.write(f'  {table:24} {label:15} {count:>12,}')
+        if options['dry_run']:
+            return
+
+        total = sum(count for _, _, count in blast_radius)
+        processed = 0
+
+        def progress(count):
+            nonlocal processed
+            processed += count
+            self.stdout.write(f'\r  обработано {processed:,} из ~{total:,}', ending='')
+
+        deleted = delete_cascade(model, pks, options['batch_size'], progress)
+        self.stdout.write('')
+        self.stdout.write(self.style.SUCCESS(f'Обработано строк: {sum(deleted.values()):,}'))
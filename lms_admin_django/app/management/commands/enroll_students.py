@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+from app.enrollments import OUTCOME_LABELS, bulk_enroll, group_student_ids
+from app.models import User, Group, Course
+
+
+class Command(BaseCommand):
+    help = 'Записать на курс группу и/или список студентов одним запросом'
+
+    def add_arguments(self, parser):
+        parser.add_argument('course_id', type=int)
+        parser.add_argument('--group', help='Название группы')
+        parser.add_argument('--students', nargs='+', default=[], metavar='EMAIL_OR_ID',
+                            help='Email или id студентов')
+        parser.add_argument('--verbose-outcomes', action='store_true', help='Вывести итог по каждому студенту')
+
+    def handle(self, *args, **options):
+        try:
+            course = Course.objects.get(pk=options['course_id'])
+        except Course.DoesNotExist:
+            raise CommandError(f'Курс {options["course_id"]} не найден')
+
+        group = None
+        student_ids = []
+        if options['group']:
+            try:
+                group = Group.objects.get(group_name=options['group'])
+            except Group.DoesNotExist:
+                raise CommandError(f'Группа "{options["group"]}" не найдена')
+            student_ids += group_student_ids(group)
+
+        emails = [value for value in options['students'] if not value.isdigit()]
+        found = dict(User.objects.filter(email__in=emails).values_list('email', 'pk'))
+        unknown = [email for email in emails if email not in found]
+        if unknown:
+            raise CommandError(f'Пользователи не найдены: {", ".join(unknown)}')
+        student_ids += [int(value) if value.isdigit() else found[value] for value in options['students']]
+        if not student_ids:
+            raise CommandError('Укажите --group или --students')
+
+        result = bulk_enroll(course, student_ids, group=group)
+
+        for outcome, count in result.counts().items():
+            if count:
+                self.stdout.write(f'{OUTCOME_LABELS[outcome]}: {count}')
+        if options['verbose_outcomes']:
+            for student_id, outcome in result.outcomes.items():
+                self.stdout.write(f'  {student_id}: {OUTCOME_LABELS[outcome]}')
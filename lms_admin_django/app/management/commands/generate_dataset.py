@@ -0,0 +1,37 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from app.dataset import BASE_SCALE, DEFAULTS, generate_large_dataset
+from app.models import User
+
+
+class Command(BaseCommand):
+    help = ('Сгенерировать большой согласованный набор данных для замеров производительности. '
+            f'Масштаб 1.0: {BASE_SCALE["students"]:,} студентов, {BASE_SCALE["courses"]:,} курсов, '
+            '~50M строк прогресса и ~20M результатов тестов; загрузка через COPY на PostgreSQL')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=0.001, help='Доля целевого объёма (по умолчанию 0.001)')
+        parser.add_argument('--students', type=int, help='Число студентов (вместо --scale)')
+        parser.add_argument('--courses', type=int, help='Число курсов (вместо --scale)')
+        parser.add_argument('--prefix', default='gen', help='Префикс email и названий сгенерированных данных')
+        parser.add_argument('--seed', type=int, default=42)
+        for option, default in DEFAULTS.items():
+            parser.add_argument(f'--{option.replace("_", "-")}', type=int, default=default)
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        if User.objects.filter(email__startswith=f'{prefix}-').exists():
+            raise CommandError(f'Данные с префиксом "{prefix}" уже есть: укажите другой --prefix')
+
+        started = time.monotonic()
+
+        def progress(table, rows):
+            self.stdout.write(f'  {table:24} {rows:>12,} строк  {time.monotonic() - started:8.1f} с')
+
+        sizes = generate_large_dataset(
+            prefix=prefix, scale=options['scale'], students=options['students'], courses=options['courses'],
+            seed=options['seed'], progress=progress, **{option: options[option] for option in DEFAULTS},
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено строк: {sum(sizes.values()):,} за {time.monotonic() - started:.1f} с'
+        ))
@@ -0,0 +1,42 @@
+import os
+from django.core.management.base import BaseCommand, CommandError
+from app.imports import import_users, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Массовый импорт пользователей из CSV/XLSX (колонки: email, full_name, phone, role, password, is_active)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к файлу CSV или XLSX')
+        parser.add_argument('--format', choices=('csv', 'xlsx'),
+                            help='Формат файла (по умолчанию - по расширению)')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Строк в одной пачке вставки')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Процессов для хеширования паролей (1 - без пула)')
+        parser.add_argument('--errors', help='Куда сохранить отчёт об отклонённых строках (CSV)')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or path.rsplit('.', 1)[-1].lower()
+        if file_format not in ('csv', 'xlsx'):
+            raise CommandError('Не удалось определить формат файла, укажите --format')
+        if not os.path.exists(path):
+            raise CommandError(f'Файл {path} не найден')
+
+        def progress(processed):
+            self.stdout.write(f'  обработано строк: {processed}')
+
+        with open(path, 'rb') as file:
+            report = import_users(read_rows(file, file_format), chunk_size=options['chunk_size'],
+                                  workers=options['workers'], progress=progress)
+
+        self.stdout.write(self.style.SUCCESS(f'Создано пользователей: {report.created}'))
+        if report.rejected:
+            self.stdout.write(self.style.WARNING(f'Отклонено строк: {len(report.rejected)}'))
+            if options['errors']:
+                with open(options['errors'], 'w', encoding='utf-8-sig', newline='') as file:
+                    report.write_errors_csv(file)
+                self.stdout.write(f'Отчёт об ошибках: {options["errors"]}')
+            else:
+                for line, email, reason in report.rejected[:20]:
+                    self.stdout.write(f'  строка {line}, {email}: {reason}')
@@ -0,0 +1,85 @@
+import threading
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import Client
+from django.urls import reverse
+from app.bench import percentile
+from app.models import User, Course
+
+DEFAULT_URLS = ('app:dashboard', 'app:courses_list', 'app:groups_list', 'app:reports')
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный тест страниц в потоках: p50/p99 времени ответа при разных CONN_MAX_AGE '
+            '(0 - новое соединение на каждый запрос)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Запросов на поток')
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument('--conn-max-age', type=int, nargs='+', default=[0, 60],
+                            help='Значения CONN_MAX_AGE для сравнения')
+        parser.add_argument('--email',
+                            help='Пользователь, от имени которого идут запросы (по умолчанию - первый администратор)')
+        parser.add_argument('--url', action='append', dest='urls', help='Имя URL или путь; можно несколько')
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(email=options['email']) if options['email'] else \
+            User.objects.filter(role='admin').order_by('pk')
+        user = users.first()
+        if user is None:
+            raise CommandError('Нет пользователя для запросов: укажите --email')
+        paths = [self._path(name) for name in options['urls'] or DEFAULT_URLS]
+
+        settings_dict = connections[DEFAULT_DB_ALIAS].settings_dict
+        self.stdout.write(f'База: {settings_dict["ENGINE"]}, потоков: {options["concurrency"]}, '
+                          f'запросов на поток: {options["requests"]}')
+        initial = settings_dict['CONN_MAX_AGE']
+        try:
+            for max_age in options['conn_max_age']:
+                # Описание базы общее для соединений всех потоков - новое значение действует на все
+                connections.close_all()
+                settings_dict['CONN_MAX_AGE'] = max_age
+                timings, errors, elapsed = self._run(user, paths, options['requests'], options['concurrency'])
+                self.stdout.write(
+                    f'  CONN_MAX_AGE={max_age:<5} p50 {percentile(timings, 50):7.1f} мс  '
+                    f'p99 {percentile(timings, 99):7.1f} мс  {len(timings) / elapsed:7.1f} запр./с  ошибок: {errors}'
+                )
+        finally:
+            connections.close_all()
+            settings_dict['CONN_MAX_AGE'] = initial
+
+    def _path(self, name):
+        if name.startswith('/'):
+            return name
+        if name == 'app:courses_detail':
+            course = Course.objects.order_by('pk').values_list('pk', flat=True).first()
+            return reverse(name, args=[course]) if course else reverse('app:courses_list')
+        return reverse(name)
+
+    def _run(self, user, paths, requests, concurrency):
+        timings, errors = [], []
+        lock = threading.Lock()
+
+        def worker():
+            client = Client(HTTP_HOST=settings.ALLOWED_HOSTS[0])
+            client.force_login(user)
+            local, failed = [], 0
+            for index in range(requests):
+                started = time.perf_counter()
+                response = client.get(paths[index % len(paths)])
+                local.append((time.perf_counter() - started) * 1000)
+                failed += response.status_code >= 400
+            connections.close_all()
+            with lock:
+                timings.extend(local)
+                errors.append(failed)
+
+        threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return timings, sum(errors), time.perf_counter() - started
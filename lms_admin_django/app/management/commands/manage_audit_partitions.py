@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from app.audit import get_audit_settings
+from app.partitions import ensure_partitions, expire_partitions, is_partitioned, list_partitions
+
+
+class Command(BaseCommand):
+    help = 'Создать будущие секции журнала аудита и отключить/удалить секции старше срока хранения'
+
+    def add_arguments(self, parser):
+        config = get_audit_settings()
+        parser.add_argument('--ahead', type=int, default=config['PARTITIONS_AHEAD'],
+                            help='На сколько месяцев вперёд создавать секции')
+        parser.add_argument('--retention', type=int, default=config['RETENTION_MONTHS'],
+                            help='Срок хранения в месяцах (0 - не отключать старые секции)')
+        parser.add_argument('--drop', action='store_true',
+                            help='Удалять устаревшие секции, а не только отключать их')
+
+    def handle(self, *args, **options):
+        if not is_partitioned():
+            raise CommandError('Таблица журнала аудита не секционирована (требуется PostgreSQL и миграция 0007)')
+
+        for name in ensure_partitions(options['ahead']):
+            self.stdout.write(self.style.SUCCESS(f'Создана секция {name}'))
+
+        if options['retention'] > 0:
+            action = 'Удалена' if options['drop'] else 'Отключена'
+            for name in expire_partitions(options['retention'], drop=options['drop']):
+                self.stdout.write(self.style.WARNING(f'{action} секция {name}'))
+
+        partitions = list_partitions()
+        if partitions:
+            self.stdout.write(f'Секций: {len(partitions)}, с {partitions[0][0]:%m.%Y} по {partitions[-1][0]:%m.%Y}')
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+from app.models import Course
+from app.progress import rebuild_all_progress, refresh_course_progress
+
+
+class Command(BaseCommand):
+    help = 'Пересчитать таблицу прогресса студентов по курсам (CourseProgress) из StudentProgress'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--course', type=int, help='Пересчитать только один курс')
+
+    def handle(self, *args, **options):
+        if options['course']:
+            if not Course.objects.filter(pk=options['course']).exists():
+                raise CommandError(f'Курс {options["course"]} не найден')
+            rows = refresh_course_progress(options['course'])
+        else:
+            rows = rebuild_all_progress()
+        self.stdout.write(self.style.SUCCESS(f'Пересчитано строк прогресса: {rows}'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from app.stats import rebuild_dashboard_stats
+
+
+class Command(BaseCommand):
+    help = 'Полностью пересчитать снимок статистики панели управления'
+
+    def handle(self, *args, **options):
+        stats = rebuild_dashboard_stats()
+        self.stdout.write(self.style.SUCCESS(
+            f'Статистика пересчитана: пользователей {stats.total_users}, курсов {stats.total_courses}, '
+            f'активных записей {stats.total_enrollments}, результатов тестов {stats.quiz_results_count}'
+        ))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from app.item_analysis import refresh_item_stats
+
+
+class Command(BaseCommand):
+    help = ('Обновить анализ вопросов тестов (доля правильных ответов, дискриминативность, доли выбора '
+            'вариантов) по сохранённым ответам студентов. По умолчанию пересчитываются только тесты '
+            'с новыми результатами или изменёнными вопросами')
+
+    def add_arguments(self, parser):
+        parser.add_argument('quiz_ids', nargs='*', type=int, help='Только эти тесты')
+        parser.add_argument('--full', action='store_true', help='Пересчитать все тесты, а не только устаревшие')
+
+    def handle(self, *args, **options):
+        result = refresh_item_stats(options['quiz_ids'] or None, full=options['full'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано тестов: {result["quizzes"]}, вопросов: {result["questions"]}'
+        ))
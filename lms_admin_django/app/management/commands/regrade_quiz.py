@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+from app.grading import regrade_quiz
+from app.models import Quiz
+
+
+class Command(BaseCommand):
+    help = 'Перепроверить сохранённые ответы студентов по текущим правильным ответам теста'
+
+    def add_arguments(self, parser):
+        parser.add_argument('quiz_ids', nargs='+', type=int)
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        missing = set(options['quiz_ids']) - set(Quiz.objects.filter(pk__in=options['quiz_ids'])
+                                                 .values_list('pk', flat=True))
+        if missing:
+            raise CommandError(f'Тесты не найдены: {", ".join(map(str, sorted(missing)))}')
+        for quiz_id in options['quiz_ids']:
+            checked, changed = regrade_quiz(quiz_id, options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Тест {quiz_id}: проверено {checked}, изменено {changed}'))
@@ -0,0 +1,48 @@
+import datetime
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from app.course_status import BATCH_SIZE, run_course_status
+
+
+class Command(BaseCommand):
+    help = ('Перевести курсы по датам: завершившиеся - в архив, начавшиеся черновики - в опубликованные '
+            '(замена процедуры update_course_status). Переходы пишутся в журнал аудита')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--as-of', type=datetime.date.fromisoformat,
+                            help='Дата прохода (ГГГГ-ММ-ДД), по умолчанию - сегодня')
+        parser.add_argument('--full', action='store_true',
+                            help='Все просроченные курсы, а не только с границей после прошлого прохода')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--loop', action='store_true',
+                            help='Работать планировщиком: проход раз в --interval секунд')
+        parser.add_argument('--interval', type=int, default=3600)
+
+    def handle(self, *args, **options):
+        if options['loop'] and options['as_of']:
+            raise CommandError('--as-of несовместим с --loop')
+        if not options['loop']:
+            self._run(options['as_of'], options['full'], options['batch_size'])
+            return
+
+        # Первый проход планировщика - полный: догоняет курсы, даты которых исправили задним числом
+        full = True
+        try:
+            while True:
+                self._run(None, full, options['batch_size'])
+                full = options['full']
+                close_old_connections()
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            self.stdout.write('Планировщик остановлен')
+
+    def _run(self, as_of, full, batch_size):
+        result = run_course_status(as_of, full=full, batch_size=batch_size)
+        if result is None:
+            self.stdout.write(self.style.WARNING('Проход уже выполняется другим процессом - пропущен'))
+            return
+        window = f'с {result["since"]}' if result['since'] else 'полный'
+        self.stdout.write(self.style.SUCCESS(
+            f'{result["as_of"]} ({window}): в архив - {result["archived"]}, опубликовано - {result["published"]}'
+        ))
@@ -0,0 +1,229 @@
+import bisect
+import contextvars
+import logging
+import threading
+import time
+from django.conf import settings
+from django.template.backends.django import DjangoTemplates, Template
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': True,
+    'BUDGETS': {},             # {имя URL: допустимое число SQL-запросов}
+    'DEFAULT_BUDGET': None,    # бюджет для представлений, не указанных в BUDGETS
+    'RAISE_ON_BUDGET': False,  # превышение - исключение (в тестах), иначе предупреждение в лог
+    'ALLOWED_IPS': ['127.0.0.1'],  # кто может читать /metrics/ без входа (Prometheus)
+    'TOKEN': '',               # если задан - без входа только с заголовком Authorization: Bearer <TOKEN>
+}
+
+# Верхние границы корзин гистограмм
+TIME_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)  # мс
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+# Метрика -> (описание, корзины)
+METRICS = {
+    'latency_ms': ('Полное время обработки запроса, мс', TIME_BUCKETS),
+    'sql_ms': ('Суммарное время SQL-запросов, мс', TIME_BUCKETS),
+    'sql_queries': ('Число SQL-запросов', COUNT_BUCKETS),
+    'template_ms': ('Время рендеринга шаблонов, мс', TIME_BUCKETS),
+}
+
+
+def get_metrics_settings():
+    return {**DEFAULTS, **getattr(settings, 'REQUEST_METRICS', {})}
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Представление выполнило больше SQL-запросов, чем допускает его бюджет"""
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами: счётчики по корзинам, число и сумма наблюдений"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # последняя корзина - +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """Оценка квантиля по корзинам (верхняя граница корзины, в которую он попадает)"""
+
+        if not self.count:
+            return None
+        rank, seen = q * self.count, 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else None
+
+
+class MetricsRegistry:
+    """
+    Метрики запросов в памяти процесса: {имя URL: {метрика: гистограмма}}.
+    У каждого процесса WSGI-сервера свой реестр - Prometheus собирает их по отдельности.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def observe(self, view_name, values):
+        with self._lock:
+            histograms = self._views.get(view_name)
+            if histograms is None:
+                histograms = self._views[view_name] = {
+                    name: Histogram(buckets) for name, (_, buckets) in METRICS.items()
+                }
+            for name, value in values.items():
+                histograms[name].observe(value)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                view_name: {name: _copy(histogram) for name, histogram in histograms.items()}
+                for view_name, histograms in self._views.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+
+def _copy(histogram):
+    copy = Histogram(histogram.buckets)
+    copy.counts, copy.count, copy.sum = list(histogram.counts), histogram.count, histogram.sum
+    return copy
+
+
+registry = MetricsRegistry()
+
+
+# --- Сбор метрик текущего запроса ---
+
+class RequestMetrics:
+    def __init__(self):
+        self.sql_queries = 0
+        self.sql_ms = 0.0
+        self.template_ms = 0.0
+
+    def sql_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_ms += (time.perf_counter() - started) * 1000
+            self.sql_queries += 1
+
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+
+def start_request():
+    metrics = RequestMetrics()
+    return metrics, _current.set(metrics)
+
+
+def finish_request(token):
+    _current.reset(token)
+
+
+class InstrumentedTemplate(Template):
+    """Шаблон, время рендеринга которого учитывается в метриках текущего запроса"""
+
+    def render(self, context=None, request=None):
+        metrics = _current.get()
+        if metrics is None:
+            return super().render(context, request)
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.template_ms += (time.perf_counter() - started) * 1000
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """Бэкенд шаблонов Django с замером времени рендеринга (settings.TEMPLATES)"""
+
+    def from_string(self, template_code):
+        return InstrumentedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return InstrumentedTemplate(template.template, self)
+
+
+# --- Бюджеты запросов ---
+
+def get_budget(view_name, config=None):
+    config = config or get_metrics_settings()
+    return config['BUDGETS'].get(view_name, config['DEFAULT_BUDGET'])
+
+
+def check_budget(view_name, queries, config=None):
+    config = config or get_metrics_settings()
+    budget = get_budget(view_name, config)
+    if budget is None or queries <= budget:
+        return
+    message = f'{view_name}: {queries} SQL-запросов при бюджете {budget}'
+    if config['RAISE_ON_BUDGET']:
+        raise QueryBudgetExceeded(message)
+    logger.warning('Превышен бюджет запросов - %s', message)
+
+
+# --- Экспорт ---
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"')
+
+
+def prometheus_text(snapshot=None):
+    """Метрики в текстовом формате Prometheus (гистограммы lms_request_*)"""
+
+    snapshot = registry.snapshot() if snapshot is None else snapshot
+    lines = []
+    for name, (description, buckets) in METRICS.items():
+        metric = f'lms_request_{name}'
+        lines += [f'# HELP {metric} {description}', f'# TYPE {metric} histogram']
+        for view_name, histograms in sorted(snapshot.items()):
+            histogram, view = histograms[name], _label(view_name)
+            cumulative = 0
+            for bound, count in zip((*buckets, '+Inf'), histogram.counts):
+                cumulative += count
+                lines.append(f'{metric}_bucket{{view="{view}",le="{bound}"}} {cumulative}')
+            lines.append(f'{metric}_sum{{view="{view}"}} {histogram.sum:.3f}')
+            lines.append(f'{metric}_count{{view="{view}"}} {histogram.count}')
+    return '\n'.join(lines) + '\n'
+
+
+def summary_rows(snapshot=None):
+    """Строки для страницы метрик: по представлению число запросов, p50/p95 и средние"""
+
+    snapshot = registry.snapshot() if snapshot is None else snapshot
+    config = get_metrics_settings()
+    rows = []
+    for view_name, histograms in snapshot.items():
+        latency, queries = histograms['latency_ms'], histograms['sql_queries']
+        rows.append({
+            'view': view_name,
+            'requests': latency.count,
+            'latency_p50': latency.quantile(0.5),
+            'latency_p95': latency.quantile(0.95),
+            'sql_ms_mean': histograms['sql_ms'].mean,
+            'template_ms_mean': histograms['template_ms'].mean,
+            'queries_mean': queries.mean,
+            'queries_p95': queries.quantile(0.95),
+            'budget': get_budget(view_name, config),
+        })
+    return sorted(rows, key=lambda row: -row['latency_p95'])
@@ -0,0 +1,87 @@
+import time
+from contextlib import ExitStack
+from django.db import connections
+from .audit import set_current_request, reset_current_request
+from .metrics import check_budget, finish_request, get_metrics_settings, registry, start_request
+from . import routers
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+
+class AuditContextMiddleware:
+    """Делает текущий запрос (пользователь, IP) доступным для записи аудита"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = set_current_request(request)
+        try:
+            return self.get_response(request)
+        finally:
+            reset_current_request(token)
+
+
+class RequestMetricsMiddleware:
+    """
+    Замеряет для каждого запроса полное время, число и время SQL-запросов и время рендеринга
+    шаблонов и добавляет их в гистограммы по имени URL; проверяет бюджет SQL-запросов представления.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        config = get_metrics_settings()
+        if not config['ENABLED']:
+            return self.get_response(request)
+
+        metrics, token = start_request()
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics.sql_wrapper))
+                response = self.get_response(request)
+        finally:
+            finish_request(token)
+        latency_ms = (time.perf_counter() - started) * 1000
+
+        match = request.resolver_match
+        view_name = match.view_name if match else '<unresolved>'
+        registry.observe(view_name, {
+            'latency_ms': latency_ms,
+            'sql_ms': metrics.sql_ms,
+            'sql_queries': metrics.sql_queries,
+            'template_ms': metrics.template_ms,
+        })
+        check_budget(view_name, metrics.sql_queries, config)
+        return response
+
+
+class ReplicaStickinessMiddleware:
+    """
+    Read-your-writes для чтения с реплики: после изменяющего запроса (POST и т. п.) или записи в БД
+    пользователь STICKY_SECONDS секунд читает с основной БД - метка хранится в cookie.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        config = routers.get_replica_settings()
+        try:
+            pinned_until = float(request.COOKIES.get(config['COOKIE_NAME'], 0))
+        except ValueError:
+            pinned_until = 0
+        is_unsafe = request.method not in SAFE_METHODS
+        state, token = routers.start_request(pinned=is_unsafe or pinned_until > time.time())
+        try:
+            response = self.get_response(request)
+        finally:
+            routers.finish_request(token)
+
+        if is_unsafe or state.wrote:
+            response.set_cookie(config['COOKIE_NAME'], f'{time.time() + config["STICKY_SECONDS"]:.3f}',
+                                max_age=config['STICKY_SECONDS'], httponly=True, samesite='Lax')
+        return response
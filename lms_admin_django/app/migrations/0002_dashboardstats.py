@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-17 03:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DashboardStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_users', models.IntegerField(default=0, verbose_name='Всего пользователей')),
+                ('total_students', models.IntegerField(default=0, verbose_name='Студентов')),
+                ('total_teachers', models.IntegerField(default=0, verbose_name='Преподавателей')),
+                ('total_courses', models.IntegerField(default=0, verbose_name='Курсов всего')),
+                ('active_courses', models.IntegerField(default=0, verbose_name='Активных курсов')),
+                ('total_enrollments', models.IntegerField(default=0, verbose_name='Активных записей')),
+                ('quiz_results_count', models.IntegerField(default=0, verbose_name='Количество результатов тестов')),
+                ('quiz_percentage_sum', models.DecimalField(decimal_places=2, default=0, max_digits=20, verbose_name='Сумма процентов по тестам')),
+                ('rebuilt_at', models.DateTimeField(blank=True, null=True, verbose_name='Дата пересчёта')),
+            ],
+            options={
+                'verbose_name': 'Статистика панели',
+                'verbose_name_plural': 'Статистика панели',
+            },
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 4.2.7 on 2026-10-17 03:52
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    Course = apps.get_model('app', 'Course')
+    Enrollment = apps.get_model('app', 'Enrollment')
+
+    def status_count(status):
+        counts = Enrollment.objects.filter(course=OuterRef('pk'), status=status) \
+            .order_by().values('course').annotate(total=Count('pk')).values('total')
+        return Coalesce(Subquery(counts), 0)
+
+    Course.objects.update(
+        active_count=status_count('active'),
+        completed_count=status_count('completed'),
+        dropped_count=status_count('dropped'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0002_dashboardstats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='active_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Активных записей'),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='completed_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Завершивших'),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='dropped_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Отозванных записей'),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['-active_count'], name='app_course_active_count_idx'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
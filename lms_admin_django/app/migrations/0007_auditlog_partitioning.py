@@ -0,0 +1,117 @@
+import datetime
+from django.db import migrations, models
+
+
+NEW_INDEXES = [
+    models.Index(fields=['user', '-created_at'], name='app_auditlog_user_created_idx'),
+    models.Index(fields=['action', '-created_at'], name='app_auditlog_act_created_idx'),
+]
+
+COLUMNS = 'id, action, table_name, record_id, old_value, new_value, ip_address, created_at, user_id'
+
+# Первичный ключ секционированной таблицы обязан включать ключ секционирования,
+# поэтому в БД это (id, created_at); уникальность id обеспечивает последовательность.
+CREATE_PARTITIONED = """
+CREATE TABLE app_auditlog (
+    id bigint NOT NULL DEFAULT nextval('app_auditlog_event_id_seq'),
+    action varchar(50) NOT NULL,
+    table_name varchar(50) NULL,
+    record_id integer NULL,
+    old_value text NULL,
+    new_value text NULL,
+    ip_address inet NULL,
+    created_at timestamp with time zone NOT NULL,
+    user_id integer NULL,
+    CONSTRAINT app_auditlog_pkey PRIMARY KEY (id, created_at),
+    CONSTRAINT app_auditlog_user_id_fk_users_user_id FOREIGN KEY (user_id)
+        REFERENCES users (user_id) DEFERRABLE INITIALLY DEFERRED
+) PARTITION BY RANGE (created_at)
+"""
+
+PARENT_INDEXES = [
+    'CREATE INDEX app_auditlog_keyset_idx ON app_auditlog (created_at DESC, id DESC)',
+    'CREATE INDEX app_auditlog_user_created_idx ON app_auditlog (user_id, created_at DESC)',
+    'CREATE INDEX app_auditlog_act_created_idx ON app_auditlog (action, created_at DESC)',
+]
+
+MONTHS_AHEAD = 3
+
+
+def _add_months(value, months):
+    index = value.year * 12 + value.month - 1 + months
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def partition_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        AuditLog = apps.get_model('app', 'AuditLog')
+        for index in NEW_INDEXES:
+            schema_editor.add_index(AuditLog, index)
+        return
+
+    execute = schema_editor.execute
+    execute('ALTER TABLE app_auditlog RENAME TO app_auditlog_legacy')
+    execute('ALTER TABLE app_auditlog_legacy RENAME CONSTRAINT app_auditlog_pkey TO app_auditlog_legacy_pkey')
+    execute('DROP INDEX IF EXISTS app_auditlog_keyset_idx')
+
+    execute('CREATE SEQUENCE app_auditlog_event_id_seq')
+    execute("SELECT setval('app_auditlog_event_id_seq', COALESCE((SELECT MAX(id) FROM app_auditlog_legacy), 0) + 1, false)")
+    execute(CREATE_PARTITIONED)
+    execute('ALTER SEQUENCE app_auditlog_event_id_seq OWNED BY app_auditlog.id')
+    for sql in PARENT_INDEXES:
+        execute(sql)
+
+    # Секции: от месяца самой старой записи до MONTHS_AHEAD месяцев вперёд + секция по умолчанию
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('SELECT MIN(created_at)::date, CURRENT_DATE FROM app_auditlog_legacy')
+        oldest, today = cursor.fetchone()
+    month = datetime.date((oldest or today).year, (oldest or today).month, 1)
+    last = _add_months(datetime.date(today.year, today.month, 1), MONTHS_AHEAD)
+    while month <= last:
+        execute(
+            f"CREATE TABLE app_auditlog_p{month:%Y%m} PARTITION OF app_auditlog "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_add_months(month, 1).isoformat()}')"
+        )
+        month = _add_months(month, 1)
+    execute('CREATE TABLE app_auditlog_default PARTITION OF app_auditlog DEFAULT')
+
+    execute(f'INSERT INTO app_auditlog ({COLUMNS}) SELECT {COLUMNS} FROM app_auditlog_legacy')
+    execute('DROP TABLE app_auditlog_legacy')
+
+
+def unpartition_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        AuditLog = apps.get_model('app', 'AuditLog')
+        for index in NEW_INDEXES:
+            schema_editor.remove_index(AuditLog, index)
+        return
+
+    execute = schema_editor.execute
+    execute('ALTER TABLE app_auditlog RENAME TO app_auditlog_partitioned')
+    execute('ALTER TABLE app_auditlog_partitioned RENAME CONSTRAINT app_auditlog_pkey TO app_auditlog_partitioned_pkey')
+    for name in ('app_auditlog_keyset_idx', 'app_auditlog_user_created_idx', 'app_auditlog_act_created_idx'):
+        execute(f'ALTER INDEX {name} RENAME TO {name[:-4]}_old')
+    execute('ALTER SEQUENCE app_auditlog_event_id_seq OWNED BY NONE')
+    execute(CREATE_PARTITIONED.replace(', created_at)', ')').replace(' PARTITION BY RANGE (created_at)', ''))
+    execute('ALTER SEQUENCE app_auditlog_event_id_seq OWNED BY app_auditlog.id')
+    execute('CREATE INDEX app_auditlog_keyset_idx ON app_auditlog (created_at DESC, id DESC)')
+    execute(f'INSERT INTO app_auditlog ({COLUMNS}) SELECT {COLUMNS} FROM app_auditlog_partitioned')
+    execute('DROP TABLE app_auditlog_partitioned')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0006_auditlog_event_time'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(model_name='auditlog', index=index) for index in NEW_INDEXES
+            ],
+            database_operations=[
+                migrations.RunPython(partition_table, unpartition_table),
+            ],
+        ),
+    ]
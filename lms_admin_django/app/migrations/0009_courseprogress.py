@@ -0,0 +1,60 @@
+# Generated by Django 4.2.7 on 2026-10-17 04:16
+
+from django.conf import settings
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, F, Q
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def fill_progress(apps, schema_editor):
+    Lesson = apps.get_model('app', 'Lesson')
+    Enrollment = apps.get_model('app', 'Enrollment')
+    CourseProgress = apps.get_model('app', 'CourseProgress')
+
+    totals = dict(Lesson.objects.order_by().values_list('module__course').annotate(total=Count('pk')))
+    rows = Enrollment.objects.order_by().values_list('student_id', 'course_id').annotate(completed=Count(
+        'student__progress__lesson', distinct=True,
+        filter=Q(student__progress__status='completed', student__progress__lesson__module__course=F('course')),
+    ))
+    batch = []
+    for student_id, course_id, completed in rows.iterator():
+        total = totals.get(course_id, 0)
+        percent = (Decimal(completed) * 100 / total).quantize(Decimal('0.01')) if total else Decimal(0)
+        batch.append(CourseProgress(student_id=student_id, course_id=course_id, completed_lessons=completed,
+                                    total_lessons=total, percent=percent))
+        if len(batch) >= 5000:
+            CourseProgress.objects.bulk_create(batch)
+            batch = []
+    CourseProgress.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0008_backgroundjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseProgress',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('completed_lessons', models.IntegerField(default=0, verbose_name='Пройдено уроков')),
+                ('total_lessons', models.IntegerField(default=0, verbose_name='Всего уроков')),
+                ('percent', models.DecimalField(decimal_places=2, default=0, max_digits=5, verbose_name='Прогресс, %')),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Обновлено')),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='student_progress', to='app.course', verbose_name='Курс')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='course_progress', to=settings.AUTH_USER_MODEL, verbose_name='Студент')),
+            ],
+            options={
+                'verbose_name': 'Прогресс по курсу',
+                'verbose_name_plural': 'Прогресс по курсам',
+                'ordering': ['course', '-percent'],
+                'indexes': [models.Index(fields=['course', '-percent'], name='app_courseprogress_pct_idx')],
+                'unique_together': {('student', 'course')},
+            },
+        ),
+        migrations.RunPython(fill_progress, migrations.RunPython.noop),
+    ]
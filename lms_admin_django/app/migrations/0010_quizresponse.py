@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-17 04:18
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0009_courseprogress'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuizResponse',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('text_answer', models.TextField(blank=True, null=True, verbose_name='Текст ответа')),
+                ('answer', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='responses', to='app.answer', verbose_name='Выбранный вариант')),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='responses', to='app.question', verbose_name='Вопрос')),
+                ('result', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='responses', to='app.quizresult', verbose_name='Результат')),
+            ],
+            options={
+                'verbose_name': 'Ответ студента',
+                'verbose_name_plural': 'Ответы студентов',
+                'ordering': ['result', 'question'],
+            },
+        ),
+    ]
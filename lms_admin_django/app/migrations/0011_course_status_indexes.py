@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-17 04:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0010_quizresponse'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(condition=models.Q(('status__in', ['draft', 'published'])), fields=['status', 'end_date'], name='course_status_end_open_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(condition=models.Q(('status', 'draft')), fields=['status', 'start_date'], name='course_status_start_draft_idx'),
+        ),
+    ]
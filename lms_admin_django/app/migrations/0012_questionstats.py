@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-17 04:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0011_course_status_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionStats',
+            fields=[
+                ('question', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='app.question', verbose_name='Вопрос')),
+                ('attempts', models.IntegerField(default=0, verbose_name='Попыток')),
+                ('p_value', models.FloatField(blank=True, null=True, verbose_name='Доля правильных')),
+                ('discrimination', models.FloatField(blank=True, null=True, verbose_name='Дискриминативность')),
+                ('omit_rate', models.FloatField(default=0, verbose_name='Доля пропусков')),
+                ('option_rates', models.JSONField(default=dict, verbose_name='Доли выбора вариантов')),
+                ('results_count', models.IntegerField(default=0, verbose_name='Результатов теста')),
+                ('last_submitted_at', models.DateTimeField(blank=True, null=True, verbose_name='Последний результат')),
+                ('is_stale', models.BooleanField(default=False, verbose_name='Устарел')),
+                ('computed_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Дата расчёта')),
+            ],
+            options={
+                'verbose_name': 'Анализ вопроса',
+                'verbose_name_plural': 'Анализ вопросов',
+            },
+        ),
+    ]
@@ -1,4 +1,5 @@
-from django.db import models
+from django.db import models, router, transaction
+from django.utils import timezone
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.contrib.auth.hashers import make_password, check_password
 
@@ -66,6 +67,9 @@ class User(AbstractUser):
         verbose_name = 'Пользователь'
         verbose_name_plural = 'Пользователи'
         ordering = ['full_name']
+        indexes = [
+            models.Index(fields=['full_name', 'user_id'], name='users_keyset_idx'),
+        ]
 
     def __str__(self):
         return self.full_name
@@ -120,17 +124,44 @@ class Course(models.Model):
     max_students = models.IntegerField(blank=True, null=True, verbose_name='Макс. количество студентов')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
 
+    # Денормализованные счётчики записей по статусам (поддерживаются сигналами Enrollment)
+    active_count = models.IntegerField(default=0, editable=False, verbose_name='Активных записей')
+    completed_count = models.IntegerField(default=0, editable=False, verbose_name='Завершивших')
+    dropped_count = models.IntegerField(default=0, editable=False, verbose_name='Отозванных записей')
+
     class Meta:
         verbose_name = 'Курс'
         verbose_name_plural = 'Курсы'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-active_count'], name='app_course_active_count_idx'),
+            models.Index(fields=['-created_at', '-id'], name='app_course_keyset_idx'),
+            # Планировщик статусов (app.course_status): только курсы, которые ещё могут перейти
+            models.Index(fields=['status', 'end_date'], name='course_status_end_open_idx',
+                         condition=models.Q(status__in=['draft', 'published'])),
+            models.Index(fields=['status', 'start_date'], name='course_status_start_draft_idx',
+                         condition=models.Q(status='draft')),
+        ]
 
     def __str__(self):
         return self.title
 
+    COUNTER_FIELDS = ('active_count', 'completed_count', 'dropped_count')
+
+    def save(self, *args, **kwargs):
+        # Счётчики меняются только атомарными UPDATE ... SET x = x + 1: сохранение ранее загруженного
+        # экземпляра (форма админки, редактирование курса) не должно перезаписывать их устаревшими значениями
+        if not self._state.adding and not kwargs.get('force_insert') and kwargs.get('update_fields') is None:
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in deferred and field.name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
     def get_enrolled_count(self):
         """Количество записанных студентов"""
-        return self.enrollments.filter(status='active').count()
+        return self.active_count
 
 
 class Module(models.Model):
@@ -248,6 +279,34 @@ class Answer(models.Model):
         return self.answer_text[:50]
 
 
+class QuestionStats(models.Model):
+    """
+    Анализ вопроса по сохранённым ответам студентов: доля правильных ответов (p-value),
+    дискриминативность (точечно-бисериальная корреляция с баллом за остальные вопросы)
+    и доли выбора вариантов. Пересчитывается по тесту целиком (app.item_analysis)
+    """
+
+    question = models.OneToOneField(Question, on_delete=models.CASCADE, primary_key=True, related_name='stats',
+                                    verbose_name='Вопрос')
+    attempts = models.IntegerField(default=0, verbose_name='Попыток')
+    p_value = models.FloatField(blank=True, null=True, verbose_name='Доля правильных')
+    discrimination = models.FloatField(blank=True, null=True, verbose_name='Дискриминативность')
+    omit_rate = models.FloatField(default=0, verbose_name='Доля пропусков')
+    option_rates = models.JSONField(default=dict, verbose_name='Доли выбора вариантов')
+    # Состояние результатов теста на момент расчёта: по нему находятся тесты для пересчёта
+    results_count = models.IntegerField(default=0, verbose_name='Результатов теста')
+    last_submitted_at = models.DateTimeField(blank=True, null=True, verbose_name='Последний результат')
+    is_stale = models.BooleanField(default=False, verbose_name='Устарел')
+    computed_at = models.DateTimeField(default=timezone.now, verbose_name='Дата расчёта')
+
+    class Meta:
+        verbose_name = 'Анализ вопроса'
+        verbose_name_plural = 'Анализ вопросов'
+
+    def __str__(self):
+        return f"{self.question_id}: p={self.p_value}"
+
+
 class Enrollment(models.Model):
     """Запись студентов на курсы"""
 
@@ -275,6 +334,12 @@ class Enrollment(models.Model):
     def __str__(self):
         return f"{self.student.full_name} - {self.course.title}"
 
+    def save(self, *args, **kwargs):
+        # Счётчики курса меняются в post_save: запись и счётчики - в одной транзакции
+        # (удаление Collector и так выполняет вместе с сигналами в транзакции)
+        with transaction.atomic(using=kwargs.get('using') or router.db_for_write(type(self), instance=self)):
+            super().save(*args, **kwargs)
+
 
 class QuizResult(models.Model):
     """Результаты тестов"""
@@ -299,6 +364,29 @@ class QuizResult(models.Model):
         return f"{self.student.full_name} - {self.quiz.title}: {self.score}/{self.max_score}"
 
 
+class QuizResponse(models.Model):
+    """
+    Ответ студента на вопрос теста: выбранный вариант (по строке на вариант
+    для вопросов с несколькими ответами) или текст ответа
+    """
+
+    result = models.ForeignKey(QuizResult, on_delete=models.CASCADE, related_name='responses',
+                               verbose_name='Результат')
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='responses',
+                                 verbose_name='Вопрос')
+    answer = models.ForeignKey(Answer, on_delete=models.CASCADE, null=True, blank=True, related_name='responses',
+                               verbose_name='Выбранный вариант')
+    text_answer = models.TextField(blank=True, null=True, verbose_name='Текст ответа')
+
+    class Meta:
+        verbose_name = 'Ответ студента'
+        verbose_name_plural = 'Ответы студентов'
+        ordering = ['result', 'question']
+
+    def __str__(self):
+        return f"{self.result_id} - {self.question_id}"
+
+
 class StudentProgress(models.Model):
     """Прогресс обучения"""
 
@@ -326,6 +414,31 @@ class StudentProgress(models.Model):
         return f"{self.student.full_name} - {self.module.title}"
 
 
+class CourseProgress(models.Model):
+    """Прогресс студента по курсу: доля пройденных уроков (денормализация StudentProgress)"""
+
+    student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='course_progress',
+                                verbose_name='Студент')
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='student_progress',
+                               verbose_name='Курс')
+    completed_lessons = models.IntegerField(default=0, verbose_name='Пройдено уроков')
+    total_lessons = models.IntegerField(default=0, verbose_name='Всего уроков')
+    percent = models.DecimalField(max_digits=5, decimal_places=2, default=0, verbose_name='Прогресс, %')
+    updated_at = models.DateTimeField(default=timezone.now, verbose_name='Обновлено')
+
+    class Meta:
+        verbose_name = 'Прогресс по курсу'
+        verbose_name_plural = 'Прогресс по курсам'
+        ordering = ['course', '-percent']
+        unique_together = ['student', 'course']
+        indexes = [
+            models.Index(fields=['course', '-percent'], name='app_courseprogress_pct_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.student_id} - {self.course_id}: {self.percent}%"
+
+
 class AuditLog(models.Model):
     """Журнал аудита"""
 
@@ -337,12 +450,85 @@ class AuditLog(models.Model):
     old_value = models.TextField(blank=True, null=True, verbose_name='Старое значение')
     new_value = models.TextField(blank=True, null=True, verbose_name='Новое значение')
     ip_address = models.GenericIPAddressField(blank=True, null=True, verbose_name='IP адрес')
-    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата и время')
+    # Время события задаётся при его фиксации, а не при записи пачки фоновым потоком
+    created_at = models.DateTimeField(default=timezone.now, editable=False, verbose_name='Дата и время')
 
     class Meta:
         verbose_name = 'Запись аудита'
         verbose_name_plural = 'Журнал аудита'
         ordering = ['-created_at']
+        # В PostgreSQL таблица секционирована по месяцам created_at (миграция 0007),
+        # индексы создаются на родительской таблице и наследуются секциями
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='app_auditlog_keyset_idx'),
+            models.Index(fields=['user', '-created_at'], name='app_auditlog_user_created_idx'),
+            models.Index(fields=['action', '-created_at'], name='app_auditlog_act_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.created_at} - {self.action}"
+
+
+class DashboardStats(models.Model):
+    """Снимок статистики панели управления (одна строка, поддерживается сигналами)"""
+
+    SINGLETON_ID = 1
+
+    total_users = models.IntegerField(default=0, verbose_name='Всего пользователей')
+    total_students = models.IntegerField(default=0, verbose_name='Студентов')
+    total_teachers = models.IntegerField(default=0, verbose_name='Преподавателей')
+    total_courses = models.IntegerField(default=0, verbose_name='Курсов всего')
+    active_courses = models.IntegerField(default=0, verbose_name='Активных курсов')
+    total_enrollments = models.IntegerField(default=0, verbose_name='Активных записей')
+    quiz_results_count = models.IntegerField(default=0, verbose_name='Количество результатов тестов')
+    quiz_percentage_sum = models.DecimalField(max_digits=20, decimal_places=2, default=0,
+                                              verbose_name='Сумма процентов по тестам')
+    rebuilt_at = models.DateTimeField(blank=True, null=True, verbose_name='Дата пересчёта')
+
+    class Meta:
+        verbose_name = 'Статистика панели'
+        verbose_name_plural = 'Статистика панели'
 
     def __str__(self):
-        return f"{self.created_at} - {self.action}"
\ No newline at end of file
+        return f"Статистика на {self.rebuilt_at}"
+
+    @property
+    def avg_score(self):
+        """Средний процент по всем результатам тестов"""
+        if not self.quiz_results_count:
+            return 0
+        return self.quiz_percentage_sum / self.quiz_results_count
+
+
+class BackgroundJob(models.Model):
+    """Фоновая задача (импорт, удаление и т.п.) с прогрессом выполнения"""
+
+    STATUS_CHOICES = [
+        ('pending', 'В очереди'),
+        ('running', 'Выполняется'),
+        ('done', 'Завершена'),
+        ('failed', 'Ошибка'),
+    ]
+
+    kind = models.CharField(max_length=50, verbose_name='Тип задачи')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', verbose_name='Статус')
+    total = models.IntegerField(default=0, verbose_name='Всего')
+    processed = models.IntegerField(default=0, verbose_name='Обработано')
+    result = models.JSONField(blank=True, null=True, verbose_name='Результат')
+    error = models.TextField(blank=True, null=True, verbose_name='Ошибка')
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True,
+                                   related_name='background_jobs', verbose_name='Инициатор')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+    finished_at = models.DateTimeField(blank=True, null=True, verbose_name='Дата завершения')
+
+    class Meta:
+        verbose_name = 'Фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.get_status_display()})"
+
+    @property
+    def percent(self):
+        return round(self.processed * 100 / self.total) if self.total else 0
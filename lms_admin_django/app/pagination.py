@@ -0,0 +1,264 @@
+import base64
+import binascii
+import datetime
+import decimal
+import json
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import BooleanField, Expression, F, Q, Value
+from django.utils.functional import cached_property
+from django.http import QueryDict
+
+
+class _CursorEncoder(json.JSONEncoder):
+    """JSON для значений курсора без потери точности (микросекунды, Decimal)"""
+
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.date, datetime.time)):
+            return o.isoformat()
+        if isinstance(o, decimal.Decimal):
+            return str(o)
+        return super().default(o)
+
+
+class KeysetPage:
+    """Страница keyset-пагинации"""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None, query_params=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.query_params = query_params
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    def _query_with_cursor(self, cursor):
+        params = self.query_params.copy() if self.query_params is not None else QueryDict(mutable=True)
+        params['cursor'] = cursor
+        return params.urlencode()
+
+    @property
+    def next_query(self):
+        """Строка запроса для ссылки на следующую страницу (с сохранением фильтров)"""
+        return self._query_with_cursor(self.next_cursor) if self.has_next else ''
+
+    @property
+    def previous_query(self):
+        """Строка запроса для ссылки на предыдущую страницу (с сохранением фильтров)"""
+        return self._query_with_cursor(self.previous_cursor) if self.has_previous else ''
+
+
+class RowComparison(Expression):
+    """
+    Сравнение строк-кортежей (a, b, pk) > (x, y, z) одним условием: PostgreSQL использует его
+    как границу диапазона составного индекса, в отличие от равносильной формы через OR
+    """
+
+    output_field = BooleanField()
+    conditional = True
+
+    def __init__(self, columns, values, operator):
+        super().__init__()
+        self.columns = list(columns)
+        self.values = list(values)
+        self.operator = operator
+
+    def get_source_expressions(self):
+        return [*self.columns, *self.values]
+
+    def set_source_expressions(self, exprs):
+        self.columns, self.values = exprs[:len(self.columns)], exprs[len(self.columns):]
+
+    def as_sql(self, compiler, connection):
+        sides, params = [], []
+        for expressions in (self.columns, self.values):
+            parts = []
+            for expression in expressions:
+                sql, expression_params = compiler.compile(expression)
+                parts.append(sql)
+                params.extend(expression_params)
+            sides.append(f'({", ".join(parts)})')
+        return f'{sides[0]} {self.operator} {sides[1]}', params
+
+
+class KeysetPaginator:
+    """
+    Пагинация по ключу (seek method) вместо OFFSET.
+
+    Страница выбирается условием вида (a, b, pk) > (x, y, z) по полям сортировки,
+    поэтому N-я страница стоит столько же, сколько первая. Первичный ключ всегда
+    добавляется последним полем сортировки для стабильного порядка. Поля сортировки
+    должны быть собственными NOT NULL полями модели или аннотациями queryset
+    с точно сравнимым типом (например, ранг поиска, приведённый к numeric).
+    """
+
+    def __init__(self, queryset, ordering, per_page=50):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = list(ordering)
+        if not any(name.lstrip('-') in ('pk', queryset.model._meta.pk.name) for name in self.ordering):
+            descending = self.ordering[-1].startswith('-') if self.ordering else False
+            self.ordering.append('-pk' if descending else 'pk')
+        self.fields = [self._get_field(name.lstrip('-')) for name in self.ordering]
+        self.attnames = [
+            name.lstrip('-') if name.lstrip('-') in queryset.query.annotations else field.attname
+            for name, field in zip(self.ordering, self.fields)
+        ]
+
+    def _get_field(self, name):
+        annotation = self.queryset.query.annotations.get(name)
+        if annotation is not None:
+            return annotation.output_field
+        opts = self.queryset.model._meta
+        return opts.pk if name == 'pk' else opts.get_field(name)
+
+    # --- Курсоры ---
+
+    def encode_cursor(self, direction, obj):
+        values = [getattr(obj, attname) for attname in self.attnames]
+        raw = json.dumps([direction, values], cls=_CursorEncoder, separators=(',', ':'))
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        """Разобрать курсор; некорректный курсор даёт None (первая страница)"""
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            direction, values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            if direction not in ('next', 'prev') or len(values) != len(self.fields):
+                return None
+            return direction, [field.to_python(value) for field, value in zip(self.fields, values)]
+        except (ValueError, TypeError, binascii.Error, ValidationError):
+            return None
+
+    # --- Выборка ---
+
+    def _seek_filter(self, values, forward):
+        """
+        Условие «строка стоит после values» для текущего (forward) или обратного порядка.
+        При одном направлении всех полей - сравнение кортежей (RowComparison); при смешанном -
+        раскрытие через OR с избыточной границей по первому полю (a >= x или a <= x для убывания),
+        чтобы индекс по первому полю сужал диапазон, а не просматривался с начала.
+        """
+        names = [name.lstrip('-') for name in self.ordering]
+        directions = {name.startswith('-') for name in self.ordering}
+        if len(directions) == 1:
+            operator = '<' if directions.pop() == forward else '>'
+            return RowComparison([F(name) for name in names],
+                                 [Value(value, output_field=field) for value, field in zip(values, self.fields)],
+                                 operator)
+
+        condition = Q()
+        for index in reversed(range(len(self.ordering))):
+            name = self.ordering[index].lstrip('-')
+            descending = self.ordering[index].startswith('-')
+            lookup = 'lt' if descending == forward else 'gt'
+            step = Q(**{f'{name}__{lookup}': values[index]})
+            if index < len(self.ordering) - 1:
+                step |= Q(**{name: values[index]}) & condition
+            condition = step
+        bound = 'lte' if self.ordering[0].startswith('-') == forward else 'gte'
+        return Q(**{f'{names[0]}__{bound}': values[0]}) & condition
+
+    def _reversed_ordering(self):
+        return [name[1:] if name.startswith('-') else f'-{name}' for name in self.ordering]
+
+    def get_page(self, cursor=None, query_params=None):
+        decoded = self.decode_cursor(cursor) if cursor else None
+        limit = self.per_page + 1
+
+        if decoded is None:
+            rows = list(self.queryset.order_by(*self.ordering)[:limit])
+            has_more, has_before = len(rows) > self.per_page, False
+            rows = rows[:self.per_page]
+        elif decoded[0] == 'next':
+            rows = list(self.queryset.filter(self._seek_filter(decoded[1], True))
+                        .order_by(*self.ordering)[:limit])
+            has_more, has_before = len(rows) > self.per_page, True
+            rows = rows[:self.per_page]
+        else:
+            rows = list(self.queryset.filter(self._seek_filter(decoded[1], False))
+                        .order_by(*self._reversed_ordering())[:limit])
+            has_more, has_before = True, len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+
+        next_cursor = self.encode_cursor('next', rows[-1]) if rows and has_more else None
+        previous_cursor = self.encode_cursor('prev', rows[0]) if rows and has_before else None
+        return KeysetPage(rows, next_cursor, previous_cursor, query_params)
+
+
+def paginate_keyset(request, queryset, ordering, per_page=50):
+    """Страница списка по параметру ?cursor=, остальные GET-параметры сохраняются в ссылках"""
+
+    query_params = request.GET.copy()
+    cursor = query_params.pop('cursor', [''])[0]
+    paginator = KeysetPaginator(queryset, ordering, per_page=per_page)
+    return paginator.get_page(cursor, query_params)
+
+
+# --- Постраничный вывод в админке с оценкой количества строк ---
+
+def estimate_count(queryset):
+    """
+    Оценка числа строк по статистике PostgreSQL: для всей таблицы - pg_class.reltuples
+    (для секционированной - сумма по секциям), для выборки с условиями - оценка из EXPLAIN.
+    Для других СУБД - None.
+    """
+
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+
+    query = queryset.query
+    if not query.where and not query.distinct and not query.combinator:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT SUM(GREATEST(c.reltuples, 0)) FROM pg_class c "
+                "WHERE c.relkind <> 'p' AND (c.oid = %s::regclass OR c.oid IN "
+                "(SELECT inhrelid FROM pg_inherits WHERE inhparent = %s::regclass))",
+                [queryset.model._meta.db_table] * 2,
+            )
+            estimate = cursor.fetchone()[0]
+        return int(estimate or 0)
+
+    plan = json.loads(queryset.order_by().explain(format='json'))
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator для больших таблиц: точный COUNT(*) ограничивается EXACT_COUNT_LIMIT строками,
+    а если строк больше - используется оценка из статистики PostgreSQL (estimate_count).
+    Небольшие выборки, в том числе отфильтрованные, считаются точно.
+    """
+
+    EXACT_COUNT_LIMIT = 10000
+    is_estimated = False
+
+    @cached_property
+    def count(self):
+        # COUNT(*) по подзапросу с LIMIT - читает не больше EXACT_COUNT_LIMIT + 1 строк
+        bounded = self.object_list.order_by()[:self.EXACT_COUNT_LIMIT + 1].count()
+        if bounded <= self.EXACT_COUNT_LIMIT:
+            return bounded
+        estimate = estimate_count(self.object_list)
+        if estimate is None:
+            return super().count
+        self.is_estimated = True
+        return max(estimate, bounded)
@@ -0,0 +1,109 @@
+import datetime
+import re
+from django.db import connection, transaction
+from django.utils import timezone
+
+
+# Журнал аудита хранится в секционированной по месяцам таблице (PARTITION BY RANGE (created_at)).
+# Секции называются app_auditlog_pYYYYMM, строки вне созданных секций попадают в app_auditlog_default.
+PARENT_TABLE = 'app_auditlog'
+DEFAULT_PARTITION = 'app_auditlog_default'
+PARTITION_RE = re.compile(r'^app_auditlog_p(\d{4})(\d{2})$')
+
+
+def month_start(value):
+    return datetime.date(value.year, value.month, 1)
+
+
+def add_months(value, months):
+    index = value.year * 12 + value.month - 1 + months
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f'{PARENT_TABLE}_p{month:%Y%m}'
+
+
+def is_partitioned():
+    """Секционирована ли таблица журнала (только PostgreSQL)"""
+
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relkind FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace "
+            "WHERE c.relname = %s AND n.nspname = current_schema()", [PARENT_TABLE]
+        )
+        row = cursor.fetchone()
+    return row is not None and row[0] == 'p'
+
+
+def list_partitions():
+    """Помесячные секции журнала: [(первое число месяца, имя таблицы)] по возрастанию"""
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname FROM pg_inherits i "
+            "JOIN pg_class parent ON parent.oid = i.inhparent "
+            "JOIN pg_class child ON child.oid = i.inhrelid "
+            "WHERE parent.relname = %s", [PARENT_TABLE]
+        )
+        names = [row[0] for row in cursor.fetchall()]
+
+    partitions = []
+    for name in names:
+        match = PARTITION_RE.match(name)
+        if match:
+            partitions.append((datetime.date(int(match.group(1)), int(match.group(2)), 1), name))
+    return sorted(partitions)
+
+
+def create_partition(month):
+    """
+    Создать секцию за месяц. Строки этого месяца, уже попавшие в секцию по умолчанию,
+    переносятся в новую секцию до её подключения (иначе ATTACH завершится ошибкой).
+    """
+
+    name = partition_name(month)
+    start, end = month.isoformat(), add_months(month, 1).isoformat()
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE TABLE {name} (LIKE {PARENT_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'
+        )
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE created_at >= %s AND created_at < %s '
+            f'RETURNING *) INSERT INTO {name} SELECT * FROM moved', [start, end]
+        )
+        cursor.execute(
+            f'ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)', [start, end]
+        )
+    return name
+
+
+def ensure_partitions(months_ahead, today=None):
+    """Создать недостающие секции от текущего месяца на months_ahead месяцев вперёд"""
+
+    current = month_start(today or timezone.localdate())
+    existing = {month for month, _ in list_partitions()}
+    created = []
+    for offset in range(months_ahead + 1):
+        month = add_months(current, offset)
+        if month not in existing:
+            created.append(create_partition(month))
+    return created
+
+
+def expire_partitions(retention_months, drop=False, today=None):
+    """Отключить (и при drop удалить) секции, целиком старше срока хранения"""
+
+    boundary = add_months(month_start(today or timezone.localdate()), -retention_months)
+    expired = []
+    for month, name in list_partitions():
+        if add_months(month, 1) > boundary:
+            continue
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}')
+            if drop:
+                cursor.execute(f'DROP TABLE {name}')
+        expired.append(name)
+    return expired
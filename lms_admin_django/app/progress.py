@@ -0,0 +1,80 @@
+from decimal import Decimal
+from django.db.models import Count, Q
+from django.db.models.query import QuerySet
+from django.utils import timezone
+from .models import Course, Lesson, Enrollment, CourseProgress
+
+HUNDRED = Decimal(100)
+CENT = Decimal('0.01')
+
+
+def calc_percent(completed, total):
+    if not total:
+        return Decimal(0)
+    return (Decimal(completed) * HUNDRED / total).quantize(CENT)
+
+
+def compute_course_progress(course_id, student_ids=None):
+    """
+    Прогресс записанных на курс студентов одним GROUP BY: {student_id: пройдено уроков}.
+    Пройденный урок - строка StudentProgress со статусом completed для урока этого курса.
+    """
+
+    enrollments = Enrollment.objects.filter(course_id=course_id)
+    if student_ids is not None:
+        enrollments = enrollments.filter(student_id__in=student_ids)
+    rows = enrollments.order_by().values('student_id').annotate(completed=Count(
+        'student__progress__lesson', distinct=True,
+        filter=Q(student__progress__status='completed',
+                 student__progress__lesson__module__course_id=course_id),
+    ))
+    return {row['student_id']: row['completed'] for row in rows}
+
+
+def refresh_course_progress(course_id, student_ids=None):
+    """
+    Пересчитать строки CourseProgress курса (всех студентов или только student_ids)
+    и удалить строки студентов, которые больше не записаны на курс.
+    """
+
+    total = Lesson.objects.filter(module__course_id=course_id).count()
+    completed = compute_course_progress(course_id, student_ids)
+    now = timezone.now()
+    CourseProgress.objects.bulk_create(
+        [
+            CourseProgress(student_id=student_id, course_id=course_id, completed_lessons=count,
+                           total_lessons=total, percent=calc_percent(count, total), updated_at=now)
+            for student_id, count in completed.items()
+        ],
+        update_conflicts=True,
+        unique_fields=['student', 'course'],
+        update_fields=['completed_lessons', 'total_lessons', 'percent', 'updated_at'],
+    )
+
+    stale = CourseProgress.objects.filter(course_id=course_id).exclude(student_id__in=list(completed))
+    if student_ids is not None:
+        stale = stale.filter(student_id__in=student_ids)
+    stale.delete()
+    return len(completed)
+
+
+def rebuild_all_progress(progress=None):
+    """Полный пересчёт таблицы прогресса по всем курсам"""
+
+    rows = 0
+    for course_id in Course.objects.order_by('pk').values_list('pk', flat=True).iterator():
+        rows += refresh_course_progress(course_id)
+        if progress:
+            progress(course_id, rows)
+    return rows
+
+
+def is_cascade(sender, origin):
+    """
+    Удаление пришло каскадом от другого объекта (курса, студента, модуля). Тогда строки прогресса
+    удаляются тем же каскадом или пересчитываются обработчиком исходного объекта.
+    """
+
+    if isinstance(origin, QuerySet):
+        return origin.model is not sender
+    return not isinstance(origin, sender)
@@ -0,0 +1,89 @@
+from django.db import connection
+from django.db.models import Avg, Count, F, OuterRef, Q, Subquery, DecimalField
+from django.db.models.functions import Cast
+from .models import User, Course, Enrollment, QuizResult, CourseProgress
+
+
+# Каждая метрика считается своим предагрегированным запросом по одной таблице.
+# Соединение enrollments x quiz_results в одном GROUP BY размножает строки
+# (и завышает COUNT), поэтому метрики не смешиваются в одном JOIN.
+
+def _scalar(queryset, group_field, aggregate, output_field):
+    """Подзапрос: агрегат по queryset, сгруппированный по group_field = внешний pk"""
+    subquery = queryset.filter(**{group_field: OuterRef('pk')}) \
+        .order_by().values(group_field).annotate(value=aggregate).values('value')
+    return Subquery(subquery, output_field=output_field)
+
+
+def course_report(courses=None):
+    """Отчёт по курсам: активные и завершившие записи (счётчики курса), средний балл и прогресс"""
+
+    if courses is None:
+        courses = Course.objects.all()
+    return courses.select_related('teacher').annotate(
+        total_enrolled=F('active_count'),
+        completed=F('completed_count'),
+        avg_score=_scalar(QuizResult.objects.all(), 'quiz__module__course', Avg('percentage'),
+                          DecimalField(max_digits=5, decimal_places=2)),
+        avg_progress=_scalar(CourseProgress.objects.all(), 'course', Avg('percent'),
+                             DecimalField(max_digits=5, decimal_places=2)),
+    )
+
+
+# Метрики отчёта по студентам: агрегаты по таблицам, присоединяемые к строке студента
+STUDENT_METRICS = ('courses_count', 'completed_courses', 'avg_score', 'avg_progress')
+
+
+def _student_aggregates():
+    # Каждая таблица агрегируется один раз (GROUP BY student_id) и присоединяется одним LEFT JOIN
+    score = DecimalField(max_digits=5, decimal_places=2)
+    return [
+        ('enrollments', Enrollment.objects.order_by().values('student_id').annotate(
+            courses_count=Count('pk', filter=Q(status='active')),
+            completed_courses=Count('pk', filter=Q(status='completed')),
+        )),
+        ('results', QuizResult.objects.order_by().values('student_id').annotate(
+            avg_score=Cast(Avg('percentage'), score),
+        )),
+        ('progress', CourseProgress.objects.order_by().values('student_id').annotate(
+            avg_progress=Cast(Avg('percent'), score),
+        )),
+    ]
+
+
+def student_report(students=None, order_by=('-courses_count', 'full_name'), limit=None):
+    """
+    Отчёт по студентам (RawQuerySet пользователей с полями STUDENT_METRICS): активные и завершённые
+    курсы, средний балл и прогресс. Записи, результаты и прогресс агрегируются каждый одним GROUP BY
+    и присоединяются к студентам по одному разу - без размножения строк и без коррелированных
+    подзапросов, которые сортировка по числу курсов выполняла бы для каждого студента.
+    order_by - поля модели или метрики ('-' - по убыванию).
+    """
+
+    if students is None:
+        students = User.objects.filter(role='student')
+    opts = User._meta
+    qn = connection.ops.quote_name
+    base_sql, params = students.order_by().query.sql_with_params()
+    params = list(params)
+    joins = []
+    for alias, queryset in _student_aggregates():
+        sql, aggregate_params = queryset.query.sql_with_params()
+        joins.append(f'LEFT JOIN ({sql}) {alias} ON {alias}.{qn("student_id")} = u.{qn(opts.pk.column)}')
+        params.extend(aggregate_params)
+
+    ordering = []
+    for name in order_by:
+        field = name.lstrip('-')
+        column = qn(field) if field in STUDENT_METRICS else f'u.{qn(opts.get_field(field).column)}'
+        ordering.append(f'{column} {"DESC" if name.startswith("-") else "ASC"}')
+    sql = (
+        f'SELECT u.*, COALESCE(enrollments.{qn("courses_count")}, 0) AS {qn("courses_count")}, '
+        f'COALESCE(enrollments.{qn("completed_courses")}, 0) AS {qn("completed_courses")}, '
+        f'results.{qn("avg_score")}, progress.{qn("avg_progress")} '
+        f'FROM ({base_sql}) u {" ".join(joins)} ORDER BY {", ".join(ordering)}'
+    )
+    if limit is not None:
+        sql += ' LIMIT %s'
+        params.append(limit)
+    return User.objects.raw(sql, params)
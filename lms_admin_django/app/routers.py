@@ -0,0 +1,170 @@
+import contextvars
+import functools
+import logging
+import threading
+import time
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ALIAS': 'replica',          # псевдоним реплики в DATABASES; нет такого - всё читается с основной БД
+    'STICKY_SECONDS': 5,         # сколько после изменяющего запроса пользователь читает с основной БД
+    'MAX_LAG_SECONDS': 10,       # при большем отставании реплики чтение идёт с основной БД
+    'LAG_CHECK_INTERVAL': 5,     # как часто (с) процесс заново измеряет отставание
+    'COOKIE_NAME': 'lms_primary_until',
+}
+
+
+def get_replica_settings():
+    return {**DEFAULTS, **getattr(settings, 'READ_REPLICA', {})}
+
+
+class RequestState:
+    """Состояние запроса: читать ли с основной БД (pinned) и были ли в запросе записи (wrote)"""
+
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+
+
+_use_replica = contextvars.ContextVar('use_replica', default=False)
+_request_state = contextvars.ContextVar('replica_request_state', default=None)
+
+
+def start_request(pinned=False):
+    state = RequestState(pinned)
+    return state, _request_state.set(state)
+
+
+def finish_request(token):
+    _request_state.reset(token)
+
+
+def _record_write():
+    # После записи чтения этого запроса идут с основной БД (read-your-writes)
+    state = _request_state.get()
+    if state is not None:
+        state.pinned = state.wrote = True
+
+
+class use_replica:
+    """
+    Контекстный менеджер: чтения внутри блока уходят на реплику (если она доступна и не отстаёт).
+    use_replica(False) возвращает чтения блока на основную БД, в том числе внутри @replica_reads.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+
+    def __enter__(self):
+        self.token = _use_replica.set(self.enabled)
+
+    def __exit__(self, *exc_info):
+        _use_replica.reset(self.token)
+
+
+def _stream_on_replica(content):
+    # Потоковый ответ итерируется после выхода из представления - каждую порцию читаем на реплике
+    iterator = iter(content)
+    sentinel = object()
+    while True:
+        with use_replica():
+            chunk = next(iterator, sentinel)
+        if chunk is sentinel:
+            return
+        yield chunk
+
+
+def replica_reads(view):
+    """Декоратор аналитического представления: его чтения, в том числе потоковой выгрузки, идут на реплику"""
+
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        with use_replica():
+            response = view(request, *args, **kwargs)
+        if response.streaming:
+            response.streaming_content = _stream_on_replica(response.streaming_content)
+        return response
+    return wrapper
+
+
+# --- Отставание реплики ---
+
+_lag_lock = threading.Lock()
+_lag_state = {'checked_at': None, 'lag': None}
+
+
+def measure_lag(alias):
+    """Отставание реплики в секундах; None - реплика недоступна. Для других СУБД, кроме PostgreSQL, - 0"""
+
+    connection = connections[alias]
+    try:
+        if connection.vendor != 'postgresql':
+            connection.ensure_connection()
+            return 0
+        with connection.cursor() as cursor:
+            # Время с последней применённой транзакции; при простое основной БД оценка завышается,
+            # и чтение безопасно уходит на основную
+            cursor.execute(
+                "SELECT CASE WHEN pg_is_in_recovery() "
+                "THEN COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) ELSE 0 END"
+            )
+            return float(cursor.fetchone()[0])
+    except DatabaseError:
+        logger.warning('Реплика %s недоступна, чтение идёт с основной БД', alias, exc_info=True)
+        return None
+
+
+def replica_lag(alias, config):
+    """Отставание реплики с кешированием на LAG_CHECK_INTERVAL секунд в пределах процесса"""
+
+    now = time.monotonic()
+    with _lag_lock:
+        checked_at = _lag_state['checked_at']
+        if checked_at is not None and now - checked_at < config['LAG_CHECK_INTERVAL']:
+            return _lag_state['lag']
+        _lag_state['checked_at'] = now
+    lag = measure_lag(alias)
+    with _lag_lock:
+        _lag_state['lag'] = lag
+    return lag
+
+
+def get_read_alias(config=None):
+    """Куда направить чтение в текущем контексте: реплика или основная БД"""
+
+    config = config or get_replica_settings()
+    alias = config['ALIAS']
+    state = _request_state.get()
+    if not _use_replica.get() or (state is not None and state.pinned) or alias not in connections.settings:
+        return DEFAULT_DB_ALIAS
+    # Внутри транзакции на основной БД читаем её же - иначе не увидим собственных незафиксированных изменений
+    if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+        return DEFAULT_DB_ALIAS
+    lag = replica_lag(alias, config)
+    if lag is None or lag > config['MAX_LAG_SECONDS']:
+        return DEFAULT_DB_ALIAS
+    return alias
+
+
+class ReplicaRouter:
+    """
+    Чтения в блоках use_replica / представлениях с @replica_reads - на реплику, всё остальное и все
+    записи - на основную БД. После записи чтения текущего запроса возвращаются на основную БД.
+    """
+
+    def db_for_read(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        return get_read_alias()
+
+    def db_for_write(self, model, **hints):
+        _record_write()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплика - копия основной БД: связи между объектами из них допустимы
+        return True
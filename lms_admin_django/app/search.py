@@ -0,0 +1,37 @@
+from functools import reduce
+from operator import or_
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db import connections
+from django.db.models import DecimalField, Q, Value
+from django.db.models.functions import Cast, Greatest
+
+
+# Поля поиска. Фильтр - icontains (UPPER(col) LIKE UPPER('%q%')), его обслуживают
+# GIN-индексы pg_trgm по UPPER(col) из миграции 0005_search_trigram_indexes.
+USER_SEARCH_FIELDS = ('full_name', 'email')
+COURSE_SEARCH_FIELDS = ('title', 'description', 'teacher__full_name')
+
+# Ранг приводится к numeric: точное значение нужно для курсора keyset-пагинации
+RANK_FIELD = DecimalField(max_digits=7, decimal_places=6)
+
+
+def _search(queryset, query, fields):
+    """Отфильтровать queryset по подстроке и добавить ранг совпадения search_rank"""
+
+    queryset = queryset.filter(reduce(or_, (Q(**{f'{field}__icontains': query}) for field in fields)))
+    if connections[queryset.db].vendor == 'postgresql':
+        similarities = [TrigramWordSimilarity(query, field) for field in fields]
+        rank = Greatest(*similarities) if len(similarities) > 1 else similarities[0]
+    else:
+        rank = Value(0)
+    return queryset.annotate(search_rank=Cast(rank, RANK_FIELD))
+
+
+def search_users(users, query):
+    """Поиск пользователей по ФИО и email с ранжированием"""
+    return _search(users, query, USER_SEARCH_FIELDS)
+
+
+def search_courses(courses, query):
+    """Поиск курсов по названию, описанию и ФИО преподавателя с ранжированием"""
+    return _search(courses, query, COURSE_SEARCH_FIELDS)
@@ -0,0 +1,379 @@
+from collections import Counter
+from django.apps import apps
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from .audit import AUDITED_MODELS, build_entry, record
+from .caching import invalidate_model_fragments
+from .models import User, Course, Module, Lesson, Quiz, Question, Answer, Enrollment, QuizResult, StudentProgress
+from .counters import apply_enrollment_delta
+from .course_cache import invalidate_course_structure
+from .gradebook import invalidate_gradebook
+from .grading import invalidate_answer_key
+from .item_analysis import mark_stale
+from .progress import is_cascade, refresh_course_progress
+from .stats import apply_dashboard_delta
+
+
+# Модели, для которых перед сохранением запоминается прежнее состояние строки
+# (нужно счётчикам и журналу аудита)
+OLD_STATE_MODELS = {User, Course, Enrollment, QuizResult, *AUDITED_MODELS}
+
+ROLE_COUNTERS = {'student': 'total_students', 'teacher': 'total_teachers'}
+
+
+def _remember_old_state(sender, instance, update_fields=None, **kwargs):
+    """Сохранить в instance._old_state прежние значения полей строки {attname: значение}"""
+
+    instance._old_state = None
+    if instance._state.adding:
+        return
+    attnames = [field.attname for field in sender._meta.concrete_fields]
+    if update_fields is not None:
+        # Меняются только update_fields - остальные значения берём из объекта без SELECT
+        changing = {sender._meta.get_field(name).attname for name in update_fields}
+        old_state = sender._base_manager.filter(pk=instance.pk).values(*changing).first() if changing else {}
+        if old_state is None:
+            return
+        instance._old_state = {
+            attname: old_state[attname] if attname in changing else getattr(instance, attname)
+            for attname in attnames
+        }
+        return
+    instance._old_state = sender._base_manager.filter(pk=instance.pk).values(*attnames).first()
+
+
+for _model in OLD_STATE_MODELS:
+    pre_save.connect(_remember_old_state, sender=_model, dispatch_uid=f'old_state_{_model.__name__}')
+
+
+def _old_value(instance, field):
+    old_state = getattr(instance, '_old_state', None)
+    return old_state[instance._meta.get_field(field).attname] if old_state else None
+
+
+# --- Журнал аудита ---
+
+def audit_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    record(build_entry('CREATE' if created else 'UPDATE', instance, getattr(instance, '_old_state', None)))
+
+
+def audit_deleted(sender, instance, **kwargs):
+    record(build_entry('DELETE', instance))
+
+
+for _model in AUDITED_MODELS:
+    post_save.connect(audit_saved, sender=_model, dispatch_uid=f'audit_save_{_model.__name__}')
+    post_delete.connect(audit_deleted, sender=_model, dispatch_uid=f'audit_delete_{_model.__name__}')
+
+
+# --- Снимок статистики панели управления ---
+
+@receiver(post_save, sender=User)
+def dashboard_user_saved(sender, instance, created, **kwargs):
+    deltas = Counter()
+    if created:
+        deltas['total_users'] += 1
+    else:
+        old_role = _old_value(instance, 'role')
+        if old_role == instance.role:
+            return
+        if old_role in ROLE_COUNTERS:
+            deltas[ROLE_COUNTERS[old_role]] -= 1
+    if instance.role in ROLE_COUNTERS:
+        deltas[ROLE_COUNTERS[instance.role]] += 1
+    apply_dashboard_delta(**deltas)
+
+
+@receiver(post_delete, sender=User)
+def dashboard_user_deleted(sender, instance, **kwargs):
+    deltas = Counter(total_users=-1)
+    if instance.role in ROLE_COUNTERS:
+        deltas[ROLE_COUNTERS[instance.role]] -= 1
+    apply_dashboard_delta(**deltas)
+
+
+@receiver(post_save, sender=Course)
+def dashboard_course_saved(sender, instance, created, **kwargs):
+    was_published = not created and _old_value(instance, 'status') == 'published'
+    apply_dashboard_delta(
+        total_courses=1 if created else 0,
+        active_courses=(instance.status == 'published') - was_published,
+    )
+
+
+@receiver(post_delete, sender=Course)
+def dashboard_course_deleted(sender, instance, **kwargs):
+    apply_dashboard_delta(total_courses=-1, active_courses=-(instance.status == 'published'))
+
+
+@receiver(post_save, sender=Enrollment)
+def dashboard_enrollment_saved(sender, instance, created, **kwargs):
+    was_active = not created and _old_value(instance, 'status') == 'active'
+    apply_dashboard_delta(total_enrollments=(instance.status == 'active') - was_active)
+
+
+@receiver(post_delete, sender=Enrollment)
+def dashboard_enrollment_deleted(sender, instance, **kwargs):
+    apply_dashboard_delta(total_enrollments=-(instance.status == 'active'))
+
+
+@receiver(post_save, sender=QuizResult)
+def dashboard_quiz_result_saved(sender, instance, created, **kwargs):
+    if created:
+        apply_dashboard_delta(quiz_results_count=1, quiz_percentage_sum=instance.percentage)
+    else:
+        old_percentage = _old_value(instance, 'percentage') or 0
+        apply_dashboard_delta(quiz_percentage_sum=instance.percentage - old_percentage)
+
+
+@receiver(post_delete, sender=QuizResult)
+def dashboard_quiz_result_deleted(sender, instance, **kwargs):
+    apply_dashboard_delta(quiz_results_count=-1, quiz_percentage_sum=-instance.percentage)
+
+
+# --- Журнал оценок ---
+
+@receiver(post_save, sender=QuizResult)
+def gradebook_quiz_result_saved(sender, instance, created, **kwargs):
+    # Новый результат меняет ключ журнала сам (время и число результатов), правка существующего - нет
+    if not created:
+        invalidate_gradebook(Quiz.objects.values_list('module__course_id', flat=True).get(pk=instance.quiz_id))
+
+
+@receiver(post_save, sender=Enrollment)
+def gradebook_enrollment_saved(sender, instance, created, **kwargs):
+    # Строки журнала - записи курса: новая запись или перенос на другой курс/студента меняют их состав
+    old = None if created else (_old_value(instance, 'course'), _old_value(instance, 'student'))
+    if old == (instance.course_id, instance.student_id):
+        return
+    for course_id in {instance.course_id, old[0] if old else None} - {None}:
+        invalidate_gradebook(course_id)
+
+
+@receiver(post_delete, sender=Enrollment)
+def gradebook_enrollment_deleted(sender, instance, **kwargs):
+    invalidate_gradebook(instance.course_id)
+
+
+@receiver(post_save, sender=User)
+def gradebook_student_saved(sender, instance, created, **kwargs):
+    # ФИО и email студента хранятся в строках журналов его курсов
+    if created or (_old_value(instance, 'full_name'), _old_value(instance, 'email')) == \
+            (instance.full_name, instance.email):
+        return
+    for course_id in Enrollment.objects.filter(student=instance).order_by().values_list('course_id', flat=True):
+        invalidate_gradebook(course_id)
+
+
+# --- Счётчики записей курса ---
+
+@receiver(post_save, sender=Enrollment)
+def course_counters_enrollment_saved(sender, instance, created, **kwargs):
+    if not created:
+        old_status, old_course_id = _old_value(instance, 'status'), _old_value(instance, 'course')
+        if (old_status, old_course_id) == (instance.status, instance.course_id):
+            return
+        apply_enrollment_delta(old_course_id, old_status, -1)
+    apply_enrollment_delta(instance.course_id, instance.status, 1)
+
+
+@receiver(post_delete, sender=Enrollment)
+def course_counters_enrollment_deleted(sender, instance, **kwargs):
+    apply_enrollment_delta(instance.course_id, instance.status, -1)
+
+
+# --- Прогресс по курсам ---
+
+def _course_ids(module_ids):
+    module_ids = {module_id for module_id in module_ids if module_id is not None}
+    return set(Module.objects.filter(pk__in=module_ids).values_list('course_id', flat=True))
+
+
+def _refresh_pairs(pairs):
+    """Пересчитать прогресс для пар (course_id, student_id)"""
+
+    for course_id, student_id in set(pairs):
+        if course_id is not None and student_id is not None:
+            refresh_course_progress(course_id, [student_id])
+
+
+@receiver(post_save, sender=StudentProgress)
+def progress_student_progress_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    old_module_id, old_student_id = _old_value(instance, 'module'), _old_value(instance, 'student')
+    for course_id in _course_ids({instance.module_id, old_module_id}):
+        _refresh_pairs([(course_id, instance.student_id), (course_id, old_student_id)])
+
+
+@receiver(post_delete, sender=StudentProgress)
+def progress_student_progress_deleted(sender, instance, origin=None, **kwargs):
+    if is_cascade(sender, origin):
+        return
+    _refresh_pairs((course_id, instance.student_id) for course_id in _course_ids({instance.module_id}))
+
+
+@receiver(post_save, sender=Lesson)
+def progress_lesson_saved(sender, instance, created, raw=False, **kwargs):
+    # Новый урок или перенос в другой модуль меняет число уроков курса у всех студентов
+    old_module_id = _old_value(instance, 'module')
+    if raw or not (created or old_module_id != instance.module_id):
+        return
+    for course_id in _course_ids({instance.module_id, old_module_id}):
+        refresh_course_progress(course_id)
+
+
+@receiver(post_delete, sender=Lesson)
+def progress_lesson_deleted(sender, instance, origin=None, **kwargs):
+    if is_cascade(sender, origin):
+        return
+    for course_id in _course_ids({instance.module_id}):
+        refresh_course_progress(course_id)
+
+
+@receiver(post_save, sender=Module)
+def progress_module_saved(sender, instance, created, raw=False, **kwargs):
+    old_course_id = _old_value(instance, 'course')
+    if raw or created or old_course_id == instance.course_id:
+        return
+    for course_id in (old_course_id, instance.course_id):
+        refresh_course_progress(course_id)
+
+
+@receiver(post_delete, sender=Module)
+def progress_module_deleted(sender, instance, origin=None, **kwargs):
+    if is_cascade(sender, origin):
+        return
+    refresh_course_progress(instance.course_id)
+
+
+@receiver(post_save, sender=Enrollment)
+def progress_enrollment_saved(sender, instance, created, raw=False, **kwargs):
+    old_pair = (_old_value(instance, 'course'), _old_value(instance, 'student'))
+    if raw or old_pair == (instance.course_id, instance.student_id):
+        return
+    _refresh_pairs([(instance.course_id, instance.student_id), old_pair])
+
+
+@receiver(post_delete, sender=Enrollment)
+def progress_enrollment_deleted(sender, instance, origin=None, **kwargs):
+    if is_cascade(sender, origin):
+        return
+    _refresh_pairs([(instance.course_id, instance.student_id)])
+
+
+# --- Ключи ответов тестов ---
+# Правка вопросов и вариантов меняет и верность сохранённых ответов: анализ вопросов теста устаревает
+
+def _answer_key_changed(quiz_id):
+    invalidate_answer_key(quiz_id)
+    mark_stale(quiz_id)
+
+
+def _invalidate_quizzes(question_ids):
+    question_ids = {question_id for question_id in question_ids if question_id is not None}
+    for quiz_id in Question.objects.filter(pk__in=question_ids).values_list('quiz_id', flat=True):
+        _answer_key_changed(quiz_id)
+
+
+@receiver(post_save, sender=Quiz)
+@receiver(post_delete, sender=Quiz)
+def answer_key_quiz_changed(sender, instance, **kwargs):
+    invalidate_answer_key(instance.pk)
+
+
+@receiver(post_save, sender=Question)
+def answer_key_question_saved(sender, instance, **kwargs):
+    for quiz_id in {instance.quiz_id, _old_value(instance, 'quiz')} - {None}:
+        _answer_key_changed(quiz_id)
+
+
+@receiver(post_delete, sender=Question)
+def answer_key_question_deleted(sender, instance, origin=None, **kwargs):
+    if not is_cascade(sender, origin):
+        _answer_key_changed(instance.quiz_id)
+
+
+@receiver(post_save, sender=Answer)
+def answer_key_answer_saved(sender, instance, **kwargs):
+    _invalidate_quizzes({instance.question_id, _old_value(instance, 'question')})
+
+
+@receiver(post_delete, sender=Answer)
+def answer_key_answer_deleted(sender, instance, origin=None, **kwargs):
+    if not is_cascade(sender, origin):
+        _invalidate_quizzes({instance.question_id})
+
+
+# --- Кеш структуры курса ---
+
+def _quiz_course_ids(quiz_ids):
+    quiz_ids = {quiz_id for quiz_id in quiz_ids if quiz_id is not None}
+    return set(Quiz.objects.filter(pk__in=quiz_ids).values_list('module__course_id', flat=True))
+
+
+@receiver(post_save, sender=Course)
+def structure_course_saved(sender, instance, created, **kwargs):
+    if not created:
+        invalidate_course_structure({instance.pk})
+
+
+@receiver(post_save, sender=User)
+def structure_teacher_saved(sender, instance, created, **kwargs):
+    # В дереве курса хранится ФИО преподавателя
+    if not created and _old_value(instance, 'full_name') != instance.full_name:
+        invalidate_course_structure(instance.courses_created.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Module)
+def structure_module_saved(sender, instance, **kwargs):
+    invalidate_course_structure({instance.course_id, _old_value(instance, 'course')})
+
+
+@receiver(post_delete, sender=Module)
+def structure_module_deleted(sender, instance, origin=None, **kwargs):
+    if not is_cascade(sender, origin):
+        invalidate_course_structure({instance.course_id})
+
+
+@receiver(post_save, sender=Lesson)
+@receiver(post_save, sender=Quiz)
+def structure_module_item_saved(sender, instance, **kwargs):
+    invalidate_course_structure(_course_ids({instance.module_id, _old_value(instance, 'module')}))
+
+
+@receiver(post_delete, sender=Lesson)
+@receiver(post_delete, sender=Quiz)
+def structure_module_item_deleted(sender, instance, origin=None, **kwargs):
+    if not is_cascade(sender, origin):
+        invalidate_course_structure(_course_ids({instance.module_id}))
+
+
+@receiver(post_save, sender=Question)
+def structure_question_saved(sender, instance, created, **kwargs):
+    # Дерево хранит только число вопросов - правка текста вопроса его не меняет
+    old_quiz_id = _old_value(instance, 'quiz')
+    if created or old_quiz_id != instance.quiz_id:
+        invalidate_course_structure(_quiz_course_ids({instance.quiz_id, old_quiz_id}))
+
+
+@receiver(post_delete, sender=Question)
+def structure_question_deleted(sender, instance, origin=None, **kwargs):
+    if not is_cascade(sender, origin):
+        invalidate_course_structure(_quiz_course_ids({instance.quiz_id}))
+
+
+# --- Кеш фрагментов представлений ---
+
+def fragments_model_changed(sender, raw=False, update_fields=None, **kwargs):
+    # Вход пользователя (update_last_login) не меняет данных фрагментов - иначе каждый вход сбрасывал бы кеш
+    if raw or (sender is User and update_fields == {'last_login'}):
+        return
+    invalidate_model_fragments(sender)
+
+
+for _model in apps.get_app_config('app').get_models():
+    post_save.connect(fragments_model_changed, sender=_model, dispatch_uid=f'fragments_save_{_model.__name__}')
+    post_delete.connect(fragments_model_changed, sender=_model, dispatch_uid=f'fragments_delete_{_model.__name__}')
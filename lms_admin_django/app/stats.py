@@ -0,0 +1,62 @@
+from django.db import transaction
+from django.db.models import Count, Q, Sum, F
+from django.utils import timezone
+from .caching import invalidate_model_fragments
+from .models import User, Course, Enrollment, QuizResult, DashboardStats
+
+
+def get_dashboard_stats():
+    """Снимок статистики панели: одна строка, при отсутствии пересчитывается"""
+
+    stats = DashboardStats.objects.filter(pk=DashboardStats.SINGLETON_ID).first()
+    if stats is None:
+        stats = rebuild_dashboard_stats()
+    return stats
+
+
+@transaction.atomic
+def rebuild_dashboard_stats():
+    """Полный пересчёт снимка статистики по текущим данным"""
+
+    users = User.objects.aggregate(
+        total=Count('pk'),
+        students=Count('pk', filter=Q(role='student')),
+        teachers=Count('pk', filter=Q(role='teacher')),
+    )
+    courses = Course.objects.aggregate(
+        total=Count('pk'),
+        published=Count('pk', filter=Q(status='published')),
+    )
+    results = QuizResult.objects.aggregate(count=Count('pk'), total=Sum('percentage'))
+
+    stats, _ = DashboardStats.objects.select_for_update().update_or_create(
+        pk=DashboardStats.SINGLETON_ID,
+        defaults={
+            'total_users': users['total'],
+            'total_students': users['students'],
+            'total_teachers': users['teachers'],
+            'total_courses': courses['total'],
+            'active_courses': courses['published'],
+            'total_enrollments': Enrollment.objects.filter(status='active').count(),
+            'quiz_results_count': results['count'],
+            'quiz_percentage_sum': results['total'] or 0,
+            'rebuilt_at': timezone.now(),
+        },
+    )
+    return stats
+
+
+def apply_dashboard_delta(**deltas):
+    """Атомарно изменить счётчики снимка на заданные приращения (F-выражения)"""
+
+    deltas = {field: value for field, value in deltas.items() if value}
+    if not deltas:
+        return
+
+    # Если снимка ещё нет, UPDATE ничего не затронет - он будет построен целиком при первом обращении
+    DashboardStats.objects.filter(pk=DashboardStats.SINGLETON_ID).update(
+        **{field: F(field) + value for field, value in deltas.items()}
+    )
+    # UPDATE обходит сигналы - фрагменты, зависящие от снимка, сбрасываем сами. Снимок меняют
+    # и массовые операции (импорт, запись, перепроверка), поэтому от него зависят и отчёты
+    invalidate_model_fragments(DashboardStats)
@@ -1,3 +1,1266 @@
-from django.test import TestCase
+import datetime
+import io
+import json
+import statistics
+from decimal import Decimal
+from unittest import mock, skipUnless
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, connections
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.urls import reverse
+from . import deletion, partitions, urls
+from .audit import AuditWriter, get_client_ip
+from .bench import compare_with_baseline, page_targets
+from .caching import counters, get_fragment
+from .db_pool.base import ConnectionPool, PoolTimeout
+from .counters import find_counter_mismatches
+from .course_status import run_course_status
+from .dataset import generate_large_dataset
+from .deletion import build_plan, delete_cascade, estimate
+from .enrollments import ENROLLED, ALREADY_ENROLLED, NOT_STUDENT, COURSE_FULL, bulk_enroll, enroll_group
+from .exports import student_report_rows
+from .gradebook import build_gradebook, get_gradebook
+from .grading import get_answer_key, regrade_quiz, submit_quiz
+from .imports import import_users, read_csv
+from .item_analysis import refresh_item_stats, stale_quizzes
+from .metrics import QueryBudgetExceeded, registry
+from .pagination import EstimatedCountPaginator, KeysetPaginator
+from .progress import refresh_course_progress
+from .reports import student_report
+from .routers import ReplicaRouter, finish_request, start_request, use_replica
+from .stats import rebuild_dashboard_stats
+from .models import (User, Group, Course, Module, Lesson, Quiz, Question, Answer, Enrollment, QuizResult,
+                     StudentProgress, CourseProgress, AuditLog, DashboardStats, BackgroundJob, QuestionStats)
 
-# Create your tests here.
+
+class CoursesListQueryCountTests(TestCase):
+    """Число запросов списка курсов не зависит от количества курсов"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user('teacher@example.com', 'Преподаватель', password='pass12345',
+                                               role='teacher')
+        cls.student = User.objects.create_user('student@example.com', 'Студент', password='pass12345')
+
+    def setUp(self):
+        self.client.force_login(self.teacher)
+
+    def _create_courses(self, count):
+        for index in range(count):
+            course = Course.objects.create(title=f'Курс {index}', teacher=self.teacher)
+            Enrollment.objects.create(student=self.student, course=course,
+                                      status='active' if index % 2 else 'completed')
+
+    def _count_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('app:courses_list'))
+        self.assertEqual(response.status_code, 200)
+        return len(context)
+
+    def test_query_count_is_constant(self):
+        self._create_courses(2)
+        few = self._count_queries()
+        self._create_courses(30)
+        many = self._count_queries()
+        self.assertEqual(few, many)
+
+    def test_enrollment_counts(self):
+        self._create_courses(2)
+        response = self.client.get(reverse('app:courses_list'))
+        counts = {course.title: (course.active_count, course.completed_count) for course in response.context['courses']}
+        self.assertEqual(counts, {'Курс 0': (0, 1), 'Курс 1': (1, 0)})
+
+
+class DashboardStatsTests(TestCase):
+    """Снимок панели, поддерживаемый сигналами, совпадает с полным пересчётом"""
+
+    def _assert_matches_rebuild(self):
+        stats = DashboardStats.objects.values().get()
+        rebuild_dashboard_stats()
+        fresh = DashboardStats.objects.values().get()
+        stats.pop('rebuilt_at'), fresh.pop('rebuilt_at')
+        self.assertEqual(stats, fresh)
+
+    def test_incremental_updates_match_rebuild(self):
+        rebuild_dashboard_stats()
+        teacher = User.objects.create_user('teacher@example.com', 'Преподаватель', role='teacher')
+        students = [User.objects.create_user(f's{index}@example.com', f'Студент {index}') for index in range(3)]
+        draft = Course.objects.create(title='Черновик', teacher=teacher)
+        course = Course.objects.create(title='Курс', teacher=teacher, status='published')
+        quiz = Quiz.objects.create(module=Module.objects.create(course=course, title='Модуль', order_num=1),
+                                   title='Тест', max_score=10)
+        enrollments = [Enrollment.objects.create(student=student, course=course) for student in students]
+        Enrollment.objects.create(student=students[0], course=draft)
+        results = [
+            QuizResult.objects.create(quiz=quiz, student=student, score=index, max_score=10, percentage=index * 10,
+                                      started_at=timezone.now(), submitted_at=timezone.now())
+            for index, student in enumerate(students, 1)
+        ]
+        self._assert_matches_rebuild()
+
+        # Изменения: роль, статусы курса и записи, пересдача
+        students[2].role = 'teacher'
+        students[2].save()
+        draft.status = 'published'
+        draft.save()
+        course.status = 'archived'
+        course.save()
+        enrollments[0].status = 'completed'
+        enrollments[0].save()
+        results[1].percentage = 95
+        results[1].save()
+        self._assert_matches_rebuild()
+
+        # Удаления: по одному и каскадом (курс -> модуль -> тест -> результаты, записи; студент -> записи)
+        enrollments[1].delete()
+        results[0].delete()
+        students[0].delete()
+        course.delete()
+        draft.delete()
+        self._assert_matches_rebuild()
+        self.assertEqual(DashboardStats.objects.values_list('total_courses', 'quiz_results_count').get(), (0, 0))
+
+
+class KeysetPaginationTests(TestCase):
+    """Переход по страницам списка курсов курсором"""
+
+    def test_pages_cover_all_courses_once(self):
+        teacher = User.objects.create_user('teacher@example.com', 'Преподаватель', password='pass12345',
+                                           role='teacher')
+        Course.objects.bulk_create([Course(title=f'Курс {index}', teacher=teacher) for index in range(120)])
+        self.client.force_login(teacher)
+
+        seen, query = [], ''
+        while True:
+            page = self.client.get(reverse('app:courses_list') + '?' + query).context['page_obj']
+            seen.extend(course.pk for course in page)
+            if not page.has_next:
+                break
+            query = page.next_query
+        self.assertEqual(sorted(seen), sorted(Course.objects.values_list('pk', flat=True)))
+
+        previous = self.client.get(reverse('app:courses_list') + '?' + query).context['page_obj']
+        previous = self.client.get(reverse('app:courses_list') + '?' + previous.previous_query).context['page_obj']
+        self.assertEqual([course.pk for course in previous], seen[-70:-20])
+
+    def test_list_views_are_paginated(self):
+        admin = User.objects.create_user('admin@example.com', 'Администратор', password='pass12345', role='admin')
+        User.objects.bulk_create([User(email=f'user{index}@example.com', full_name='Однофамилец')
+                                  for index in range(60)])
+        self.client.force_login(admin)
+
+        for name in ('app:users_list', 'app:courses_list', 'app:groups_list', 'app:audit_log'):
+            response = self.client.get(reverse(name))
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('page_obj', response.context)
+
+        # Одинаковые ФИО: порядок стабилен благодаря первичному ключу
+        first = self.client.get(reverse('app:users_list')).context['page_obj']
+        second = self.client.get(reverse('app:users_list') + '?' + first.next_query).context['page_obj']
+        self.assertFalse({user.pk for user in first} & {user.pk for user in second})
+        self.assertEqual(len(first) + len(second), 61)
+
+    def test_seek_condition_is_index_range(self):
+        paginator = KeysetPaginator(User.objects.all(), ['full_name'])
+        sql = str(User.objects.filter(paginator._seek_filter(['Иванов', 5], True)).query)
+        self.assertIn('("users"."full_name", "users"."user_id") > (', sql)
+        self.assertNotIn(' OR ', sql)
+
+        # Смешанные направления: OR-раскрытие с избыточной границей по первому полю
+        paginator = KeysetPaginator(Course.objects.all(), ['-created_at', 'title'])
+        sql = str(Course.objects.filter(paginator._seek_filter([timezone.now(), 'Курс', 5], True)).query)
+        self.assertRegex(sql, r'WHERE \("app_course"."created_at" <= \S+ \S+ AND \(')
+
+
+class EnrollmentCountersTests(TestCase):
+    """Счётчики записей курса следуют за изменениями Enrollment"""
+
+    def test_counters_follow_enrollment_changes(self):
+        teacher = User.objects.create_user('teacher@example.com', 'Преподаватель', password='pass12345',
+                                           role='teacher')
+        student = User.objects.create_user('student@example.com', 'Студент', password='pass12345')
+        first = Course.objects.create(title='Первый', teacher=teacher)
+        second = Course.objects.create(title='Второй', teacher=teacher)
+
+        enrollment = Enrollment.objects.create(student=student, course=first)
+        first.refresh_from_db()
+        self.assertEqual((first.active_count, first.get_enrolled_count()), (1, 1))
+
+        enrollment.status = 'completed'
+        enrollment.save()
+        enrollment.course = second
+        enrollment.save(update_fields=['course'])
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.active_count, first.completed_count), (0, 0))
+        self.assertEqual((second.active_count, second.completed_count), (0, 1))
+
+        enrollment.delete()
+        self.assertEqual(find_counter_mismatches(), [])
+
+    def test_mismatch_is_detected(self):
+        teacher = User.objects.create_user('teacher@example.com', 'Преподаватель', password='pass12345',
+                                           role='teacher')
+        course = Course.objects.create(title='Курс', teacher=teacher)
+        Course.objects.filter(pk=course.pk).update(dropped_count=5)
+        self.assertEqual(len(find_counter_mismatches()), 1)
+
+    def test_stale_course_save_keeps_counters(self):
+        teacher = User.objects.create_user('teacher@example.com', 'Преподаватель', role='teacher')
+        student = User.objects.create_user('student@example.com', 'Студент')
+        course = Course.objects.create(title='Курс', teacher=teacher)
+        Enrollment.objects.create(student=student, course=course)
+        course.title = 'Новое название'
+        course.save()
+        course.refresh_from_db()
+        self.assertEqual((course.title, course.active_count), ('Новое название', 1))
+        self.assertEqual(find_counter_mismatches(), [])
+
+    def test_enrollment_and_counters_commit_together(self):
+        teacher = User.objects.create_user('teacher@example.com', 'Преподаватель', role='teacher')
+        student = User.objects.create_user('student@example.com', 'Студент')
+        course = Course.objects.create(title='Курс', teacher=teacher)
+        with mock.patch('app.signals.apply_enrollment_delta', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                Enrollment.objects.create(student=student, course=course)
+        self.assertFalse(Enrollment.objects.exists())
+
+
+class SearchTests(TestCase):
+    """Поиск пользователей и курсов в списках"""
+
+    def test_search_filters_users_and_courses(self):
+        admin = User.objects.create_user('admin@example.com', 'Администратор', password='pass12345', role='admin')
+        teacher = User.objects.create_user('ivanov@example.com', 'Иванов Пётр', password='pass12345',
+                                           role='teacher')
+        User.objects.create_user('petrov@example.com', 'Петров Иван', password='pass12345')
+        Course.objects.create(title='Основы Python', teacher=teacher)
+        Course.objects.create(title='Базы данных', teacher=admin)
+        self.client.force_login(admin)
+
+        users = self.client.get(reverse('app:users_list'), {'search': 'petrov'}).context['users']
+        self.assertEqual([user.email for user in users], ['petrov@example.com'])
+
+        courses = self.client.get(reverse('app:courses_list'), {'search': 'Python'}).context['courses']
+        self.assertEqual([course.title for course in courses], ['Основы Python'])
+
+
+class AuditCaptureTests(TestCase):
+    """Изменения моделей попадают в журнал аудита с пользователем и IP запроса"""
+
+    def test_update_is_recorded_with_diff(self):
+        admin = User.objects.create_user('admin@example.com', 'Администратор', password='pass12345', role='admin')
+        student = User.objects.create_user('student@example.com', 'Студент', password='pass12345')
+        self.client.force_login(admin)
+
+        writer = AuditWriter(batch_size=10, flush_interval=0.1, queue_size=10, enqueue_timeout=0.1,
+                             asynchronous=False)
+        with mock.patch('app.audit.get_writer', return_value=writer), \
+                self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('app:users_edit', args=[student.pk]), {
+                'email': 'student@example.com', 'full_name': 'Студент Иванов', 'role': 'student', 'is_active': 'on',
+            }, REMOTE_ADDR='10.0.0.7')
+
+        entry = AuditLog.objects.get(action='UPDATE', table_name='users', record_id=student.pk)
+        self.assertEqual((entry.user_id, entry.ip_address), (admin.pk, '10.0.0.7'))
+        self.assertEqual(json.loads(entry.old_value), {'full_name': 'Студент'})
+        self.assertEqual(json.loads(entry.new_value), {'full_name': 'Студент Иванов'})
+
+    def test_forwarded_ip_only_from_trusted_proxy(self):
+        factory = RequestFactory()
+        forged = factory.get('/', REMOTE_ADDR='198.51.100.7', HTTP_X_FORWARDED_FOR='1.2.3.4')
+        proxied = factory.get('/', REMOTE_ADDR='10.0.0.2', HTTP_X_FORWARDED_FOR='1.2.3.4, 203.0.113.5, 10.0.0.3')
+        garbage = factory.get('/', REMOTE_ADDR='10.0.0.2', HTTP_X_FORWARDED_FOR='не адрес')
+        self.assertEqual(get_client_ip(proxied), '10.0.0.2')
+        with override_settings(AUDIT_LOG={'TRUSTED_PROXIES': ['10.0.0.0/8']}):
+            self.assertEqual(get_client_ip(forged), '198.51.100.7')
+            self.assertEqual(get_client_ip(proxied), '203.0.113.5')
+            self.assertEqual(get_client_ip(garbage), '10.0.0.2')
+
+    def test_password_is_masked(self):
+        writer = AuditWriter(batch_size=10, flush_interval=0.1, queue_size=10, enqueue_timeout=0.1,
+                             asynchronous=False)
+        with mock.patch('app.audit.get_writer', return_value=writer), \
+                self.captureOnCommitCallbacks(execute=True):
+            user = User.objects.create_user('new@example.com', 'Новый', password='secret-password')
+
+        entry = AuditLog.objects.get(action='CREATE', record_id=user.pk)
+        self.assertEqual(json.loads(entry.new_value)['password'], '***')
+        self.assertIsNone(entry.user_id)
+
+
+class AuditWriterTests(TransactionTestCase):
+    """Фоновый поток записывает очередь пачками и сбрасывает её при остановке"""
+
+    def test_entries_are_flushed_in_batches(self):
+        writer = AuditWriter(batch_size=100, flush_interval=0.05, queue_size=50, enqueue_timeout=5)
+        for index in range(250):
+            writer.enqueue({'action': 'CREATE', 'table_name': 'test', 'record_id': index})
+        writer.stop()
+        self.assertEqual(AuditLog.objects.filter(table_name='test').count(), 250)
+
+
+class AuditPartitionTests(TestCase):
+    """Помесячные секции журнала: границы месяцев и срока хранения, команда обслуживания"""
+
+    def test_add_months(self):
+        self.assertEqual(partitions.add_months(datetime.date(2024, 11, 1), 2), datetime.date(2025, 1, 1))
+        self.assertEqual(partitions.add_months(datetime.date(2024, 1, 31), -1), datetime.date(2023, 12, 1))
+        self.assertEqual(partitions.add_months(datetime.date(2024, 12, 1), -24), datetime.date(2022, 12, 1))
+        self.assertEqual(partitions.partition_name(datetime.date(2024, 3, 1)), 'app_auditlog_p202403')
+
+    def test_expire_partitions_keeps_month_crossing_cutoff(self):
+        months = [datetime.date(2024, month, 1) for month in (1, 2, 3)]
+        existing = [(month, partitions.partition_name(month)) for month in months]
+        # Срок 3 месяца от 15.05.2024 - граница 01.02.2024: январь старше целиком, февраль ещё нет
+        with mock.patch('app.partitions.list_partitions', return_value=existing), \
+                mock.patch('app.partitions.connection') as connection_mock:
+            expired = partitions.expire_partitions(3, drop=True, today=datetime.date(2024, 5, 15))
+        self.assertEqual(expired, ['app_auditlog_p202401'])
+        cursor = connection_mock.cursor.return_value.__enter__.return_value
+        self.assertEqual([call.args[0] for call in cursor.execute.call_args_list],
+                         ['ALTER TABLE app_auditlog DETACH PARTITION app_auditlog_p202401',
+                          'DROP TABLE app_auditlog_p202401'])
+
+    @skipUnless(connection.vendor != 'postgresql', 'проверяется отказ без секционирования')
+    def test_command_refuses_without_partitioning(self):
+        with mock.patch('app.partitions.create_partition') as create_partition, \
+                self.assertRaisesMessage(CommandError, 'не секционирована'):
+            call_command('manage_audit_partitions', stdout=io.StringIO())
+        self.assertFalse(create_partition.called)
+
+    @skipUnless(connection.vendor == 'postgresql', 'секционирование журнала есть только в PostgreSQL')
+    def test_partitions_are_created_and_expired(self):
+        self.assertTrue(partitions.is_partitioned())
+        month = datetime.date(2099, 1, 1)
+        AuditLog.objects.create(action='CREATE', table_name='test', record_id=1,
+                                created_at=timezone.make_aware(datetime.datetime(2099, 1, 10)))
+
+        created = partitions.ensure_partitions(1, today=datetime.date(2099, 1, 10))
+        self.assertEqual(created, ['app_auditlog_p209901', 'app_auditlog_p209902'])
+        self.assertIn((month, 'app_auditlog_p209901'), partitions.list_partitions())
+        with connection.cursor() as cursor:
+            # Строка из секции по умолчанию перенесена в созданную
+            cursor.execute('SELECT count(*) FROM app_auditlog_p209901')
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+        # Более ранние секции тестовой базы тоже истекают - проверяются только созданные
+        self.assertNotIn('app_auditlog_p209901', partitions.expire_partitions(1, today=datetime.date(2099, 2, 28)))
+        expired = partitions.expire_partitions(1, drop=True, today=datetime.date(2099, 3, 1))
+        self.assertIn('app_auditlog_p209901', expired)
+        self.assertNotIn('app_auditlog_p209902', expired)
+        self.assertNotIn((month, 'app_auditlog_p209901'), partitions.list_partitions())
+
+
+class ExportTests(TestCase):
+    """Выгрузки отчётов и журнала аудита"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin@example.com', 'Администратор', password='pass12345',
+                                             role='admin')
+        AuditLog.objects.bulk_create([
+            AuditLog(user=cls.admin, action='CREATE' if index % 2 else 'DELETE', table_name='app_course',
+                     record_id=index)
+            for index in range(10)
+        ])
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def test_audit_csv_uses_filters_and_streams(self):
+        response = self.client.get(reverse('app:audit_log_export'), {'action': 'CREATE', 'format': 'csv'})
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode('utf-8-sig').splitlines()
+        self.assertEqual(len(lines), 1 + 5)
+        self.assertTrue(all(';CREATE;' in line for line in lines[1:]))
+
+    def test_report_xlsx(self):
+        response = self.client.get(reverse('app:reports_export', args=['students']), {'format': 'xlsx'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'PK'))
+
+    def test_student_report_export_reads_server_side_cursor(self):
+        teacher = User.objects.create_user('teacher@example.com', 'Преподаватель', role='teacher')
+        student = User.objects.create_user('student@example.com', 'Студент')
+        Enrollment.objects.create(student=student, course=Course.objects.create(title='Курс', teacher=teacher))
+        database = connections['default']
+        with mock.patch.object(database, 'chunked_cursor', wraps=database.chunked_cursor) as chunked_cursor:
+            rows = list(student_report_rows())
+        self.assertTrue(chunked_cursor.called)
+        self.assertEqual(rows, [('Студент', 'student@example.com', 1, 0, None, 0)])
+
+    def test_report_export_is_not_available_to_students(self):
+        self.client.force_login(User.objects.create_user('student@example.com', 'Студент'))
+        response = self.client.get(reverse('app:reports_export', args=['students']))
+        self.assertEqual(response.status_code, 302)
+        self.assertNotContains(self.client.get(reverse('app:reports')), 'Выгрузить')
+
+    def test_unknown_report_or_format(self):
+        self.assertEqual(self.client.get(reverse('app:reports_export', args=['nope'])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('app:audit_log_export'), {'format': 'pdf'}).status_code, 404)
+
+
+class StudentReportTests(TestCase):
+    """Метрики отчёта по студентам не размножаются соединением записей и результатов"""
+
+    def test_counts_and_averages_are_not_inflated(self):
+        teacher = User.objects.create_user('teacher@example.com', 'Преподаватель', role='teacher')
+        student = User.objects.create_user('student@example.com', 'Студент')
+        idle = User.objects.create_user('idle@example.com', 'Без курсов')
+        now = timezone.now()
+        for index, status in enumerate(('active', 'active', 'completed')):
+            course = Course.objects.create(title=f'Курс {index}', teacher=teacher)
+            Enrollment.objects.create(student=student, course=course, status=status)
+            CourseProgress.objects.update_or_create(student=student, course=course,
+                                                    defaults={'percent': Decimal(30 * index)})
+            quiz = Quiz.objects.create(module=Module.objects.create(course=course, title='Модуль', order_num=1),
+                                       title='Тест', max_score=100)
+            QuizResult.objects.create(quiz=quiz, student=student, score=0, max_score=100,
+                                      percentage=Decimal(20 * (index + 1)), started_at=now, submitted_at=now)
+
+        with self.assertNumQueries(1):
+            rows = {user.pk: user for user in student_report(limit=20)}
+        self.assertEqual(list(rows), [student.pk, idle.pk])
+        report = rows[student.pk]
+        self.assertEqual((report.courses_count, report.completed_courses), (2, 1))
+        self.assertAlmostEqual(float(report.avg_score), 40.0)
+        self.assertAlmostEqual(float(report.avg_progress), 30.0)
+        self.assertEqual((rows[idle.pk].courses_count, rows[idle.pk].avg_score), (0, None))
+
+
+class UserImportTests(TestCase):
+    """Массовый импорт пользователей"""
+
+    def test_import_validates_rows_and_skips_existing_emails(self):
+        User.objects.create_user('taken@example.com', 'Уже есть', password='pass12345')
+        data = (
+            'email;full_name;role;password\n'
+            'new1@example.com;Новый Один;student;secret123\n'
+            'new2@example.com;Новый Два;teacher;\n'
+            'new1@example.com;Повтор;student;secret123\n'
+            'taken@example.com;Уже есть;student;secret123\n'
+            'bad-email;Плохой;student;secret123\n'
+            'new3@example.com;Роль;janitor;secret123\n'
+        ).encode('utf-8')
+
+        report = import_users(read_csv(io.BytesIO(data)), chunk_size=2, workers=1)
+
+        self.assertEqual(report.created, 2)
+        self.assertEqual([line for line, _, _ in report.rejected], [4, 6, 7, 5])
+        self.assertTrue(User.objects.get(email='new1@example.com').check_password('secret123'))
+        self.assertFalse(User.objects.get(email='new2@example.com').has_usable_password())
+
+    def test_conflict_fallback_counts_users_once(self):
+        rebuild_dashboard_stats()
+        bulk_create = User.objects.bulk_create
+
+        def conflicting(users, *args, **kwargs):
+            # Пачка целиком конфликтует с параллельной вставкой, по одному - проходит
+            if len(users) > 1:
+                raise IntegrityError
+            return bulk_create(users, *args, **kwargs)
+
+        data = 'email;full_name\none@example.com;Один\ntwo@example.com;Два\n'.encode('utf-8')
+        with mock.patch.object(User.objects, 'bulk_create', side_effect=conflicting):
+            report = import_users(read_csv(io.BytesIO(data)), workers=1)
+        self.assertEqual(report.created, 2)
+        self.assertEqual(DashboardStats.objects.get().total_users, User.objects.count())
+
+
+class BulkEnrollmentTests(TestCase):
+    """Массовая запись на курс"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user('teacher@example.com', 'Преподаватель', role='teacher')
+        cls.students = [
+            User.objects.create_user(f'student{index}@example.com', f'Студент {index}', role='student')
+            for index in range(5)
+        ]
+        cls.course = Course.objects.create(title='Курс', teacher=cls.teacher, max_students=3)
+
+    def test_outcomes_and_capacity(self):
+        Enrollment.objects.create(student=self.students[0], course=self.course)
+        ids = [student.pk for student in self.students] + [self.teacher.pk]
+
+        result = bulk_enroll(self.course, ids)
+
+        self.assertEqual(result.outcomes, {
+            self.students[0].pk: ALREADY_ENROLLED,
+            self.students[1].pk: ENROLLED,
+            self.students[2].pk: ENROLLED,
+            self.students[3].pk: COURSE_FULL,
+            self.students[4].pk: COURSE_FULL,
+            self.teacher.pk: NOT_STUDENT,
+        })
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.active_count, 3)
+        self.assertEqual(find_counter_mismatches(), [])
+
+    def test_enroll_group(self):
+        group = Group.objects.create(group_name='ИВТ-1')
+        other = Course.objects.create(title='Другой курс', teacher=self.teacher)
+        for student in self.students[:2]:
+            Enrollment.objects.create(student=student, course=other, group=group)
+
+        result = enroll_group(self.course, group)
+
+        self.assertEqual(result.enrolled, 2)
+        self.assertEqual(Enrollment.objects.filter(course=self.course, group=group).count(), 2)
+
+
+class RequestMetricsTests(TestCase):
+    """Метрики запросов и бюджеты SQL-запросов"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin@example.com', 'Администратор', role='admin')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+        registry.reset()
+
+    def test_request_is_measured_per_url_name(self):
+        self.client.get(reverse('app:courses_list'))
+        histograms = registry.snapshot()['app:courses_list']
+        self.assertEqual(histograms['latency_ms'].count, 1)
+        self.assertGreater(histograms['sql_queries'].sum, 0)
+        self.assertGreater(histograms['template_ms'].sum, 0)
+
+        response = self.client.get(reverse('app:metrics'), {'format': 'prometheus'})
+        self.assertContains(response, 'lms_request_sql_queries_count{view="app:courses_list"} 1')
+
+    def test_anonymous_scrape_by_address_or_token(self):
+        self.client.logout()
+        url = reverse('app:metrics')
+        self.assertEqual(self.client.get(url).status_code, 200)
+        # Внешний запрос через обратный прокси на том же хосте
+        self.assertEqual(self.client.get(url, HTTP_X_FORWARDED_FOR='203.0.113.5').status_code, 404)
+        with override_settings(AUDIT_LOG={'TRUSTED_PROXIES': ['127.0.0.1']}):
+            self.assertEqual(self.client.get(url, HTTP_X_FORWARDED_FOR='203.0.113.5').status_code, 404)
+        with override_settings(REQUEST_METRICS={'TOKEN': 'secret'}):
+            self.assertEqual(self.client.get(url).status_code, 404)
+            self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+
+    def test_budget_exceeded_fails_in_tests(self):
+        with override_settings(REQUEST_METRICS={'BUDGETS': {'app:courses_list': 1}, 'RAISE_ON_BUDGET': True}):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get(reverse('app:courses_list'))
+
+
+class AdminChangelistQueryCountTests(TestCase):
+    """Число запросов страниц списков в админке не зависит от количества строк"""
+
+    MODELS = (Group, Course, Module, Lesson, Quiz, Question, Answer, Enrollment, QuizResult, StudentProgress,
+              CourseProgress, AuditLog)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('root@example.com', 'Администратор', password='pass12345')
+        cls.teacher = User.objects.create_user('teacher@example.com', 'Преподаватель', role='teacher')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def _create_rows(self, start, count):
+        now = timezone.now()
+        for index in range(start, start + count):
+            student = User.objects.create_user(f'student{index}@example.com', f'Студент {index}')
+            group = Group.objects.create(group_name=f'Группа {index}', curator=self.teacher)
+            course = Course.objects.create(title=f'Курс {index}', teacher=self.teacher)
+            module = Module.objects.create(course=course, title=f'Модуль {index}', order_num=1)
+            lesson = Lesson.objects.create(module=module, title=f'Урок {index}', content_type='text', order_num=1)
+            quiz = Quiz.objects.create(module=module, title=f'Тест {index}', max_score=10)
+            question = Question.objects.create(quiz=quiz, question_text='Вопрос', question_type='single',
+                                               order_num=1)
+            Answer.objects.create(question=question, answer_text='Ответ', order_num=1)
+            Enrollment.objects.create(student=student, course=course, group=group)
+            QuizResult.objects.create(quiz=quiz, student=student, score=5, max_score=10,
+                                      percentage=Decimal('50'), started_at=now, submitted_at=now)
+            StudentProgress.objects.create(student=student, module=module, lesson=lesson)
+            AuditLog.objects.create(user=student, action='CREATE', table_name='app_course')
+
+    def _query_counts(self):
+        counts = {}
+        for model in self.MODELS:
+            url = reverse(f'admin:app_{model._meta.model_name}_changelist')
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            counts[model.__name__] = len(context)
+        return counts
+
+    def test_query_count_is_constant(self):
+        self._create_rows(0, 1)
+        few = self._query_counts()
+        self._create_rows(1, 5)
+        self.assertEqual(self._query_counts(), few)
+
+    def test_autocomplete_filter(self):
+        self._create_rows(0, 2)
+        course = Course.objects.get(title='Курс 1')
+        response = self.client.get(reverse('admin:app_quizresult_changelist'), {'quiz__module__course': course.pk})
+        self.assertEqual(response.status_code, 200, response.get('Location'))
+        self.assertEqual(response.context['cl'].result_count, 1)
+        self.assertContains(response, 'admin-autocomplete')
+        self.assertContains(response, f'<option value="{course.pk}" selected>Курс 1</option>', html=True)
+
+
+class EstimatedCountPaginatorTests(TestCase):
+    """Оценка количества строк в списках админки"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('root@example.com', 'Администратор', password='pass12345')
+        AuditLog.objects.bulk_create([AuditLog(action='CREATE', table_name='test') for _ in range(5)])
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def test_small_set_is_counted_exactly(self):
+        with mock.patch('app.pagination.estimate_count') as estimate:
+            paginator = EstimatedCountPaginator(AuditLog.objects.all(), 2)
+            self.assertEqual(paginator.count, 5)
+        estimate.assert_not_called()
+        self.assertFalse(paginator.is_estimated)
+
+    def test_large_set_uses_estimate(self):
+        with mock.patch.object(EstimatedCountPaginator, 'EXACT_COUNT_LIMIT', 3), \
+                mock.patch('app.pagination.estimate_count', return_value=1000000):
+            response = self.client.get(reverse('admin:app_auditlog_changelist'))
+        self.assertEqual(response.context['cl'].result_count, 1000000)
+        self.assertTrue(response.context['cl'].paginator.is_estimated)
+        self.assertContains(response, '&asymp;')
+
+    def test_estimate_unavailable_falls_back_to_exact_count(self):
+        with mock.patch.object(EstimatedCountPaginator, 'EXACT_COUNT_LIMIT', 3):
+            paginator = EstimatedCountPaginator(AuditLog.objects.filter(action='CREATE'), 2)
+            self.assertEqual(paginator.count, 5)
+
+
+class CourseProgressTests(TestCase):
+    """Таблица прогресса по курсам обновляется вместе со StudentProgress"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user('teacher@example.com', 'Преподаватель', role='teacher')
+        cls.student = User.objects.create_user('student@example.com', 'Студент')
+        cls.course = Course.objects.create(title='Курс', teacher=cls.teacher)
+        cls.module = Module.objects.create(course=cls.course, title='Модуль', order_num=1)
+        cls.lessons = [
+            Lesson.objects.create(module=cls.module, title=f'Урок {index}', content_type='text', order_num=index)
+            for index in range(4)
+        ]
+
+    def _progress(self):
+        return CourseProgress.objects.get(student=self.student, course=self.course)
+
+    def test_incremental_updates(self):
+        Enrollment.objects.create(student=self.student, course=self.course)
+        self.assertEqual((self._progress().completed_lessons, self._progress().total_lessons), (0, 4))
+
+        item = StudentProgress.objects.create(student=self.student, module=self.module, lesson=self.lessons[0],
+                                              status='completed')
+        StudentProgress.objects.create(student=self.student, module=self.module, lesson=self.lessons[1],
+                                       status='in_progress')
+        self.assertEqual(self._progress().percent, Decimal('25.00'))
+
+        Lesson.objects.create(module=self.module, title='Новый урок', content_type='text', order_num=9)
+        self.assertEqual(self._progress().percent, Decimal('20.00'))
+
+        item.delete()
+        self.assertEqual(self._progress().completed_lessons, 0)
+
+        Enrollment.objects.get(student=self.student, course=self.course).delete()
+        self.assertFalse(CourseProgress.objects.exists())
+
+    def test_full_refresh_matches_and_course_delete_cascades(self):
+        Enrollment.objects.create(student=self.student, course=self.course)
+        for lesson in self.lessons[:3]:
+            StudentProgress.objects.create(student=self.student, module=self.module, lesson=lesson,
+                                           status='completed')
+        CourseProgress.objects.all().delete()
+
+        self.assertEqual(refresh_course_progress(self.course.pk), 1)
+        self.assertEqual(self._progress().percent, Decimal('75.00'))
+
+        self.course.delete()
+        self.assertFalse(CourseProgress.objects.exists())
+
+
+class GradingTests(TestCase):
+    """Проверка ответов по ключу теста и перепроверка после смены правильного ответа"""
+
+    @classmethod
+    def setUpTestData(cls):
+        teacher = User.objects.create_user('teacher@example.com', 'Преподаватель', role='teacher')
+        cls.student = User.objects.create_user('student@example.com', 'Студент')
+        course = Course.objects.create(title='Курс', teacher=teacher)
+        module = Module.objects.create(course=course, title='Модуль', order_num=1)
+        cls.quiz = Quiz.objects.create(module=module, title='Тест', max_score=10, passing_score=6)
+        cls.single = Question.objects.create(quiz=cls.quiz, question_text='1', question_type='single',
+                                             points=3, order_num=1)
+        cls.multiple = Question.objects.create(quiz=cls.quiz, question_text='2', question_type='multiple',
+                                               points=5, order_num=2)
+        cls.text = Question.objects.create(quiz=cls.quiz, question_text='3', question_type='text',
+                                           points=2, order_num=3)
+        cls.a1, cls.a2 = [Answer.objects.create(question=cls.single, answer_text=str(n), is_correct=n == 1,
+                                                order_num=n) for n in (1, 2)]
+        cls.m1, cls.m2, cls.m3 = [Answer.objects.create(question=cls.multiple, answer_text=str(n),
+                                                        is_correct=n < 3, order_num=n) for n in (1, 2, 3)]
+        Answer.objects.create(question=cls.text, answer_text='Ёлка  зелёная', is_correct=True, order_num=1)
+
+    def setUp(self):
+        cache.clear()
+
+    def _submit(self, answers):
+        return submit_quiz(self.quiz, self.student, answers, started_at=timezone.now())
+
+    def test_grading_by_question_type(self):
+        result = self._submit({self.single.pk: self.a1.pk, self.multiple.pk: [self.m1.pk, self.m2.pk],
+                               self.text.pk: '  ЕЛКА зеленая '})
+        self.assertEqual((result.score, result.max_score, result.percentage, result.is_passed),
+                         (10, 10, Decimal('100.00'), True))
+
+        result = self._submit({self.single.pk: self.a1.pk, self.multiple.pk: [self.m1.pk],
+                               self.text.pk: 'сосна'})
+        self.assertEqual((result.score, result.is_passed), (3, False))
+        self.assertEqual(QuizResult.objects.count(), 1)
+        self.assertEqual(result.responses.count(), 3)
+
+    def test_regrade_after_correct_answer_changes(self):
+        result = self._submit({self.single.pk: self.a2.pk, self.multiple.pk: [self.m1.pk, self.m2.pk]})
+        self.assertEqual(result.score, 5)
+        with self.assertNumQueries(0):
+            get_answer_key(self.quiz.pk)  # ключ построен при сдаче и взят из кеша
+        # Ключ (3 запроса), пачка результатов с ответами (2), пустая следующая пачка (1)
+        with self.assertNumQueries(6):
+            self.assertEqual(regrade_quiz(self.quiz.pk), (1, 0))
+
+        self.a1.is_correct, self.a2.is_correct = False, True
+        self.a1.save()
+        self.a2.save()
+        self.assertEqual(regrade_quiz(self.quiz.pk), (1, 1))
+        result.refresh_from_db()
+        self.assertEqual((result.score, result.percentage, result.is_passed), (8, Decimal('80.00'), True))
+
+
+class CourseTreeCacheTests(TestCase):
+    """Страница курса берёт структуру из кеша, правки модулей, уроков и вопросов её сбрасывают"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user('teacher@example.com', 'Преподаватель', role='teacher')
+        cls.course = Course.objects.create(title='Курс', teacher=cls.teacher)
+        cls.module = Module.objects.create(course=cls.course, title='Модуль', order_num=1)
+        Lesson.objects.create(module=cls.module, title='Урок', content_type='text', order_num=1)
+        cls.quiz = Quiz.objects.create(module=cls.module, title='Тест', max_score=10)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.teacher)
+
+    def _get(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('app:courses_detail', args=[self.course.pk]))
+        self.assertEqual(response.status_code, 200)
+        return response, context
+
+    def test_hit_does_not_query_course_tables(self):
+        response, _ = self._get()
+        self.assertEqual(response.context['modules'][0]['quizzes'][0]['question_count'], 0)
+
+        _, context = self._get()
+        course_tables = ('app_course', 'app_module', 'app_lesson', 'app_quiz', 'app_quizresult')
+        self.assertFalse([query['sql'] for query in context.captured_queries
+                          if any(f'"{table}"' in query['sql'] for table in course_tables)])
+
+    @mock.patch('app.signals.record')  # выполняются все колбэки on_commit - аудит не пишем
+    def test_structure_changes_invalidate_tree(self, record):
+        self._get()
+        with self.captureOnCommitCallbacks(execute=True):
+            Question.objects.create(quiz=self.quiz, question_text='?', question_type='text', order_num=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            Lesson.objects.create(module=self.module, title='Урок 2', content_type='text', order_num=2)
+        module = self._get()[0].context['modules'][0]
+        self.assertEqual((len(module['lessons']), module['quizzes'][0]['question_count']), (2, 1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.module.delete()
+        self.assertEqual(self._get()[0].context['modules'], [])
+
+    @mock.patch('app.signals.record')
+    def test_evicted_version_does_not_revive_old_tree(self, record):
+        self._get()
+        with self.captureOnCommitCallbacks(execute=True):
+            Lesson.objects.create(module=self.module, title='Урок 2', content_type='text', order_num=2)
+        self._get()
+        # Ключ версии вытеснен раньше деревьев: дерево первой версии не должно снова стать текущим
+        cache.delete(f'course:{self.course.pk}:version')
+        self.assertEqual(len(self._get()[0].context['modules'][0]['lessons']), 2)
+
+    def test_missing_course(self):
+        response = self.client.get(reverse('app:courses_detail', args=[self.course.pk + 100]))
+        self.assertEqual(response.status_code, 404)
+
+
+class FragmentCacheTests(TestCase):
+    """Данные панели и списка групп кешируются по роли и параметрам, изменения моделей их сбрасывают"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin@example.com', 'Администратор', role='admin')
+        cls.teacher = User.objects.create_user('teacher@example.com', 'Преподаватель', role='teacher')
+
+    def setUp(self):
+        cache.clear()
+        counters.reset()
+
+    def _counts(self, name):
+        return counters.snapshot().get(name, (0, 0))
+
+    @mock.patch('app.signals.record')
+    def test_dashboard_is_cached_per_role_and_invalidated(self, record):
+        for user in (self.admin, self.admin, self.teacher):
+            self.client.force_login(user)
+            self.client.get(reverse('app:dashboard'))
+        self.assertEqual(self._counts('dashboard'), (1, 2))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Course.objects.create(title='Новый курс', teacher=self.teacher)
+        response = self.client.get(reverse('app:dashboard'))
+        self.assertEqual(self._counts('dashboard'), (1, 3))
+        self.assertEqual(response.context['total_courses'], 1)
+
+    def test_groups_vary_on_cursor(self):
+        Group.objects.bulk_create([Group(group_name=f'Группа {index:02d}') for index in range(40)])
+        self.client.force_login(self.admin)
+        first = self.client.get(reverse('app:groups_list'))
+        second = self.client.get(reverse('app:groups_list'), {'cursor': first.context['page_obj'].next_cursor})
+        self.client.get(reverse('app:groups_list'))
+        self.assertEqual(self._counts('groups_list'), (1, 2))
+        self.assertEqual(len(second.context['groups'].object_list), 10)
+        self.assertIn('lms_cache_hits_total{fragment="groups_list"} 1', self.client.get(
+            reverse('app:metrics'), {'format': 'prometheus'}).content.decode())
+
+    @mock.patch('app.enrollments.record')
+    def test_login_keeps_and_bulk_enrollment_resets_groups(self, record):
+        group = Group.objects.create(group_name='Группа', curator=self.teacher)
+        student = User.objects.create_user('student@example.com', 'Студент')
+        course = Course.objects.create(title='Курс', teacher=self.teacher)
+        self.client.force_login(self.admin)
+        self.client.get(reverse('app:groups_list'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.force_login(self.admin)
+        self.client.get(reverse('app:groups_list'))
+        self.assertEqual(self._counts('groups_list'), (1, 1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            bulk_enroll(course, [student.pk], group=group)
+        self.client.get(reverse('app:groups_list'))
+        self.assertEqual(self._counts('groups_list'), (1, 2))
+
+
+@skipUnless(connection.vendor == 'postgresql', 'пул соединений работает только с PostgreSQL')
+class ConnectionPoolTests(TestCase):
+    """Пул переиспользует соединения и ждёт освобождения не дольше timeout"""
+
+    def test_connections_are_reused_and_bounded(self):
+        pool = ConnectionPool(connection.get_connection_params(), 0, 2, timeout=0.1)
+        self.addCleanup(pool.closeall)
+        first, second = pool.getconn(), pool.getconn()
+        with self.assertRaises(PoolTimeout):
+            pool.getconn()
+        pool.putconn(first)
+        pool.putconn(second)
+        # Свободными остаются оба соединения, а не только MIN_SIZE
+        self.assertFalse(first.closed or second.closed)
+        reused = [pool.getconn(), pool.getconn()]
+        self.assertEqual({id(conn) for conn in reused}, {id(first), id(second)})
+        for conn in reused:
+            pool.putconn(conn)
+
+
+@mock.patch.dict(connections.settings, {'replica': connections.settings['default']})
+class ReplicaRouterTests(SimpleTestCase):
+    """Чтения аналитики идут на реплику, кроме случаев отставания и чтения после записи"""
+
+    router = ReplicaRouter()
+
+    @mock.patch('app.routers.replica_lag', return_value=1)
+    def test_reads_in_replica_block(self, replica_lag):
+        self.assertEqual(self.router.db_for_read(Course), 'default')
+        with use_replica():
+            self.assertEqual(self.router.db_for_read(Course), 'replica')
+        self.assertEqual(self.router.db_for_write(Course), 'default')
+
+    @mock.patch('app.routers.replica_lag', side_effect=[60, None])
+    def test_lagging_or_unavailable_replica_falls_back(self, replica_lag):
+        with use_replica():
+            self.assertEqual(self.router.db_for_read(Course), 'default')
+            self.assertEqual(self.router.db_for_read(Course), 'default')
+
+    @mock.patch('app.routers.replica_lag', return_value=0)
+    def test_read_your_writes_in_request(self, replica_lag):
+        state, token = start_request()
+        try:
+            with use_replica():
+                self.assertEqual(self.router.db_for_read(Course), 'replica')
+                self.router.db_for_write(Course)
+                self.assertEqual(self.router.db_for_read(Course), 'default')
+        finally:
+            finish_request(token)
+        self.assertTrue(state.wrote)
+
+    @mock.patch('app.routers.replica_lag', return_value=0)
+    def test_cached_fragments_are_built_on_primary(self, replica_lag):
+        request = RequestFactory().get('/')
+        request.user = mock.Mock(role='admin')
+        aliases = []
+        with use_replica():
+            with mock.patch('app.caching.cache') as fragment_cache:
+                fragment_cache.get.return_value = None
+                get_fragment('replica_test', lambda: aliases.append(self.router.db_for_read(Course)), request, ())
+            aliases.append(self.router.db_for_read(Course))
+        self.assertEqual(aliases, ['default', 'replica'])
+
+
+class ReplicaStickinessTests(TestCase):
+    """После изменяющего запроса cookie на STICKY_SECONDS закрепляет чтение за основной БД"""
+
+    def test_cookie_after_unsafe_request(self):
+        self.client.force_login(User.objects.create_user('admin@example.com', 'Администратор', role='admin'))
+        self.assertNotIn('lms_primary_until', self.client.get(reverse('app:groups_list')).cookies)
+        cookie = self.client.post(reverse('app:groups_list')).cookies['lms_primary_until']
+        self.assertEqual(cookie['max-age'], 5)
+
+
+@skipUnless('replica' in settings.DATABASES, 'реплика не настроена (DB_REPLICA_HOST)')
+class ReplicaRoutingTests(TransactionTestCase):
+    """С настроенной репликой отчёты читаются с неё, а сразу после POST - с основной БД"""
+
+    databases = {'default', 'replica'} & set(settings.DATABASES)
+
+    def _replica_queries(self, name):
+        with CaptureQueriesContext(connections['replica']) as context:
+            self.assertEqual(self.client.get(reverse(name)).status_code, 200)
+        return len(context)
+
+    def test_audit_log_uses_replica_until_post(self):
+        self.client.force_login(User.objects.create_user('admin@example.com', 'Администратор', role='admin'))
+        self.assertGreater(self._replica_queries('app:audit_log'), 0)
+        self.client.post(reverse('app:groups_list'))
+        self.assertEqual(self._replica_queries('app:audit_log'), 0)
+
+    def test_cached_fragments_are_built_on_primary(self):
+        cache.clear()
+        self.client.force_login(User.objects.create_user('admin@example.com', 'Администратор', role='admin'))
+        self.assertEqual(self._replica_queries('app:reports'), 0)
+
+
+class DatasetBenchmarkTests(TestCase):
+    """Генератор данных даёт согласованный набор, замер покрывает все страницы и сравнивает с базой"""
+
+    def test_generated_dataset_is_consistent(self):
+        sizes = generate_large_dataset(prefix='t', students=30, courses=3, batch_size=100)
+        self.assertEqual(User.objects.filter(role='student').count(), 30)
+        self.assertEqual(Enrollment.objects.count(), sizes['app_enrollment'])
+        self.assertEqual(CourseProgress.objects.count(), sizes['app_enrollment'])
+        self.assertEqual(find_counter_mismatches(), [])
+        self.assertEqual(StudentProgress.objects.count(), sizes['app_studentprogress'])
+
+    def test_page_targets_and_baseline(self):
+        targets = dict(page_targets(urls, urls.app_name))
+        self.assertTrue({f'app:{pattern.name}' for pattern in urls.urlpatterns} <= set(targets))
+        self.assertIn('admin:app.quizresult', targets)
+        self.assertIsNone(targets['app:users_import_status'])
+
+        baseline = {'app:reports': {'status': 200, 'queries': 2, 'p95': 10.0}}
+        self.assertEqual(compare_with_baseline({'app:reports': {'status': 200, 'queries': 2, 'p95': 14.0}},
+                                               baseline), [])
+        self.assertEqual(
+            compare_with_baseline({'app:reports': {'status': 200, 'queries': 3, 'p95': 40.0}}, baseline),
+            [('app:reports', 'queries', 2, 3), ('app:reports', 'p95', 10.0, 40.0)],
+        )
+
+
+class CascadeDeletionTests(TestCase):
+    """Пакетное удаление снизу вверх сохраняет согласованность счётчиков и при прерывании"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user('teacher@example.com', 'Преподаватель', role='teacher')
+        cls.other = User.objects.create_user('other@example.com', 'Другой преподаватель', role='teacher')
+        cls.students = [User.objects.create_user(f's{index}@example.com', f'Студент {index}') for index in range(3)]
+        cls.kept = Course.objects.create(title='Остаётся', teacher=cls.other, status='published')
+        for course in (Course.objects.create(title='Курс', teacher=cls.teacher, status='published'), cls.kept):
+            module = Module.objects.create(course=course, title='Модуль', order_num=1)
+            lesson = Lesson.objects.create(module=module, title='Урок', content_type='text', order_num=1)
+            quiz = Quiz.objects.create(module=module, title='Тест', max_score=10)
+            Answer.objects.create(question=Question.objects.create(
+                quiz=quiz, question_text='?', question_type='single', order_num=1), answer_text='Да', order_num=1)
+            for student in cls.students:
+                Enrollment.objects.create(student=student, course=course)
+                StudentProgress.objects.create(student=student, module=module, lesson=lesson, status='completed')
+                QuizResult.objects.create(quiz=quiz, student=student, score=5, max_score=10, percentage=50,
+                                          started_at=timezone.now(), submitted_at=timezone.now())
+        Group.objects.create(group_name='Группа', curator=cls.teacher)
+
+    def _assert_consistent(self):
+        self.assertEqual(find_counter_mismatches(), [])
+        stats = DashboardStats.objects.values().get()
+        rebuild_dashboard_stats()
+        fresh = DashboardStats.objects.values().get()
+        stats.pop('rebuilt_at'), fresh.pop('rebuilt_at')
+        self.assertEqual(stats, fresh)
+
+    def test_estimate_and_delete_teacher(self):
+        rebuild_dashboard_stats()
+        plan = build_plan(User, [self.teacher.pk])
+        blast_radius = {(table, action): count for table, action, count in estimate(plan)}
+        self.assertEqual(blast_radius[('app_enrollment', 'delete')], 3)
+        self.assertEqual(blast_radius[('app_group', 'set_null')], 1)
+
+        with self.assertNumQueries(0):
+            build_plan(User, [self.teacher.pk])
+        deleted = delete_cascade(User, [self.teacher.pk], batch_size=2)
+
+        self.assertEqual(deleted['app_quizresult'], 3)
+        self.assertFalse(User.objects.filter(pk=self.teacher.pk).exists())
+        self.assertEqual(list(Course.objects.all()), [self.kept])
+        self.assertEqual(Enrollment.objects.count(), 3)
+        self.assertIsNone(Group.objects.get().curator)
+        self._assert_consistent()
+
+    def test_interrupted_deletion_stays_consistent_and_resumes(self):
+        rebuild_dashboard_stats()
+        process_batch, calls = deletion._process_batch, []
+
+        def failing(node, pks):
+            calls.append(node.model)
+            if node.model is Module:
+                raise RuntimeError('обрыв соединения')
+            process_batch(node, pks)
+
+        with mock.patch('app.deletion._process_batch', failing), self.assertRaises(RuntimeError):
+            delete_cascade(User, [self.teacher.pk])
+        self.assertIn(Enrollment, calls)
+        self.assertTrue(Course.objects.filter(teacher=self.teacher).exists())
+        self._assert_consistent()
+
+        delete_cascade(User, [self.teacher.pk])
+        self.assertFalse(Course.objects.filter(title='Курс').exists())
+        self._assert_consistent()
+
+    @mock.patch('app.views.start_job')
+    def test_delete_view_runs_in_background(self, start_job):
+        start_job.return_value = mock.Mock(pk=7)
+        self.client.force_login(User.objects.create_user('admin@example.com', 'Администратор', role='admin'))
+        # Страница подтверждения показывает оценки планировщика, а не точные COUNT по каскаду
+        with mock.patch('app.deletion.estimate_count', return_value=12345) as estimate_count:
+            response = self.client.get(reverse('app:users_delete', args=[self.teacher.pk]))
+        self.assertTrue(estimate_count.called)
+        self.assertContains(response, 'app_quizresult')
+        self.assertContains(response, '≈ 12345')
+        response = self.client.post(reverse('app:users_delete', args=[self.teacher.pk]))
+        self.assertRedirects(response, reverse('app:users_delete_status', args=[7]), fetch_redirect_response=False)
+        self.teacher.refresh_from_db()
+        self.assertFalse(self.teacher.is_active)
+        self.assertEqual(start_job.call_args.args[2:], ('app.User', [self.teacher.pk]))
+
+        job = BackgroundJob.objects.create(kind='delete_user', status='done', result={'app_course': 1})
+        self.assertContains(self.client.get(reverse('app:users_delete_status', args=[job.pk])), 'app_course')
+
+
+class CourseStatusSchedulerTests(TestCase):
+    """Планировщик статусов повторяет update_course_status пачками, инкрементально и с аудитом"""
+
+    def setUp(self):
+        teacher = User.objects.create_user('teacher@example.com', 'Преподаватель', role='teacher')
+        self.today = timezone.localdate()
+        day = timezone.timedelta(days=1)
+        self.courses = {
+            name: Course.objects.create(title=name, teacher=teacher, status=status, start_date=start, end_date=end)
+            for name, status, start, end in (
+                ('ended', 'published', self.today - 30 * day, self.today - day),
+                ('started', 'draft', self.today, self.today + 30 * day),
+                ('ended draft', 'draft', self.today - 30 * day, self.today - day),
+                ('running', 'published', self.today - day, self.today + day),
+                ('future', 'draft', self.today + day, None),
+            )
+        }
+        rebuild_dashboard_stats()
+
+    def _statuses(self):
+        return {course.title: course.status for course in Course.objects.all()}
+
+    def test_transitions_batched_with_audit(self):
+        result = run_course_status(self.today, batch_size=1)
+        self.assertEqual((result['archived'], result['published']), (2, 1))
+        self.assertEqual(self._statuses(), {
+            'ended': 'archived', 'started': 'published', 'ended draft': 'archived',
+            'running': 'published', 'future': 'draft',
+        })
+        entries = AuditLog.objects.filter(table_name='app_course', action='UPDATE')
+        self.assertEqual(entries.count(), 3)
+        self.assertEqual(json.loads(entries.get(record_id=self.courses['started'].pk).old_value), {'status': 'draft'})
+        self.assertEqual(DashboardStats.objects.get().active_courses, 2)
+
+    def test_incremental_since_last_run(self):
+        run_course_status(self.today - timezone.timedelta(days=1))
+        self.assertEqual(run_course_status(self.today)['since'], str(self.today - timezone.timedelta(days=1)))
+        # Дата окончания исправлена задним числом - раньше прошлого прохода: догоняет только полный проход
+        Course.objects.filter(pk=self.courses['running'].pk).update(end_date=self.today - timezone.timedelta(days=9))
+        self.assertEqual(run_course_status(self.today)['archived'], 0)
+        self.assertEqual(run_course_status(self.today, full=True)['archived'], 1)
+
+
+class GradebookTests(TestCase):
+    """Журнал оценок строится тремя запросами в плотную матрицу и кешируется по последнему результату"""
+
+    @classmethod
+    def setUpTestData(cls):
+        teacher = User.objects.create_user('teacher@example.com', 'Преподаватель', role='teacher')
+        cls.course = Course.objects.create(title='Курс', teacher=teacher)
+        module = Module.objects.create(course=cls.course, title='Модуль', order_num=1)
+        cls.quizzes = [Quiz.objects.create(module=module, title=f'Тест {index}', max_score=100) for index in range(3)]
+        cls.anna = User.objects.create_user('anna@example.com', 'Анна')
+        cls.boris = User.objects.create_user('boris@example.com', 'Борис')
+        outsider = User.objects.create_user('out@example.com', 'Не записан')
+        for student in (cls.anna, cls.boris):
+            Enrollment.objects.create(student=student, course=cls.course)
+        for student, quiz, percentage in ((cls.anna, 0, 80), (cls.anna, 1, 50), (cls.boris, 0, 60), (outsider, 2, 90)):
+            cls._result(student, cls.quizzes[quiz], percentage)
+
+    @classmethod
+    def _result(cls, student, quiz, percentage):
+        return QuizResult.objects.create(quiz=quiz, student=student, score=percentage, max_score=100,
+                                         percentage=percentage, is_passed=percentage >= 60,
+                                         started_at=timezone.now(), submitted_at=timezone.now())
+
+    def setUp(self):
+        cache.clear()
+        counters.reset()
+
+    def test_matrix_and_means(self):
+        with self.assertNumQueries(3):
+            gradebook = build_gradebook(self.course.pk)
+        rows = [(student[1], cells, mean) for student, cells, mean in gradebook.rows()]
+        self.assertEqual(rows, [
+            ('Анна', [(80.0, True), (50.0, False), (None, False)], 65.0),
+            ('Борис', [(60.0, True), (None, False), (None, False)], 60.0),
+        ])
+        self.assertEqual(gradebook.column_means, [70.0, 50.0, None])
+
+    def test_cached_until_results_change(self):
+        get_gradebook(self.course.pk)
+        with self.assertNumQueries(1):
+            get_gradebook(self.course.pk)
+        self.assertEqual(counters.snapshot()['gradebook'], (1, 1))
+
+        result = self._result(self.boris, self.quizzes[1], 70)
+        self.assertEqual(list(get_gradebook(self.course.pk).rows())[1][2], 65.0)
+
+        result.percentage = 100
+        result.save()
+        self.assertEqual(list(get_gradebook(self.course.pk).rows())[1][2], 80.0)
+
+    @mock.patch('app.enrollments.record')
+    def test_rows_follow_enrollments_and_renames(self, record):
+        get_gradebook(self.course.pk)
+        # Одна запись удалена, другая создана: число записей то же, строки - другие
+        Enrollment.objects.get(student=self.anna).delete()
+        Enrollment.objects.create(student=User.objects.create_user('vera@example.com', 'Вера'), course=self.course)
+        self.assertEqual([student[1] for student in get_gradebook(self.course.pk).students], ['Борис', 'Вера'])
+
+        self.boris.full_name = 'Борис Петров'
+        self.boris.save()
+        self.assertEqual(get_gradebook(self.course.pk).students[0][1], 'Борис Петров')
+
+        bulk_enroll(self.course, [self.anna.pk])
+        self.assertEqual(len(get_gradebook(self.course.pk).students), 3)
+
+    def test_streamed_page_and_export(self):
+        self.client.force_login(User.objects.create_user('admin@example.com', 'Администратор', role='admin'))
+        page = b''.join(self.client.get(reverse('app:courses_gradebook', args=[self.course.pk])).streaming_content)
+        self.assertIn('Борис'.encode(), page)
+        self.assertIn(b'65.0', page)
+        export = b''.join(self.client.get(reverse('app:courses_gradebook_export', args=[self.course.pk]))
+                          .streaming_content).decode('utf-8-sig').splitlines()
+        self.assertEqual(export[1], 'Анна;anna@example.com;80.0;50.0;;65.0')
+        self.assertEqual(export[-1], 'Среднее по тесту;;70.0;50.0;;')
+        self.assertEqual(self.client.get(reverse('app:courses_gradebook', args=[999])).status_code, 404)
+
+
+class ItemAnalysisTests(TestCase):
+    """Анализ вопросов по сохранённым ответам и его инкрементальное обновление"""
+
+    @classmethod
+    def setUpTestData(cls):
+        teacher = User.objects.create_user('teacher@example.com', 'Преподаватель', role='teacher')
+        course = Course.objects.create(title='Курс', teacher=teacher)
+        module = Module.objects.create(course=course, title='Модуль', order_num=1)
+        cls.quiz = Quiz.objects.create(module=module, title='Тест', max_score=3)
+        cls.first, cls.second = [Question.objects.create(quiz=cls.quiz, question_text=str(n), question_type='single',
+                                                         order_num=n) for n in (1, 2)]
+        cls.text = Question.objects.create(quiz=cls.quiz, question_text='3', question_type='text', order_num=3)
+        cls.a1, cls.a2, cls.a3 = [Answer.objects.create(question=cls.first, answer_text=str(n), is_correct=n == 1,
+                                                        order_num=n) for n in (1, 2, 3)]
+        cls.b1, cls.b2 = [Answer.objects.create(question=cls.second, answer_text=str(n), is_correct=n == 1,
+                                                order_num=n) for n in (1, 2)]
+        Answer.objects.create(question=cls.text, answer_text='да', is_correct=True, order_num=1)
+        attempts = [
+            {cls.first.pk: cls.a1.pk, cls.second.pk: cls.b1.pk, cls.text.pk: 'да'},
+            {cls.first.pk: cls.a1.pk, cls.second.pk: cls.b1.pk, cls.text.pk: 'нет'},
+            {cls.first.pk: cls.a2.pk, cls.second.pk: cls.b2.pk, cls.text.pk: 'да'},
+            {cls.first.pk: cls.a2.pk, cls.text.pk: 'нет'},
+        ]
+        for index, answers in enumerate(attempts):
+            student = User.objects.create_user(f'student{index}@example.com', f'Студент {index}')
+            submit_quiz(cls.quiz, student, answers, started_at=timezone.now())
+
+    def setUp(self):
+        cache.clear()
+
+    def test_indices(self):
+        self.assertEqual(refresh_item_stats(), {'quizzes': 1, 'questions': 3})
+        stats = {row.question_id: row for row in QuestionStats.objects.all()}
+        first, second, text = stats[self.first.pk], stats[self.second.pk], stats[self.text.pk]
+        self.assertEqual((first.attempts, first.p_value, second.p_value, text.p_value), (4, 0.5, 0.5, 0.5))
+        self.assertEqual(second.omit_rate, 0.25)
+        self.assertEqual(first.option_rates, {str(self.a1.pk): 0.5, str(self.a2.pk): 0.5, str(self.a3.pk): 0.0})
+        self.assertEqual(text.option_rates, {})
+        # Корреляция верности ответа с баллом за остальные вопросы
+        self.assertAlmostEqual(first.discrimination, statistics.correlation([1, 1, 0, 0], [2, 1, 1, 0]), places=4)
+        self.assertAlmostEqual(text.discrimination, statistics.correlation([1, 0, 1, 0], [2, 2, 0, 0]), places=4)
+
+    def test_incremental_refresh(self):
+        refresh_item_stats()
+        self.assertEqual(stale_quizzes(), [])
+        self.assertEqual(refresh_item_stats(), {'quizzes': 0, 'questions': 0})
+
+        student = User.objects.create_user('late@example.com', 'Опоздавший')
+        submit_quiz(self.quiz, student, {self.first.pk: self.a3.pk}, started_at=timezone.now())
+        self.assertEqual(stale_quizzes(), [self.quiz.pk])
+        refresh_item_stats()
+        self.assertEqual(QuestionStats.objects.get(pk=self.first.pk).option_rates[str(self.a3.pk)], 0.2)
+
+        self.a2.is_correct = True
+        self.a2.save()
+        self.assertEqual(stale_quizzes(), [self.quiz.pk])
+        refresh_item_stats()
+        self.assertEqual(QuestionStats.objects.get(pk=self.first.pk).p_value, 0.8)
+
+    def test_question_admin(self):
+        refresh_item_stats()
+        self.client.force_login(User.objects.create_superuser('root@example.com', 'Администратор', password='x'))
+        response = self.client.get(reverse('admin:app_question_change', args=[self.first.pk]))
+        self.assertContains(response, 'Попыток: 4, правильных ответов: 50%')
+        self.assertContains(response, 'Выбирают')
+        self.assertEqual(self.client.get(reverse('admin:app_question_changelist')).status_code, 200)
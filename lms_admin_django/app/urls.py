@@ -17,18 +17,31 @@ urlpatterns = [
     path('users/create/', views.users_create_view, name='users_create'),
     path('users/<int:user_id>/edit/', views.users_edit_view, name='users_edit'),
     path('users/<int:user_id>/delete/', views.users_delete_view, name='users_delete'),
+    path('users/delete/<int:job_id>/', views.users_delete_status_view, name='users_delete_status'),
+    path('users/import/', views.users_import_view, name='users_import'),
+    path('users/import/<int:job_id>/', views.users_import_status_view, name='users_import_status'),
+    path('users/import/<int:job_id>/errors/', views.users_import_errors_view, name='users_import_errors'),
 
     # Courses
     path('courses/', views.courses_list_view, name='courses_list'),
     path('courses/create/', views.courses_create_view, name='courses_create'),
     path('courses/<int:course_id>/', views.courses_detail_view, name='courses_detail'),
+    path('courses/<int:course_id>/enroll/', views.courses_enroll_view, name='courses_enroll'),
+    path('courses/<int:course_id>/gradebook/', views.courses_gradebook_view, name='courses_gradebook'),
+    path('courses/<int:course_id>/gradebook/export/', views.courses_gradebook_export_view,
+         name='courses_gradebook_export'),
 
     # Groups
     path('groups/', views.groups_list_view, name='groups_list'),
 
     # Reports
     path('reports/', views.reports_view, name='reports'),
+    path('reports/export/<str:report>/', views.reports_export_view, name='reports_export'),
 
     # Audit
     path('audit/', views.audit_log_view, name='audit_log'),
+    path('audit/export/', views.audit_log_export_view, name='audit_log_export'),
+
+    # Metrics
+    path('metrics/', views.metrics_view, name='metrics'),
 ]
\ No newline at end of file
@@ -1,9 +1,32 @@
+import hmac
+import tempfile
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
-from django.db.models import Count, Avg, Q
-from .models import User, Group, Course, Enrollment, QuizResult, AuditLog
-from .forms import CustomUserCreationForm, CustomUserChangeForm, CourseForm, GroupForm
+from django.db.models import Count
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.template.loader import render_to_string
+from django.utils.html import format_html
+from django.utils.http import urlencode
+from .models import (User, Group, Course, Lesson, Enrollment, QuizResult, StudentProgress, CourseProgress, AuditLog,
+                     BackgroundJob, DashboardStats)
+from . import caching
+from .audit import get_client_ip
+from .caching import cache_fragment
+from .course_cache import get_course_stats, get_course_tree
+from .deletion import build_plan, estimate, run_deletion_job
+from .exports import REPORTS, AUDIT_LOG_HEADER, IMPORT_ERRORS_HEADER, audit_log_rows, export_response
+from .enrollments import OUTCOME_LABELS, bulk_enroll, group_student_ids
+from .forms import CustomUserCreationForm, CustomUserChangeForm, CourseForm, GroupForm, UserImportForm, BulkEnrollForm
+from .gradebook import get_gradebook
+from .imports import run_import_job
+from .metrics import get_metrics_settings, prometheus_text, registry, summary_rows
+from .jobs import start_job
+from .pagination import paginate_keyset
+from .reports import course_report, student_report
+from .routers import replica_reads
+from .search import search_users, search_courses
+from .stats import get_dashboard_stats
 
 
 # Декоратор для проверки роли администратора
@@ -16,43 +39,38 @@ def teacher_or_admin_required(function):
     return user_passes_test(lambda u: u.is_authenticated and u.role in ['teacher', 'admin'])(function)
 
 
-@login_required
-def dashboard_view(request):
-    """Панель управления"""
-
-    # Статистика
-    total_users = User.objects.count()
-    total_students = User.objects.filter(role='student').count()
-    total_teachers = User.objects.filter(role='teacher').count()
-    total_courses = Course.objects.count()
-    active_courses = Course.objects.filter(status='published').count()
-    total_enrollments = Enrollment.objects.filter(status='active').count()
+@cache_fragment('dashboard', depends_on=(DashboardStats, User, Course, Enrollment))
+def _dashboard_data(request):
+    # Статистика - из предрасчитанного снимка (одна строка)
+    stats = get_dashboard_stats()
 
     # Последние записи
     recent_enrollments = Enrollment.objects.select_related('student', 'course') \
         .filter(status='active').order_by('-enrolled_at')[:10]
 
-    # Курсы с наибольшим количеством студентов
-    popular_courses = Course.objects.annotate(
-        student_count=Count('enrollments', filter=Q(enrollments__status='active'))
-    ).order_by('-student_count')[:5]
+    # Курсы с наибольшим количеством студентов (по индексу счётчика)
+    popular_courses = Course.objects.select_related('teacher').order_by('-active_count')[:5]
+
+    return {
+        'total_users': stats.total_users,
+        'total_students': stats.total_students,
+        'total_teachers': stats.total_teachers,
+        'total_courses': stats.total_courses,
+        'active_courses': stats.active_courses,
+        'total_enrollments': stats.total_enrollments,
+        'avg_score': round(stats.avg_score, 2),
+        'recent_enrollments': list(recent_enrollments),
+        'popular_courses': list(popular_courses),
+    }
 
-    # Статистика по результатам тестов
-    avg_score = QuizResult.objects.aggregate(Avg('percentage'))['percentage__avg'] or 0
 
-    context = {
-        'total_users': total_users,
-        'total_students': total_students,
-        'total_teachers': total_teachers,
-        'total_courses': total_courses,
-        'active_courses': active_courses,
-        'total_enrollments': total_enrollments,
-        'avg_score': round(avg_score, 2),
-        'recent_enrollments': recent_enrollments,
-        'popular_courses': popular_courses,
-    }
+@login_required
+@replica_reads
+def dashboard_view(request):
+    """Панель управления"""
 
-    return render(request, 'dashboard/index.html', context)
+    # Данные панели - из кеша фрагментов, сбрасываются при изменении моделей
+    return render(request, 'dashboard/index.html', _dashboard_data(request))
 
 
 @admin_required
@@ -73,15 +91,15 @@ def users_list_view(request):
     elif status == 'inactive':
         users = users.filter(is_active=False)
     if search:
-        users = users.filter(
-            Q(full_name__icontains=search) |
-            Q(email__icontains=search)
-        )
-
-    users = users.order_by('full_name')
+        # Ранжированный поиск по триграммным индексам
+        users = search_users(users, search)
+        page = paginate_keyset(request, users, ('-search_rank', 'full_name'))
+    else:
+        page = paginate_keyset(request, users, ('full_name',))
 
     context = {
-        'users': users,
+        'users': page,
+        'page_obj': page,
         'selected_role': role,
         'selected_status': status,
         'search_query': search,
@@ -105,6 +123,50 @@ def users_create_view(request):
     return render(request, 'users/create.html', context)
 
 
+@admin_required
+def users_import_view(request):
+    """Массовый импорт пользователей из CSV/XLSX (выполняется в фоне)"""
+
+    if request.method == 'POST':
+        form = UserImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            # Файл сохраняется на диск: фоновая задача читает его построчно после ответа
+            with tempfile.NamedTemporaryFile(suffix=f'.{form.file_format}', delete=False) as upload:
+                for chunk in form.cleaned_data['file'].chunks():
+                    upload.write(chunk)
+            job = start_job('import_users', run_import_job, upload.name, form.file_format, user=request.user)
+            return redirect('app:users_import_status', job_id=job.pk)
+    else:
+        form = UserImportForm()
+
+    context = {'form': form}
+    return render(request, 'users/import.html', context)
+
+
+@admin_required
+def users_import_status_view(request, job_id):
+    """Ход и итог импорта"""
+
+    job = get_object_or_404(BackgroundJob, pk=job_id, kind='import_users')
+    result = job.result or {}
+    context = {
+        'job': job,
+        'created': result.get('created', 0),
+        'rejected': result.get('rejected', [])[:100],
+        'rejected_count': len(result.get('rejected', [])),
+    }
+    return render(request, 'users/import_status.html', context)
+
+
+@admin_required
+def users_import_errors_view(request, job_id):
+    """Отчёт об отклонённых строках импорта"""
+
+    job = get_object_or_404(BackgroundJob, pk=job_id, kind='import_users', status='done')
+    rejected = job.result.get('rejected', [])
+    return export_response('csv', IMPORT_ERRORS_HEADER, rejected, f'import_errors_{job.pk}')
+
+
 @admin_required
 def users_edit_view(request, user_id):
     """Редактирование пользователя"""
@@ -147,15 +209,27 @@ def users_delete_view(request, user_id):
     user = get_object_or_404(User, pk=user_id)
 
     if request.method == 'POST':
-        full_name = user.full_name
-        user.delete()
-        messages.success(request, f'Пользователь {full_name} успешно удалён')
-        return redirect('app:users_list')
-
-    context = {'user': user}
+        # Каскад у преподавателя может затронуть миллионы строк - удаляем пачками в фоновой задаче,
+        # а вход пользователю закрываем сразу
+        User.objects.filter(pk=user.pk).update(is_active=False)
+        job = start_job('delete_user', run_deletion_job, User._meta.label, [user.pk], user=request.user)
+        messages.success(request, f'Удаление пользователя {user.full_name} запущено')
+        return redirect('app:users_delete_status', job_id=job.pk)
+
+    # Оценки планировщика: точные COUNT по каскаду крупного преподавателя заняли бы минуты
+    context = {'user': user, 'blast_radius': estimate(build_plan(User, [user.pk]), approximate=True)}
     return render(request, 'users/delete_confirm.html', context)
 
 
+@admin_required
+def users_delete_status_view(request, job_id):
+    """Ход и итог фонового удаления пользователя"""
+
+    job = get_object_or_404(BackgroundJob, pk=job_id, kind='delete_user')
+    context = {'job': job, 'deleted': sorted((job.result or {}).items())}
+    return render(request, 'users/delete_status.html', context)
+
+
 @teacher_or_admin_required
 def courses_list_view(request):
     """Список курсов"""
@@ -168,22 +242,16 @@ def courses_list_view(request):
 
     if status:
         courses = courses.filter(status=status)
+    # Количество записей берётся из счётчиков курса, без запросов на каждую строку
     if search:
-        courses = courses.filter(
-            Q(title__icontains=search) |
-            Q(description__icontains=search) |
-            Q(teacher__full_name__icontains=search)
-        )
-
-    courses = courses.order_by('-created_at')
-
-    # Статистика для каждого курса
-    for course in courses:
-        course.enrolled_count = course.enrollments.filter(status='active').count()
-        course.completed_count = course.enrollments.filter(status='completed').count()
+        courses = search_courses(courses, search)
+        page = paginate_keyset(request, courses, ('-search_rank', '-created_at'))
+    else:
+        page = paginate_keyset(request, courses, ('-created_at',))
 
     context = {
-        'courses': courses,
+        'courses': page,
+        'page_obj': page,
         'selected_status': status,
         'search_query': search,
     }
@@ -212,97 +280,244 @@ def courses_create_view(request):
 def courses_detail_view(request, course_id):
     """Детали курса"""
 
-    course = get_object_or_404(Course.objects.select_related('teacher'), pk=course_id)
-    modules = course.modules.all().prefetch_related('lessons', 'quizzes')
+    # Структура курса - из кеша (сбрасывается сигналами), статистика - из кеша с коротким сроком жизни
+    tree = get_course_tree(course_id)
+    if tree is None:
+        raise Http404('Курс не найден')
+
+    context = {
+        'course': tree['course'],
+        'modules': tree['modules'],
+        **get_course_stats(course_id),
+    }
+
+    return render(request, 'courses/detail.html', context)
+
+
+@teacher_or_admin_required
+def courses_enroll_view(request, course_id):
+    """Массовая запись студентов на курс"""
+
+    course = get_object_or_404(Course, pk=course_id)
+    outcomes = None
+
+    if request.method == 'POST':
+        form = BulkEnrollForm(request.POST)
+        if form.is_valid():
+            group = form.cleaned_data['group']
+            student_ids = (group_student_ids(group) if group else []) + getattr(form, 'student_ids', [])
+            result = bulk_enroll(course, student_ids, group=group)
+            course = result.course
+            students = User.objects.in_bulk(list(result.outcomes))
+            outcomes = [(students.get(student_id), OUTCOME_LABELS[outcome], outcome)
+                        for student_id, outcome in result.outcomes.items()]
+            messages.success(request, f'Записано студентов: {result.enrolled} из {len(student_ids)}')
+    else:
+        form = BulkEnrollForm()
+
+    context = {'course': course, 'form': form, 'outcomes': outcomes}
+    return render(request, 'courses/enroll.html', context)
+
+
+def _get_gradebook_or_404(course_id):
+    tree = get_course_tree(course_id)
+    gradebook = get_gradebook(course_id) if tree is not None else None
+    if gradebook is None:
+        raise Http404('Курс не найден')
+    return tree['course'], gradebook
+
+
+def _percent(value):
+    return '' if value is None else f'{value:.1f}'
 
-    # Статистика
-    enrolled_count = course.enrollments.filter(status='active').count()
-    completed_count = course.enrollments.filter(status='completed').count()
-    avg_score = QuizResult.objects.filter(
-        quiz__module__course=course
-    ).aggregate(Avg('percentage'))['percentage__avg'] or 0
 
+def _gradebook_rows_html(gradebook):
+    # Строка таблицы - одна порция потока; экранируются только имя и email, ячейки - числа
+    for (student_id, full_name, email), cells, mean in gradebook.rows():
+        parts = [format_html('<tr><td><strong>{}</strong><br><small class="text-muted">{}</small></td>',
+                             full_name, email)]
+        for score, passed in cells:
+            if score is None:
+                parts.append('<td class="text-muted text-center">-</td>')
+            else:
+                parts.append(f'<td class="text-center {"text-success" if passed else "text-danger"}">{score:.1f}</td>')
+        parts.append(f'<td class="text-center fw-bold">{_percent(mean)}</td></tr>\n')
+        yield ''.join(parts)
+
+
+GRADEBOOK_ROWS_MARKER = '<!-- gradebook rows -->'
+
+
+@teacher_or_admin_required
+@replica_reads
+def courses_gradebook_view(request, course_id):
+    """Журнал оценок курса: студенты x тесты. Строки таблицы отдаются потоком"""
+
+    course, gradebook = _get_gradebook_or_404(course_id)
     context = {
         'course': course,
-        'modules': modules,
-        'enrolled_count': enrolled_count,
-        'completed_count': completed_count,
-        'avg_score': round(avg_score, 2),
+        'quizzes': gradebook.quizzes,
+        'column_means': [_percent(mean) for mean in gradebook.column_means],
+        'student_count': len(gradebook.students),
+        'rows_marker': GRADEBOOK_ROWS_MARKER,
     }
+    head, tail = render_to_string('courses/gradebook.html', context, request).split(GRADEBOOK_ROWS_MARKER)
 
-    return render(request, 'courses/detail.html', context)
+    def generate():
+        yield head
+        yield from _gradebook_rows_html(gradebook)
+        yield tail
+
+    return StreamingHttpResponse(generate(), content_type='text/html; charset=utf-8')
+
+
+@teacher_or_admin_required
+@replica_reads
+def courses_gradebook_export_view(request, course_id):
+    """Выгрузка журнала оценок курса (CSV потоком или XLSX)"""
+
+    course, gradebook = _get_gradebook_or_404(course_id)
+    header = ['Студент', 'Email', *(f'{module_title}: {title}' for _, title, module_title in gradebook.quizzes),
+              'Средний %']
+
+    def rows():
+        for (student_id, full_name, email), cells, mean in gradebook.rows():
+            yield [full_name, email, *(_percent(score) for score, _ in cells), _percent(mean)]
+        yield ['Среднее по тесту', '', *(_percent(mean) for mean in gradebook.column_means), '']
+
+    return export_response(request.GET.get('format', 'csv'), header, rows(), f'gradebook_{course["pk"]}')
+
+
+@cache_fragment('groups_list', depends_on=(Group, User, Enrollment), vary_on=('cursor',))
+def _groups_data(request):
+    page = paginate_keyset(request, Group.objects.select_related('curator'), ('group_name',), per_page=30)
+
+    # Количество записей только для групп текущей страницы
+    student_counts = dict(
+        Enrollment.objects.filter(group__in=page.object_list)
+        .order_by().values_list('group_id').annotate(total=Count('pk'))
+    )
+    for group in page:
+        group.student_count = student_counts.get(group.pk, 0)
+
+    return {'groups': page, 'page_obj': page}
 
 
 @admin_required
 def groups_list_view(request):
     """Список групп"""
 
-    groups = Group.objects.select_related('curator').annotate(
-        student_count=Count('enrollments')
-    ).order_by('group_name')
+    return render(request, 'groups/list.html', _groups_data(request))
 
-    context = {'groups': groups}
-    return render(request, 'groups/list.html', context)
+
+@cache_fragment('reports', depends_on=(DashboardStats, User, Course, Lesson, Enrollment, QuizResult,
+                                       StudentProgress, CourseProgress))
+def _reports_data(request):
+    # Статистика по курсам и студентам: каждая метрика агрегируется отдельно, без размножения строк
+    return {
+        'course_stats': list(course_report().order_by('-created_at')[:20]),
+        'user_stats': list(student_report(limit=20)),
+    }
 
 
 @login_required
+@replica_reads
 def reports_view(request):
     """Отчёты"""
 
-    # Статистика по курсам
-    course_stats = Course.objects.annotate(
-        total_enrolled=Count('enrollments', filter=Q(enrollments__status='active')),
-        completed=Count('enrollments', filter=Q(enrollments__status='completed')),
-        avg_score=Avg('modules__quizzes__results__percentage')
-    ).order_by('-created_at')[:20]
+    return render(request, 'reports/index.html', _reports_data(request))
 
-    # Статистика по пользователям
-    user_stats = User.objects.filter(role='student').annotate(
-        courses_count=Count('enrollments', filter=Q(enrollments__status='active')),
-        completed_courses=Count('enrollments', filter=Q(enrollments__status='completed')),
-        avg_score=Avg('quiz_results__percentage')
-    ).order_by('-courses_count')[:20]
 
-    context = {
-        'course_stats': course_stats,
-        'user_stats': user_stats,
-    }
+@teacher_or_admin_required
+@replica_reads
+def reports_export_view(request, report):
+    """Полная выгрузка отчёта по курсам или студентам (CSV/XLSX)"""
 
-    return render(request, 'reports/index.html', context)
+    if report not in REPORTS:
+        raise Http404('Неизвестный отчёт')
+    header, rows = REPORTS[report]
+    return export_response(request.GET.get('format', 'csv'), header, rows(), f'report_{report}')
 
 
-@admin_required
-def audit_log_view(request):
-    """Журнал аудита"""
+def _filter_audit_logs(request):
+    """Журнал аудита с фильтрами из GET-параметров (action, user, date_from, date_to)"""
 
-    # Фильтрация
-    action = request.GET.get('action', '')
-    user_id = request.GET.get('user', '')
-    date_from = request.GET.get('date_from', '')
-    date_to = request.GET.get('date_to', '')
+    filters = {name: request.GET.get(name, '') for name in ('action', 'user', 'date_from', 'date_to')}
+    logs = AuditLog.objects.all()
+
+    if filters['action']:
+        logs = logs.filter(action=filters['action'])
+    if filters['user']:
+        logs = logs.filter(user_id=filters['user'])
+    if filters['date_from']:
+        logs = logs.filter(created_at__gte=filters['date_from'])
+    if filters['date_to']:
+        logs = logs.filter(created_at__lte=filters['date_to'] + ' 23:59:59')
+
+    return logs, filters
 
-    logs = AuditLog.objects.select_related('user').all()
 
-    if action:
-        logs = logs.filter(action=action)
-    if user_id:
-        logs = logs.filter(user_id=user_id)
-    if date_from:
-        logs = logs.filter(created_at__gte=date_from)
-    if date_to:
-        logs = logs.filter(created_at__lte=date_to + ' 23:59:59')
+@admin_required
+@replica_reads
+def audit_log_view(request):
+    """Журнал аудита"""
 
-    logs = logs.order_by('-created_at')[:100]
+    logs, filters = _filter_audit_logs(request)
+    page = paginate_keyset(request, logs.select_related('user'), ('-created_at',), per_page=100)
 
     users = User.objects.all().order_by('full_name')
 
     context = {
-        'logs': logs,
+        'logs': page,
+        'page_obj': page,
         'users': users,
-        'selected_action': action,
-        'selected_user': user_id,
-        'date_from': date_from,
-        'date_to': date_to,
+        'selected_action': filters['action'],
+        'selected_user': filters['user'],
+        'date_from': filters['date_from'],
+        'date_to': filters['date_to'],
+        'export_query': urlencode({key: value for key, value in filters.items() if value}),
     }
 
-    return render(request, 'audit/list.html', context)
\ No newline at end of file
+    return render(request, 'audit/list.html', context)
+
+
+@admin_required
+@replica_reads
+def audit_log_export_view(request):
+    """Выгрузка журнала аудита с текущими фильтрами (CSV/XLSX)"""
+
+    logs, _ = _filter_audit_logs(request)
+    return export_response(request.GET.get('format', 'csv'), AUDIT_LOG_HEADER, audit_log_rows(logs), 'audit_log')
+
+
+def _metrics_scraper_allowed(request):
+    """
+    Доступ к метрикам без входа: по токену (Authorization: Bearer), если он задан, иначе по адресу
+    из ALLOWED_IPS. За обратным прокси на том же хосте REMOTE_ADDR всегда 127.0.0.1, поэтому адрес
+    берётся через get_client_ip, а запрос через прокси, не указанный в TRUSTED_PROXIES, не пускается.
+    """
+
+    config = get_metrics_settings()
+    if config['TOKEN']:
+        expected = f'Bearer {config["TOKEN"]}'.encode()
+        return hmac.compare_digest(request.META.get('HTTP_AUTHORIZATION', '').encode(), expected)
+    client = get_client_ip(request)
+    if request.META.get('HTTP_X_FORWARDED_FOR') and client == request.META.get('REMOTE_ADDR'):
+        return False
+    return client in config['ALLOWED_IPS']
+
+
+def metrics_view(request):
+    """Метрики запросов: страница для администратора или текст для Prometheus (?format=prometheus)"""
+
+    is_admin = request.user.is_authenticated and request.user.role == 'admin'
+    if not is_admin and not _metrics_scraper_allowed(request):
+        raise Http404
+
+    snapshot = registry.snapshot()
+    if request.GET.get('format') == 'prometheus' or not is_admin:
+        return HttpResponse(prometheus_text(snapshot) + caching.prometheus_text(),
+                            content_type='text/plain; version=0.0.4; charset=utf-8')
+
+    context = {'rows': summary_rows(snapshot), 'cache_rows': caching.summary_rows()}
+    return render(request, 'metrics/index.html', context)
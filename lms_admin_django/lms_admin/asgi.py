@@ -12,5 +12,8 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'lms_admin.settings')
+# Под ASGI синхронный код выполняется в разных потоках, и постоянные соединения Django
+# не переиспользуются - включаем пул соединений процесса (DB_POOL_SIZE=0 отключает)
+os.environ.setdefault('DB_POOL_SIZE', '10')
 
 application = get_asgi_application()
@@ -1,5 +1,8 @@
 from pathlib import Path
 import os
+import sys
+import tempfile
+from decouple import Csv, config
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -21,10 +24,13 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'app.middleware.RequestMetricsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'app.middleware.AuditContextMiddleware',
+    'app.middleware.ReplicaStickinessMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -33,7 +39,8 @@ ROOT_URLCONF = 'lms_admin.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates с замером времени рендеринга для метрик запросов
+        'BACKEND': 'app.metrics.InstrumentedDjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -49,17 +56,89 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'lms_admin.wsgi.application'
 
+# Пул соединений процесса (app/db_pool) - для ASGI, где постоянные соединения Django не переиспользуются.
+# DB_POOL_SIZE = 0 - без пула; asgi.py включает пул по умолчанию
+DB_POOL_SIZE = config('DB_POOL_SIZE', default=0, cast=int)
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
-        'NAME': 'postgres',
-        'USER': 'postgres',
-        'PASSWORD': 'DXRJE@GQD6YQ',
-        'HOST': 'localhost',
-        'PORT': '5432',
+        'ENGINE': 'app.db_pool' if DB_POOL_SIZE else 'django.db.backends.postgresql',
+        'NAME': config('DB_NAME', default='postgres'),
+        'USER': config('DB_USER', default='postgres'),
+        'PASSWORD': config('DB_PASSWORD', default='DXRJE@GQD6YQ'),
+        'HOST': config('DB_HOST', default='localhost'),
+        'PORT': config('DB_PORT', default='5432'),
+        # Постоянные соединения: время жизни в секундах (0 - закрывать после каждого запроса).
+        # С пулом соединение после запроса возвращается в пул, поэтому CONN_MAX_AGE = 0
+        'CONN_MAX_AGE': 0 if DB_POOL_SIZE else config('DB_CONN_MAX_AGE', default=60, cast=int),
+        # Проверка соединения перед повторным использованием (после рестарта или обрыва БД)
+        'CONN_HEALTH_CHECKS': config('DB_CONN_HEALTH_CHECKS', default=True, cast=bool),
+        # За PgBouncer в режиме pool_mode = transaction курсоры на стороне сервера (iterator())
+        # не переживают транзакцию - отключаем их
+        'DISABLE_SERVER_SIDE_CURSORS': config('DB_PGBOUNCER', default=False, cast=bool),
+        'POOL': {
+            'MIN_SIZE': config('DB_POOL_MIN_SIZE', default=1, cast=int),
+            'MAX_SIZE': DB_POOL_SIZE,
+            'TIMEOUT': config('DB_POOL_TIMEOUT', default=10.0, cast=float),
+        },
     }
 }
 
+# Реплика для чтения аналитики (отчёты, панель, журнал аудита, выгрузки), см. app/routers.py.
+# Без DB_REPLICA_HOST реплика не настроена и всё читается с основной БД
+DB_REPLICA_HOST = config('DB_REPLICA_HOST', default='')
+if DB_REPLICA_HOST:
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': DB_REPLICA_HOST,
+        'PORT': config('DB_REPLICA_PORT', default=DATABASES['default']['PORT']),
+        'NAME': config('DB_REPLICA_NAME', default=DATABASES['default']['NAME']),
+        'USER': config('DB_REPLICA_USER', default=DATABASES['default']['USER']),
+        'PASSWORD': config('DB_REPLICA_PASSWORD', default=DATABASES['default']['PASSWORD']),
+        # В тестах реплика - та же тестовая БД
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['app.routers.ReplicaRouter']
+
+READ_REPLICA = {
+    'ALIAS': 'replica',
+    'STICKY_SECONDS': config('DB_REPLICA_STICKY_SECONDS', default=5, cast=int),
+    'MAX_LAG_SECONDS': config('DB_REPLICA_MAX_LAG', default=10, cast=float),
+    'LAG_CHECK_INTERVAL': 5,
+}
+
+# Кеш: CACHE_BACKEND = redis | memcached | file | locmem, адрес сервера - CACHE_LOCATION.
+# file - общий для всех процессов сервера кеш на диске (замена Redis/Memcached для разработки),
+# locmem - кеш в памяти процесса (тесты)
+CACHE_BACKENDS = {
+    'redis': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': config('CACHE_LOCATION', default='redis://127.0.0.1:6379/1'),
+    },
+    'memcached': {
+        'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+        'LOCATION': config('CACHE_LOCATION', default='127.0.0.1:11211'),
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': config('CACHE_LOCATION', default=os.path.join(tempfile.gettempdir(), 'lms_admin_cache')),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'lms',
+    },
+}
+CACHE_BACKEND = config('CACHE_BACKEND', default='locmem' if len(sys.argv) > 1 and sys.argv[1] == 'test' else 'file')
+CACHES = {
+    'default': {
+        **CACHE_BACKENDS[CACHE_BACKEND],
+        'KEY_PREFIX': 'lms',
+        'TIMEOUT': 300,
+    },
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
     {'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator'},
@@ -84,4 +163,40 @@ LOGIN_REDIRECT_URL = '/dashboard/'
 LOGOUT_REDIRECT_URL = '/login/'
 
 CRISPY_ALLOWED_TEMPLATE_PACKS = "bootstrap5"
-CRISPY_TEMPLATE_PACK = "bootstrap5"
\ No newline at end of file
+CRISPY_TEMPLATE_PACK = "bootstrap5"
+
+# Журнал аудита: фоновая запись пачками (см. app/audit.py)
+AUDIT_LOG = {
+    'ASYNC': True,
+    'BATCH_SIZE': 500,
+    'FLUSH_INTERVAL': 1.0,
+    'QUEUE_SIZE': 10000,
+    'ENQUEUE_TIMEOUT': 2.0,
+    'PARTITIONS_AHEAD': 3,
+    'RETENTION_MONTHS': 12,
+    # Прокси перед приложением (адреса или сети через запятую): только от них берётся X-Forwarded-For
+    'TRUSTED_PROXIES': config('AUDIT_TRUSTED_PROXIES', default='', cast=Csv()),
+}
+
+# Метрики запросов по представлениям и бюджеты SQL-запросов (см. app/metrics.py)
+REQUEST_METRICS = {
+    'ENABLED': True,
+    'BUDGETS': {
+        # Панель с запасом на первичное построение снимка статистики
+        'app:dashboard': 20,
+        'app:home': 20,
+        'app:users_list': 8,
+        'app:courses_list': 8,
+        'app:courses_detail': 10,
+        'app:groups_list': 8,
+        'app:reports': 8,
+        'app:audit_log': 8,
+    },
+    'DEFAULT_BUDGET': 50,
+    # При запуске тестов превышение бюджета роняет тест
+    'RAISE_ON_BUDGET': len(sys.argv) > 1 and sys.argv[1] == 'test',
+    # Адрес клиента определяется с учётом AUDIT_TRUSTED_PROXIES; за прокси без этой настройки
+    # доступ по адресу закрыт - используйте METRICS_TOKEN
+    'ALLOWED_IPS': ['127.0.0.1'],
+    'TOKEN': config('METRICS_TOKEN', default=''),
+}